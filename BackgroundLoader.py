@@ -0,0 +1,132 @@
+import os
+import queue
+import threading
+import traceback
+
+import numpy as np
+
+import Kinematics
+import MeshRegistry
+import TrajectoryCache
+from Feasibility import unwrapRotations
+from ToolPathReader import ReadStats, readToolPath
+
+# loads the meshes of a machine and reads and solves a tool path on a worker thread, without Qt.
+# the GUI thread polls the results, solved blocks arrive in order so a program can be played while its tail is solved.
+# events are tuples:
+#   ('progress', stage, fraction)      stage is 'meshes' or 'solving', fraction between 0 and 1
+#   ('mesh', index)                    the mesh of kinematic chain axis index is loaded
+#   ('block', tool_path, states)       (n, 6) tool path rows and their (n, 5) unwrapped states
+#   ('done', trajectory, cancelled)    the TrajectoryCache.Trajectory of the whole program, its states are cached and
+#                                      trajectory.key is its cache key. None if only the meshes were loaded or cancelled
+#                                      is True
+#   ('error', message)
+
+
+class BackgroundLoader:
+
+    def __init__(self, machine, tool_path, block_size=100000, cache=None):
+        # tool_path is a file for ToolPathReader, an (N, 6) array or None for the meshes only. everything the worker needs from the machine
+        # is read here, so the GUI thread can keep moving the axes
+        self.machine = machine
+        self.tool_path = tool_path
+        self.block_size = block_size
+        self.cache = cache if cache is not None else TrajectoryCache.cache
+        self.mesh_keys = [axis.mesh_key for axis in machine.getKinematicChain().axes]
+        self.tool_pos_without_rot = machine.getToolPositionWithoutRotation()
+        # the worker hashes the tool path for the cache key with this definition, a long program takes a while
+        self.definition = machine.getDefinition()
+        if tool_path is not None and not isinstance(tool_path, str):
+            self.tool_path = np.asarray(tool_path, dtype=float)
+
+        self.events = queue.Queue()
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='BackgroundLoader', daemon=True)
+        self.done = False
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        # the worker stops at the next mesh or block and still ends with a 'done' event
+        self.cancelled.set()
+
+    def poll(self):
+        # all events since the last poll, never blocks
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                break
+        for event in events:
+            if event[0] in ('done', 'error'):
+                self.done = True
+        return events
+
+    def run(self):
+        try:
+            trajectory = None
+            complete = self.loadMeshes()
+            if complete and self.tool_path is not None:
+                trajectory = self.solve()
+                complete = trajectory is not None
+            self.events.put(('done', trajectory, not complete))
+        except Exception:
+            self.events.put(('error', traceback.format_exc()))
+
+    def loadMeshes(self):
+        for i, mesh_key in enumerate(self.mesh_keys):
+            if self.cancelled.is_set():
+                return False
+            MeshRegistry.registry.get(mesh_key)
+            self.events.put(('mesh', i))
+            self.events.put(('progress', 'meshes', (i + 1) / len(self.mesh_keys)))
+        return True
+
+    def readBlocks(self):
+        # (block, fraction read) pairs
+        if isinstance(self.tool_path, str):
+            stats = ReadStats()
+            size = max(os.path.getsize(self.tool_path), 1)
+            for block in readToolPath(self.tool_path, self.block_size, stats):
+                yield block, min(stats.bytes_read / size, 1.0)
+        else:
+            for start in range(0, len(self.tool_path), self.block_size):
+                yield self.tool_path[start:start + self.block_size], min((start + self.block_size) / len(self.tool_path), 1.0)
+
+    def solve(self):
+        # the trajectory of the whole program, None if cancelled
+        key = None
+        if not isinstance(self.tool_path, str):
+            # a program solved before comes from the cache in one block, a file is only keyed once it is read
+            key = TrajectoryCache.getTrajectoryKey(None, self.tool_path, self.definition)
+            trajectory = self.cache.get(self.machine, self.tool_path, key)
+            if trajectory.isSolved():
+                self.events.put(('block', trajectory.tool_path, trajectory.getStates()))
+                self.events.put(('progress', 'solving', 1.0))
+                return trajectory
+
+        tool_path_blocks = []
+        states_blocks = []
+        previous = None
+        for block, fraction in self.readBlocks():
+            if self.cancelled.is_set():
+                return None
+            states = Kinematics.solveInverse(block, self.tool_pos_without_rot)
+            states = unwrapRotations(states, self.tool_pos_without_rot, previous)[0]
+            if len(states):
+                previous = states[-1]
+            tool_path_blocks.append(block)
+            states_blocks.append(states)
+            self.events.put(('block', block, states))
+            self.events.put(('progress', 'solving', fraction))
+
+        tool_path = np.concatenate(tool_path_blocks) if tool_path_blocks else np.zeros((0, 6))
+        if key is None:
+            key = TrajectoryCache.getTrajectoryKey(None, tool_path, self.definition)
+        trajectory = self.cache.get(self.machine, tool_path, key)
+        if not trajectory.isSolved():
+            trajectory.setStates(np.concatenate(states_blocks) if states_blocks else np.zeros((0, 5)))
+        return trajectory
@@ -0,0 +1,254 @@
+import gc
+import os
+import sys
+import json
+import math
+import time
+import platform
+import argparse
+import tempfile
+
+import numpy as np
+
+# reproducible headless benchmarks, results are seconds per operation so they can be compared with a baseline file
+
+# committed next to this file, so every checkout compares with the same baseline wherever it is run from
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+
+def measure(function, repeat=7, number=None, min_time=0.2):
+    # fastest seconds per call over repeat runs of number calls, after one warm up run. other processes and the
+    # cache state only ever make a run slower, so the minimum is far steadier than the median. without number a run
+    # repeats the call until it takes min_time, like timeit does, so short calls are not lost in the timer noise.
+    # the garbage collector is off while timing, its pauses depend on what ran before
+    start = time.perf_counter()
+    function()
+    if number is None:
+        number = max(1, int(math.ceil(min_time / max(time.perf_counter() - start, 1e-9))))
+    times = []
+    gc.collect()
+    gc.disable()
+    try:
+        for i in range(repeat):
+            start = time.perf_counter()
+            for j in range(number):
+                function()
+            times.append((time.perf_counter() - start) / number)
+    finally:
+        gc.enable()
+    return float(np.min(times))
+
+
+def benchObjParser(results, sizes):
+    from ObjParser import parsOBJ, loadOBJ, writeGridOBJ
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for faces in sizes:
+            path = os.path.join(temp_dir, 'grid_{0}.obj'.format(faces))
+            writeGridOBJ(path, faces)
+            repeat = 7 if faces <= 100000 else 3
+            results['obj.parsOBJ.{0}'.format(faces)] = measure(lambda: parsOBJ(path, use_cache=False), repeat)
+            results['obj.loadOBJ.{0}'.format(faces)] = measure(lambda: loadOBJ(path, use_cache=False), repeat)
+
+
+def benchCircle(results, sizes):
+    from ToolPathCreator import circle
+
+    for segments in sizes:
+        results['circle.{0}'.format(segments)] = measure(lambda: circle(segments, [1.5, 2, 1]), 7 if segments <= 1000000 else 3)
+
+
+def benchInverseKinematics(results, steps):
+    # seconds per tool path step, one call per step as the viewer used to do against one call for all steps
+    from Machine import buildDefaultMachine
+    from ToolPathCreator import circle
+
+    machine = buildDefaultMachine()
+    tool_path = circle(steps, [1.5, 2, 1])
+
+    def perStep():
+        for tool_step in tool_path:
+            machine.calculateDesiredState(tool_step)
+
+    # the batched cost per step depends on the number of steps, so the names carry it
+    results['ik.per_step.{0}'.format(steps)] = measure(perStep, repeat=3) / steps
+    results['ik.batched.{0}'.format(steps)] = measure(lambda: machine.calculateDesiredStates(tool_path)) / steps
+
+
+def buildDeepMachine(depth):
+    # chain of depth axes with a leaf branch at every level, 2 * depth axes in total
+    from Machine import buildMachine
+
+    movements = [{'type': 'linear', 'axis': 'x'}, {'type': 'rotation', 'axis': 'y'},
+                 {'type': 'linear', 'axis': 'z'}, {'type': 'rotation', 'axis': 'z'}]
+    child = None
+    for level in reversed(range(depth)):
+        definition = {'name': 'axis_{0}'.format(level), 'model': 'cube.obj', 'position': [0, 0.1, 0],
+                      'movement': movements[level % len(movements)], 'children': []}
+        definition['children'].append({'name': 'leaf_{0}'.format(level), 'model': 'cube.obj', 'position': [0.1, 0, 0]})
+        if child is not None:
+            definition['children'].append(child)
+        child = definition
+    roles = {role: 'axis_{0}'.format(i) for i, role in enumerate(('x_axis', 'y_axis', 'z_axis', 'a_axis', 'b_axis'))}
+    return buildMachine({'base': child, 'roles': roles})
+
+
+def benchDeepTrees(results, depths):
+    # full update after the root moved against the incremental update after one leaf moved,
+    # for the machine with one object per axis and for the array backed CompactMachine
+    from CompactMachine import CompactMachine
+
+    for depth in depths:
+        machine = buildDeepMachine(depth)
+        for prefix, target in (('', machine), ('compact_', CompactMachine(machine.getDefinition()))):
+            chain = target.getKinematicChain()
+            root = chain.axes[0]
+            leaf = chain.axes[-1]
+            target.buildMachinState()
+
+            def moveRoot():
+                root.setAxisPositionInMM(root.axis_position * 1000 + 1)
+                target.buildMachinState()
+
+            def moveLeaf():
+                leaf.setAxisPositionInMM(leaf.axis_position * 1000 + 1)
+                target.buildMachinState()
+
+            results['tree.{0}_axes.{1}root_moved'.format(len(chain), prefix)] = measure(moveRoot)
+            results['tree.{0}_axes.{1}leaf_moved'.format(len(chain), prefix)] = measure(moveLeaf)
+
+
+def benchPaintGL(results, frames, width, height):
+    # SceneRenderer.paint is what GLWidget.paintGL runs, here in an EGL pbuffer, e.g. Mesa llvmpipe without a GPU
+    from OffscreenContext import OffscreenContext
+    import OpenGL.GL as gl
+
+    from Machine import buildDefaultMachine
+    from SceneRenderer import SceneRenderer
+    from ToolPathCreator import circle
+
+    context = OffscreenContext(width, height)
+    results['gl_renderer'] = context.getOpenglInfo()
+    scene = SceneRenderer()
+    scene.initializeGL()
+    scene.resize(width, height)
+
+    machine = buildDefaultMachine()
+    machine.setToolPath(circle(500, [1.5, 2, 1]))
+    states = machine.calculateDesiredStates(machine.tool_path)
+    frame = [0]
+
+    def paint():
+        machine.setState(states[frame[0] % len(states)])
+        machine.buildMachinState()
+        scene.paint(machine)
+        gl.glFinish()
+        frame[0] += 1
+
+    results['paintGL.frame.{0}x{1}'.format(width, height)] = measure(paint, repeat=5, number=max(frames // 5, 1))
+    scene.cleanup()
+    context.release()
+
+
+def runBenchmarks(quick=False, paint=True):
+    results = {}
+    if quick:
+        benchObjParser(results, [1000, 10000])
+        benchCircle(results, [1000, 10000, 100000])
+        benchInverseKinematics(results, 2000)
+        benchDeepTrees(results, [8, 64])
+    else:
+        benchObjParser(results, [1000, 10000, 100000, 1000000])
+        benchCircle(results, [1000, 10000, 100000, 1000000, 10000000])
+        benchInverseKinematics(results, 10000)
+        benchDeepTrees(results, [8, 64, 256])
+    if paint:
+        try:
+            benchPaintGL(results, 50 if quick else 200, 1920, 1080)
+        except Exception as e:
+            # no EGL on this machine, the other results are still useful
+            print('paintGL benchmark skipped: {0}'.format(e))
+    return results
+
+
+def getEnvironment():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+            'system': platform.system(), 'processor': platform.processor(), 'cpus': os.cpu_count()}
+
+
+def compare(results, baseline, threshold, min_difference=5e-5):
+    # names of the timings that got slower than baseline * (1 + threshold) and by more than min_difference seconds,
+    # calls of a few microseconds vary by more than the threshold from one process to the next. names carry the
+    # problem size, so a quick run is only compared with the same sizes of a full baseline
+    regressions = []
+    missing = [name for name, base in baseline.items() if isinstance(base, float) and name not in results]
+    if missing:
+        print('{0} baseline timings not measured in this run: {1}'.format(len(missing), ', '.join(sorted(missing))))
+    for name, seconds in sorted(results.items()):
+        base = baseline.get(name)
+        if not isinstance(seconds, float) or not isinstance(base, float):
+            continue
+        ratio = seconds / base if base > 0 else 1.0
+        flag = 'REGRESSION' if ratio > 1 + threshold and seconds - base > min_difference else ''
+        print('{0:<36} {1:12.6f} ms  baseline {2:12.6f} ms  {3:6.2f}x  {4}'.format(name, seconds * 1000, base * 1000, ratio, flag))
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='headless benchmarks of parsing, kinematics and offscreen rendering')
+    parser.add_argument('--quick', action='store_true', help='small sizes only, e.g. for a quick check before committing')
+    parser.add_argument('--no-paint', action='store_true', help='skip the offscreen rendering benchmark')
+    parser.add_argument('--output', default=None, help='write the results as json')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='json results to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results to the baseline file instead of comparing')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown before a result counts as regression')
+    parser.add_argument('--min-difference', type=float, default=0.05, help='milliseconds a result must also be slower by to count as regression')
+    args = parser.parse_args(argv)
+
+    results = runBenchmarks(args.quick, not args.no_paint)
+    document = {'environment': getEnvironment(), 'quick': args.quick, 'results': results}
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+        print('baseline written to {0}'.format(args.baseline))
+        return 0
+
+    if not os.path.exists(args.baseline):
+        for name, seconds in sorted(results.items()):
+            if isinstance(seconds, float):
+                print('{0:<36} {1:12.6f} ms'.format(name, seconds * 1000))
+        print('no baseline at {0}, run with --save-baseline to create one'.format(args.baseline))
+        return 0
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    if baseline.get('environment') != document['environment']:
+        print('warning: the baseline was measured in a different environment')
+    regressions = compare(results, baseline['results'], args.threshold, args.min_difference / 1000)
+    if regressions:
+        # a real regression shows up again, a busy moment of the machine does not
+        print('measuring again to confirm {0} regressions'.format(len(regressions)))
+        again = runBenchmarks(args.quick, not args.no_paint)
+        for name, seconds in again.items():
+            if isinstance(seconds, float) and isinstance(results.get(name), float):
+                results[name] = min(results[name], seconds)
+        if args.output is not None:
+            with open(args.output, 'w') as f:
+                json.dump(document, f, indent=2, sort_keys=True)
+        regressions = compare(results, baseline['results'], args.threshold, args.min_difference / 1000)
+    if regressions:
+        print('{0} regressions above {1:.0%}: {2}'.format(len(regressions), args.threshold, ', '.join(regressions)))
+        return 1
+    print('no regressions above {0:.0%}'.format(args.threshold))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,316 @@
+import sys
+import time
+import argparse
+from itertools import combinations
+
+import numpy as np
+
+# interference checking of the axis meshes along a trajectory, must not import PyQt5 or OpenGL
+
+
+def spreadBits(values):
+    # 10 bit integers with two zero bits inserted between all bits, for morton codes
+    values = values.astype(np.uint32) & 0x3ff
+    values = (values | (values << 16)) & 0x030000ff
+    values = (values | (values << 8)) & 0x0300f00f
+    values = (values | (values << 4)) & 0x030c30c3
+    values = (values | (values << 2)) & 0x09249249
+    return values
+
+
+def mortonCodes(points):
+    lo = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lo, 1e-12)
+    cells = np.minimum((points - lo) / extent * 1024, 1023)
+    return (spreadBits(cells[:, 0]) << 2) | (spreadBits(cells[:, 1]) << 1) | spreadBits(cells[:, 2])
+
+
+def transformBoxes(lo, hi, rotation, translation):
+    # boxes moved by the rigid transforms, returns the axis aligned center and half size in the new frame
+    center = (lo + hi) / 2
+    half = (hi - lo) / 2
+    return np.einsum('...ij,...j->...i', rotation, center) + translation, \
+        np.einsum('...ij,...j->...i', np.abs(rotation), half)
+
+
+def boxesOverlap(lo, hi, center, half, clearance=0.0):
+    # axis aligned boxes given as lo/hi against boxes given as center/half size
+    return np.all(np.abs((lo + hi) / 2 - center) <= (hi - lo) / 2 + half + clearance, axis=-1)
+
+
+def projectionsSeparated(axes, triangles_a, triangles_b, clearance):
+    # (P, K, 3) axes, true for the pairs where one of the axes separates the projections of the triangles
+    projection_a = np.matmul(axes, np.swapaxes(triangles_a, 1, 2))
+    projection_b = np.matmul(axes, np.swapaxes(triangles_b, 1, 2))
+    min_a = np.minimum(np.minimum(projection_a[..., 0], projection_a[..., 1]), projection_a[..., 2])
+    max_a = np.maximum(np.maximum(projection_a[..., 0], projection_a[..., 1]), projection_a[..., 2])
+    min_b = np.minimum(np.minimum(projection_b[..., 0], projection_b[..., 1]), projection_b[..., 2])
+    max_b = np.maximum(np.maximum(projection_b[..., 0], projection_b[..., 1]), projection_b[..., 2])
+    # degenerate axes project everything to 0 and never separate
+    return np.any((max_a + clearance < min_b) | (max_b + clearance < min_a), axis=1)
+
+
+def trianglesIntersect(triangles_a, triangles_b, clearance=0.0):
+    # separating axis test of (P, 3, 3) triangle pairs: both normals, the 9 edge cross products
+    # and the in plane edge normals of both triangles for the coplanar case.
+    # the normals separate most pairs, so the other axes are only tested for the rest
+    edges_a = np.roll(triangles_a, -1, axis=1) - triangles_a
+    edges_b = np.roll(triangles_b, -1, axis=1) - triangles_b
+    normal_a = np.cross(edges_a[:, 0], edges_a[:, 1])
+    normal_b = np.cross(edges_b[:, 0], edges_b[:, 1])
+
+    axes = np.stack([normal_a, normal_b], axis=1)
+    axes /= np.maximum(np.sqrt(np.sum(np.square(axes), axis=2)), 1e-300)[:, :, None]
+    intersecting = ~projectionsSeparated(axes, triangles_a, triangles_b, clearance)
+
+    rest = np.flatnonzero(intersecting)
+    edges_a, edges_b = edges_a[rest], edges_b[rest]
+    axes = np.concatenate([
+        np.cross(edges_a[:, :, None], edges_b[:, None, :]).reshape(-1, 9, 3),
+        np.cross(normal_a[rest, None], edges_a), np.cross(normal_b[rest, None], edges_b),
+    ], axis=1)
+    lengths = np.sqrt(np.sum(np.square(axes), axis=2))
+    axes /= np.where(lengths > 1e-12, lengths, np.inf)[:, :, None]
+    intersecting[rest] = ~projectionsSeparated(axes, triangles_a[rest], triangles_b[rest], clearance)
+    return intersecting
+
+
+class MeshBVH:
+    # implicit binary tree over the morton ordered triangles of a mesh, level d has 2^d nodes,
+    # the children of node i are 2i and 2i+1 on the next level and every leaf holds leaf_size to 2*leaf_size triangles
+
+    def __init__(self, mesh, leaf_size=4):
+        vertices = np.asarray(mesh.vertices, dtype=float)
+        triangles = vertices[np.asarray(mesh.indices).reshape(-1, 3)]
+        order = np.argsort(mortonCodes(triangles.mean(axis=1)), kind='stable')
+        self.triangles = triangles[order]
+        self.triangle_lo = self.triangles.min(axis=1)
+        self.triangle_hi = self.triangles.max(axis=1)
+
+        triangle_count = len(self.triangles)
+        self.depth = int(np.floor(np.log2(triangle_count / leaf_size))) if triangle_count > leaf_size else 0
+        leaf_count = 2 ** self.depth
+        starts = np.arange(leaf_count + 1) * triangle_count // leaf_count
+
+        # (leaves, max leaf size) triangle indices, -1 padded
+        counts = np.diff(starts)
+        slots = np.arange(counts.max())
+        self.leaf_triangles = np.where(slots < counts[:, None], starts[:-1, None] + slots, -1)
+
+        self.lo = [np.minimum.reduceat(self.triangle_lo, starts[:-1], axis=0)]
+        self.hi = [np.maximum.reduceat(self.triangle_hi, starts[:-1], axis=0)]
+        for level in range(self.depth):
+            self.lo.insert(0, np.minimum(self.lo[0][0::2], self.lo[0][1::2]))
+            self.hi.insert(0, np.maximum(self.hi[0][0::2], self.hi[0][1::2]))
+
+    def getBounds(self):
+        return self.lo[0][0], self.hi[0][0]
+
+
+def collidingSamples(bvh_a, bvh_b, rotations, translations, clearance=0.0):
+    # narrow phase for bvh_b placed in the frame of bvh_a by (S, 3, 3) rotations and (S, 3) translations,
+    # returns the sorted indices of the samples where the meshes touch
+    samples = np.arange(len(rotations))
+    nodes_a = np.zeros(len(rotations), dtype=int)
+    nodes_b = np.zeros(len(rotations), dtype=int)
+    level_a = level_b = 0
+
+    # both trees are descended together, every node pair of the front is on the same levels
+    while True:
+        center, half = transformBoxes(bvh_b.lo[level_b][nodes_b], bvh_b.hi[level_b][nodes_b], rotations[samples], translations[samples])
+        overlapping = boxesOverlap(bvh_a.lo[level_a][nodes_a], bvh_a.hi[level_a][nodes_a], center, half, clearance)
+        samples, nodes_a, nodes_b = samples[overlapping], nodes_a[overlapping], nodes_b[overlapping]
+        if len(samples) == 0 or (level_a == bvh_a.depth and level_b == bvh_b.depth):
+            break
+
+        if level_a < bvh_a.depth:
+            samples, nodes_b = np.repeat(samples, 2), np.repeat(nodes_b, 2)
+            nodes_a = (nodes_a[:, None] * 2 + [0, 1]).ravel()
+            level_a += 1
+        if level_b < bvh_b.depth:
+            samples, nodes_a = np.repeat(samples, 2), np.repeat(nodes_a, 2)
+            nodes_b = (nodes_b[:, None] * 2 + [0, 1]).ravel()
+            level_b += 1
+
+    if len(samples) == 0:
+        return samples
+    center, half = center[overlapping], half[overlapping]
+
+    # the triangles of every b leaf are moved into the frame of a once per sample
+    leaf_count_b = len(bvh_b.leaf_triangles)
+    moved_leaves, leaf_pair_moved = np.unique(samples * leaf_count_b + nodes_b, return_inverse=True)
+    moved_samples = moved_leaves // leaf_count_b
+    triangles_b = bvh_b.leaf_triangles[moved_leaves % leaf_count_b]
+    moved_b = np.matmul(bvh_b.triangles[triangles_b], np.swapaxes(rotations[moved_samples], 1, 2)[:, None]) \
+        + translations[moved_samples][:, None, None]
+    moved_lo = moved_b.min(axis=2)
+    moved_hi = moved_b.max(axis=2)
+
+    # only triangles overlapping the leaf box of the other mesh are paired up
+    leaf_lo_a = bvh_a.lo[level_a][nodes_a][:, None]
+    leaf_hi_a = bvh_a.hi[level_a][nodes_a][:, None]
+    triangles_a = bvh_a.leaf_triangles[nodes_a]
+    inside_a = (triangles_a >= 0) & boxesOverlap(bvh_a.triangle_lo[triangles_a], bvh_a.triangle_hi[triangles_a],
+                                                 center[:, None], half[:, None], clearance)
+    inside_b = (triangles_b[leaf_pair_moved] >= 0) & \
+        np.all((moved_lo[leaf_pair_moved] <= leaf_hi_a + clearance) & (moved_hi[leaf_pair_moved] >= leaf_lo_a - clearance), axis=2)
+    leaf_pairs, slots_a, slots_b = np.nonzero(inside_a[:, :, None] & inside_b[:, None, :])
+
+    triangles_a = triangles_a[leaf_pairs, slots_a]
+    moved_index = leaf_pair_moved[leaf_pairs], slots_b
+    overlapping = np.all((moved_lo[moved_index] <= bvh_a.triangle_hi[triangles_a] + clearance) &
+                         (moved_hi[moved_index] >= bvh_a.triangle_lo[triangles_a] - clearance), axis=1)
+    moved_index = moved_index[0][overlapping], moved_index[1][overlapping]
+    intersecting = trianglesIntersect(bvh_a.triangles[triangles_a[overlapping]], moved_b[moved_index], clearance)
+    return np.unique(samples[leaf_pairs[overlapping][intersecting]])
+
+
+class CollisionChecker:
+    # first tool path index at which each pair of axis meshes interferes. by default every pair is checked
+    # except axes and their direct children, which are usually in contact by design.
+    # samples are skipped when the swept bounding boxes of a window of samples do not overlap (broad phase),
+    # and when the relative pose of the pair did not change since the previous sample (temporal coherence)
+
+    def __init__(self, machine, pairs=None, window=64, batch_size=256, clearance=0.0, leaf_size=4):
+        self.machine = machine
+        self.window = window
+        self.batch_size = batch_size
+        self.clearance = clearance
+        self.leaf_size = leaf_size
+
+        chain = machine.getKinematicChain()
+        if pairs is None:
+            pairs = [(a, b) for a, b in combinations(range(len(chain)), 2)
+                     if chain.parents[a] != b and chain.parents[b] != a]
+        else:
+            pairs = [(chain.indexOf(a), chain.indexOf(b)) for a, b in pairs]
+        self.pairs = pairs
+
+        self.bvhs = {}
+        self.first_collisions = {}
+        self.last_relative = {}
+        self.samples = 0
+        self.broad_phase_culled = 0
+        self.coherent_skipped = 0
+        self.narrow_phase_tested = 0
+
+    def getBVH(self, axis):
+        # one hierarchy per mesh file, axes sharing a model share it
+        bvh = self.bvhs.get(axis.mesh_key)
+        if bvh is None:
+            bvh = MeshBVH(axis.getMesh(), self.leaf_size)
+            self.bvhs[axis.mesh_key] = bvh
+        return bvh
+
+    def getPairName(self, pair):
+        names = self.machine.getKinematicChain().names
+        return names[pair[0]], names[pair[1]]
+
+    def check(self, states, start_index=0):
+        # checks a chunk of (N, 5) axis states, start_index is the tool path index of the first state.
+        # chunks have to be checked in order, pairs already known to collide are not checked again
+        chain = self.machine.getKinematicChain()
+        world = self.machine.calculateWorldTransforms(states)
+        self.samples += len(world)
+
+        for pair in self.pairs:
+            if pair in self.first_collisions or len(world) == 0:
+                continue
+            index = self.checkPair(pair, world, chain)
+            if index is not None:
+                self.first_collisions[pair] = start_index + index
+        return self.getCollisions()
+
+    def checkPair(self, pair, world, chain):
+        bvh_a = self.getBVH(chain.axes[pair[0]])
+        bvh_b = self.getBVH(chain.axes[pair[1]])
+
+        # pose of b in the frame of a
+        rotation_a = world[:, pair[0], :3, :3]
+        inverse_rotation = np.swapaxes(rotation_a, 1, 2)
+        rotations = np.matmul(inverse_rotation, world[:, pair[1], :3, :3])
+        translations = np.einsum('nij,nj->ni', inverse_rotation, world[:, pair[1], :3, 3] - world[:, pair[0], :3, 3])
+
+        # temporal coherence, only the first sample of a run with unchanged relative pose needs a test
+        relative = np.concatenate([rotations.reshape(-1, 9), translations], axis=1)
+        previous = self.last_relative.get(pair)
+        changed = np.empty(len(relative), dtype=bool)
+        changed[0] = previous is None or np.any(np.abs(relative[0] - previous) > 1e-12)
+        changed[1:] = np.any(np.abs(relative[1:] - relative[:-1]) > 1e-12, axis=1)
+        self.last_relative[pair] = relative[-1]
+        candidates = np.flatnonzero(changed)
+        self.coherent_skipped += len(relative) - len(candidates)
+
+        # broad phase, root box of b against root box of a, first swept over windows of samples then per sample
+        lo_a, hi_a = bvh_a.getBounds()
+        lo_b, hi_b = bvh_b.getBounds()
+        center, half = transformBoxes(lo_b, hi_b, rotations, translations)
+        sample_lo = center - half
+        sample_hi = center + half
+        window_starts = np.arange(0, len(relative), self.window)
+        window_lo = np.minimum.reduceat(sample_lo, window_starts)
+        window_hi = np.maximum.reduceat(sample_hi, window_starts)
+        swept = boxesOverlap(lo_a, hi_a, (window_lo + window_hi) / 2, (window_hi - window_lo) / 2, self.clearance)
+        swept = np.repeat(swept, self.window)[:len(relative)]
+        candidates = candidates[swept[candidates]]
+        candidates = candidates[boxesOverlap(lo_a, hi_a, center[candidates], half[candidates], self.clearance)]
+        self.broad_phase_culled += int(np.sum(changed)) - len(candidates)
+
+        # narrow phase in order, stopping at the first batch with a collision
+        for start in range(0, len(candidates), self.batch_size):
+            batch = candidates[start:start + self.batch_size]
+            self.narrow_phase_tested += len(batch)
+            hits = collidingSamples(bvh_a, bvh_b, rotations[batch], translations[batch], self.clearance)
+            if len(hits) > 0:
+                return int(batch[hits[0]])
+        return None
+
+    def getCollisions(self):
+        # {(axis name, axis name): first colliding tool path index}
+        return {self.getPairName(pair): index for pair, index in sorted(self.first_collisions.items(), key=lambda item: item[1])}
+
+    def getStats(self):
+        return '{0} samples x {1} pairs: {2} skipped as unchanged, {3} culled by bounding boxes, {4} tested'.format(
+            self.samples, len(self.pairs), self.coherent_skipped, self.broad_phase_culled, self.narrow_phase_tested)
+
+
+def checkToolPath(machine, tool_path_file, chunk_size=100000, **kwargs):
+    from ToolPathReader import readToolPath
+
+    checker = CollisionChecker(machine, **kwargs)
+    index = 0
+    for tool_path in readToolPath(tool_path_file, chunk_size):
+        checker.check(machine.calculateDesiredStates(tool_path), index)
+        index += len(tool_path)
+    return checker
+
+
+def main(argv=None):
+    from Machine import buildDefaultMachine, loadMachine
+
+    parser = argparse.ArgumentParser(description='reports the first tool path index at which two machine parts interfere')
+    parser.add_argument('tool_path', help='any tool path file Simulate.py reads')
+    parser.add_argument('--machine', default=None, help='json machine definition, the demo machine if omitted')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--clearance', type=float, default=0.0, help='parts closer than this [m] count as colliding')
+    parser.add_argument('--pair', nargs=2, action='append', metavar=('AXIS', 'AXIS'),
+                        help='check only these axis pairs, by default all pairs except parent and child')
+    args = parser.parse_args(argv)
+
+    machine = buildDefaultMachine() if args.machine is None else loadMachine(args.machine)
+
+    start = time.perf_counter()
+    checker = checkToolPath(machine, args.tool_path, args.chunk_size, pairs=args.pair, clearance=args.clearance)
+    duration = time.perf_counter() - start
+
+    collisions = checker.getCollisions()
+    for (name_a, name_b), index in collisions.items():
+        print('{0} / {1}: first collision at tool path index {2}'.format(name_a, name_b, index))
+    if not collisions:
+        print('no collisions')
+    print('{0} in {1:.3f} s'.format(checker.getStats(), duration))
+    return 1 if collisions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,428 @@
+import os
+import math
+import weakref
+
+import numpy as np
+
+import Kinematics
+import MeshRegistry
+from Machine import Machine, MODEL_DIR, ROLES, DEFAULT_MACHINE
+
+# a machine kept in a handful of contiguous arrays instead of one object with seven arrays per axis. the axes are
+# small views into these arrays with the attributes and methods of Machine.Axis, so renderers, the trajectory cache
+# and the checks work on it unchanged. buildMachinState updates the world transforms in place without allocating,
+# copy() makes a variant for parameter sweeps without touching the model files again
+
+MOVEMENT_AXES = {'x': (1.0, 0.0, 0.0), 'y': (0.0, 1.0, 0.0), 'z': (0.0, 0.0, 1.0)}
+
+
+def flattenDefinition(definition):
+    # axis definitions in kinematic chain order (parents before children) and their parent indices
+    definitions = []
+    parents = []
+    stack = [(definition, -1)]
+    while stack:
+        axis_definition, parent = stack.pop()
+        parents.append(parent)
+        definitions.append(axis_definition)
+        for child in reversed(axis_definition.get('children', [])):
+            stack.append((child, len(definitions) - 1))
+    return definitions, parents
+
+
+def releaseMeshes(mesh_keys):
+    for mesh_key in mesh_keys:
+        MeshRegistry.registry.release(mesh_key)
+
+
+class AxisView:
+    # one axis of a CompactMachine, every array attribute is a view into the machine buffers
+    __slots__ = ('machine', 'index')
+
+    def __init__(self, machine, index):
+        self.machine = machine
+        self.index = index
+
+    def __repr__(self):
+        return 'AxisView({0!r})'.format(self.name)
+
+    @property
+    def name(self):
+        return self.machine.names[self.index]
+
+    @property
+    def children(self):
+        return [self.machine.axes[i] for i in self.machine.children[self.index]]
+
+    @property
+    def model_path(self):
+        return self.machine.model_paths[self.index]
+
+    @property
+    def mesh_key(self):
+        return self.machine.mesh_keys[self.index]
+
+    @property
+    def color(self):
+        return tuple(int(c) for c in self.machine.colors[self.index])
+
+    @property
+    def movement_type(self):
+        return self.machine.movements[self.index][0]
+
+    @property
+    def movement_axis(self):
+        return self.machine.movements[self.index][1]
+
+    @property
+    def movement_negative(self):
+        return self.machine.movements[self.index][2]
+
+    @property
+    def relative_translation(self):
+        return self.machine.relative_translation[self.index]
+
+    @property
+    def relative_rotation(self):
+        return self.machine.relative_euler[self.index]
+
+    @property
+    def linear_movement(self):
+        return self.machine.linear_movement[self.index]
+
+    @property
+    def rotational_movement(self):
+        return self.machine.rotational_movement[self.index]
+
+    @property
+    def tool_end_offset(self):
+        return self.machine.tool_end_offset[self.index]
+
+    @property
+    def absolute_transform(self):
+        return self.machine.world_transforms[self.index]
+
+    @property
+    def absolute_translation(self):
+        return self.machine.world_transforms[self.index, :3, 3]
+
+    @property
+    def absolute_rotation(self):
+        return Kinematics.matrixToEuler(self.machine.world_transforms[self.index, :3, :3])
+
+    @property
+    def axis_position(self):
+        return float(self.machine.positions[self.index])
+
+    @axis_position.setter
+    def axis_position(self, value):
+        self.machine.positions[self.index] = value
+
+    @property
+    def position_dirty(self):
+        return bool(self.machine.dirty[self.index])
+
+    @position_dirty.setter
+    def position_dirty(self, value):
+        self.machine.dirty[self.index] = value
+
+    @property
+    def travel_limits(self):
+        travel = self.machine.travel_limits[self.index]
+        return None if np.isnan(travel[0]) else (float(travel[0]), float(travel[1]))
+
+    @property
+    def max_velocity(self):
+        return self.machine.getLimit(self.machine.max_velocity, self.index)
+
+    @property
+    def max_acceleration(self):
+        return self.machine.getLimit(self.machine.max_acceleration, self.index)
+
+    @property
+    def max_jerk(self):
+        return self.machine.getLimit(self.machine.max_jerk, self.index)
+
+    def getMesh(self):
+        return MeshRegistry.registry.get(self.mesh_key)
+
+    def getVertices(self):
+        return self.getMesh().getTriangleVertices()
+
+    def setColor(self, r, g, b):
+        self.machine.colors[self.index] = (r, g, b)
+
+    def getColorF(self):
+        r, g, b = self.machine.colors[self.index]
+        return (r / 255, g / 255, b / 255, 1.0)
+
+    def setRelativePosition(self, x, y, z):
+        # in place, the axis and everything below it is recomputed by the next buildMachinState
+        self.machine.relative_translation[self.index] = (x, y, z)
+        self.machine.dirty[self.index] = True
+
+    def setToolEndOffset(self, x, y, z):
+        self.machine.tool_end_offset[self.index] = (x, y, z)
+
+    def defineMovement(self, type='liner', axis='x', negative=False):
+        self.machine.setMovement(self.index, type, axis, negative)
+
+    def setLimits(self, travel=None, velocity=None, acceleration=None, jerk=None):
+        machine = self.machine
+        machine.travel_limits[self.index] = (np.nan, np.nan) if travel is None else (travel[0], travel[1])
+        for limits, value in ((machine.max_velocity, velocity), (machine.max_acceleration, acceleration), (machine.max_jerk, jerk)):
+            limits[self.index] = np.nan if value is None else value
+
+    def getLimits(self):
+        limits = {'travel': self.travel_limits, 'velocity': self.max_velocity,
+                  'acceleration': self.max_acceleration, 'jerk': self.max_jerk}
+        return {name: value for name, value in limits.items() if value is not None}
+
+    def setAxisPositionInMM(self, value):
+        value = value / 1000
+        if value != self.machine.positions[self.index]:
+            self.machine.positions[self.index] = value
+            self.machine.dirty[self.index] = True
+
+    def setAxisPositionInDeg(self, value):
+        if value != self.machine.positions[self.index]:
+            self.machine.positions[self.index] = value
+            self.machine.dirty[self.index] = True
+
+    def getDefinition(self):
+        definition = {
+            'name': self.name,
+            'model': self.model_path,
+            'color': list(self.color),
+            'position': self.relative_translation.tolist(),
+        }
+        if self.movement_type in ('linear', 'rotation'):
+            definition['movement'] = {'type': self.movement_type, 'axis': self.movement_axis, 'negative': self.movement_negative}
+        if np.any(self.tool_end_offset):
+            definition['tool_end_offset'] = self.tool_end_offset.tolist()
+        if self.getLimits():
+            definition['limits'] = {name: list(value) if name == 'travel' else value for name, value in self.getLimits().items()}
+        if self.machine.children[self.index]:
+            definition['children'] = [child.getDefinition() for child in self.children]
+        return definition
+
+
+class CompactMachine(Kinematics.KinematicChain):
+    # the machine and its kinematic chain in one, see Machine and Kinematics.KinematicChain for the methods
+    ready = False
+
+    def __init__(self, definition=DEFAULT_MACHINE, model_dir=None):
+        if model_dir is None:
+            model_dir = MODEL_DIR
+        definitions, parents = flattenDefinition(definition['base'])
+        n_axes = len(definitions)
+
+        self.names = [axis_definition['name'] for axis_definition in definitions]
+        self.parents = np.array(parents, dtype=int)
+        self.children = [[] for i in range(n_axes)]
+        for i, parent in enumerate(parents):
+            if parent >= 0:
+                self.children[parent].append(i)
+
+        self.model_paths = [os.path.join(model_dir, axis_definition.get('model', 'cube.obj')) for axis_definition in definitions]
+        self.mesh_keys = [MeshRegistry.registry.acquire(path) for path in self.model_paths]
+
+        self.colors = np.zeros((n_axes, 3), dtype=np.uint8)
+        self.relative_translation = np.zeros((n_axes, 3))
+        self.relative_euler = np.zeros((n_axes, 3))
+        self.relative_rotation = np.zeros((n_axes, 3, 3))
+        self.relative_rotation[:] = np.identity(3)
+        self.linear_movement = np.zeros((n_axes, 3))
+        self.rotational_movement = np.zeros((n_axes, 3))
+        self.tool_end_offset = np.zeros((n_axes, 3))
+        self.travel_limits = np.full((n_axes, 2), np.nan)
+        self.max_velocity = np.full(n_axes, np.nan)
+        self.max_acceleration = np.full(n_axes, np.nan)
+        self.max_jerk = np.full(n_axes, np.nan)
+        self.movements = [('liner', 'x', False)] * n_axes
+
+        self.positions = np.zeros(n_axes)
+        self.dirty = np.ones(n_axes, dtype=bool)
+        self.world_transforms = np.zeros((n_axes, 4, 4))
+
+        self.axes = [AxisView(self, i) for i in range(n_axes)]
+        for axis, axis_definition in zip(self.axes, definitions):
+            if 'color' in axis_definition:
+                axis.setColor(*axis_definition['color'])
+            if 'movement' in axis_definition:
+                movement = axis_definition['movement']
+                axis.defineMovement(type=movement['type'], axis=movement['axis'], negative=movement.get('negative', False))
+            axis.setRelativePosition(*axis_definition.get('position', [0, 0, 0]))
+            if 'tool_end_offset' in axis_definition:
+                axis.setToolEndOffset(*axis_definition['tool_end_offset'])
+            if 'limits' in axis_definition:
+                axis.setLimits(**axis_definition['limits'])
+
+        self.base = self.axes[0]
+        for role in ROLES:
+            setattr(self, role, self.axes[self.names.index(definition['roles'][role])])
+
+        self.tool_path = []
+        self.tool_path_version = 0
+        self.state_version = 0
+        self.createScratch()
+        weakref.finalize(self, releaseMeshes, list(self.mesh_keys))
+
+    def createScratch(self):
+        # buffers reused by every buildMachinState and per axis views into the machine buffers, made once
+        self.local = np.identity(4)
+        self.rotation = np.identity(3)
+        self.rows = [(self.relative_translation[i], self.linear_movement[i], self.relative_rotation[i],
+                      self.world_transforms[i]) for i in range(len(self.axes))]
+        self.parent_list = self.parents.tolist()
+
+    @classmethod
+    def fromMachine(cls, machine):
+        compact = cls(machine.getDefinition(), model_dir='')
+        compact.setState([machine.x_axis.axis_position * 1000, machine.y_axis.axis_position * 1000,
+                          machine.z_axis.axis_position * 1000, machine.a_axis.axis_position, machine.b_axis.axis_position])
+        compact.setToolPath(machine.tool_path)
+        return compact
+
+    def copy(self):
+        # an independent variant sharing the meshes, e.g. to change relative positions in an optimization sweep
+        compact = CompactMachine.__new__(CompactMachine)
+        compact.__dict__.update(self.__dict__)
+        for name, value in self.__dict__.items():
+            if isinstance(value, np.ndarray):
+                setattr(compact, name, value.copy())
+            elif isinstance(value, list):
+                # names, movements and model paths are changed per axis, the variant gets its own lists
+                setattr(compact, name, list(value))
+        compact.children = [list(children) for children in self.children]
+        compact.mesh_keys = [MeshRegistry.registry.acquire(path) for path in self.model_paths]
+        compact.axes = [AxisView(compact, i) for i in range(len(self.axes))]
+        compact.base = compact.axes[0]
+        for role in ROLES:
+            setattr(compact, role, compact.axes[getattr(self, role).index])
+        compact.createScratch()
+        weakref.finalize(compact, releaseMeshes, list(compact.mesh_keys))
+        return compact
+
+    def __len__(self):
+        return len(self.axes)
+
+    def getKinematicChain(self):
+        return self
+
+    def getLimit(self, limits, index):
+        return None if np.isnan(limits[index]) else float(limits[index])
+
+    def setMovement(self, index, type, axis, negative):
+        self.movements[index] = (type, axis, negative)
+        movement_axis = np.multiply(MOVEMENT_AXES[axis], -1.0 if negative else 1.0)
+        if type == 'linear':
+            self.linear_movement[index] = movement_axis
+        elif type == 'rotation':
+            self.rotational_movement[index] = movement_axis
+        self.dirty[index] = True
+
+    def currentPositions(self):
+        return self.positions.copy()
+
+    def buildMachinState(self):
+        # recomputes the moved axes and their subtrees in place, returns False if nothing moved
+        dirty = self.dirty
+        if not dirty.any():
+            return False
+        local = self.local
+        rotation = self.rotation
+        local_translation = local[:3, 3]
+        local_rotation = local[:3, :3]
+        positions = self.positions
+        world = self.world_transforms
+        for i, parent in enumerate(self.parent_list):
+            if parent >= 0 and dirty[parent]:
+                dirty[i] = True
+            if not dirty[i]:
+                continue
+            relative_translation, linear_movement, relative_rotation, world_transform = self.rows[i]
+            position = positions[i]
+            np.multiply(linear_movement, position, out=local_translation)
+            local_translation += relative_translation
+            if self.setRotation(rotation, position, i):
+                np.matmul(relative_rotation, rotation, out=local_rotation)
+            else:
+                local_rotation[:] = relative_rotation
+            if parent < 0:
+                world_transform[:] = local
+            else:
+                np.matmul(world[parent], local, out=world_transform)
+        dirty[:] = False
+        self.state_version += 1
+        return True
+
+    def setRotation(self, rotation, angle, index):
+        # writes the rotation of axis index by angle [deg] into rotation, False for axes that do not rotate
+        x, y, z = self.rotational_movement[index]
+        if angle == 0.0 or (x == 0.0 and y == 0.0 and z == 0.0):
+            return False
+        # same as Kinematics.rotationMatrices for a unit axis, without temporaries
+        angle = math.radians(angle)
+        cos = math.cos(angle)
+        sin = math.sin(angle)
+        t = 1 - cos
+        rotation[0, 0] = t * x * x + cos
+        rotation[0, 1] = t * x * y - sin * z
+        rotation[0, 2] = t * x * z + sin * y
+        rotation[1, 0] = t * x * y + sin * z
+        rotation[1, 1] = t * y * y + cos
+        rotation[1, 2] = t * y * z - sin * x
+        rotation[2, 0] = t * x * z - sin * y
+        rotation[2, 1] = t * y * z + sin * x
+        rotation[2, 2] = t * z * z + cos
+        return True
+
+    def setWorldTransforms(self, world):
+        # (n_axes, 4, 4) transforms in chain order, e.g. one sample of a cached trajectory
+        self.dirty[:] = False
+        if np.array_equal(world, self.world_transforms):
+            return False
+        self.world_transforms[:] = world
+        self.state_version += 1
+        return True
+
+    def getDefinition(self):
+        return {'base': self.base.getDefinition(), 'roles': {role: getattr(self, role).name for role in ROLES}}
+
+    # everything else only needs the roles, the axis attributes and the chain, shared with Machine
+    axisPositionsFromStates = Machine.axisPositionsFromStates
+    calculateWorldTransforms = Machine.calculateWorldTransforms
+    calculateToolTipPositions = Machine.calculateToolTipPositions
+    calculateToolTipPathPositions = Machine.calculateToolTipPathPositions
+    calculateToolAxes = Machine.calculateToolAxes
+    getToolPositionWithoutRotation = Machine.getToolPositionWithoutRotation
+    calculateDesiredStates = Machine.calculateDesiredStates
+    calculateDesiredState = Machine.calculateDesiredState
+    setState = Machine.setState
+    setToolPath = Machine.setToolPath
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    from Machine import buildDefaultMachine
+    from ToolPathCreator import circle
+
+    # per step update time of the object per axis machine compared to the compact one
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    machine = buildDefaultMachine()
+    compact = CompactMachine()
+    states = machine.calculateDesiredStates(circle(steps, [1.5, 2, 1]))
+
+    for name, target in (('Machine', machine), ('CompactMachine', compact)):
+        start = time.perf_counter()
+        for state in states:
+            target.setState(state)
+            target.buildMachinState()
+        elapsed = time.perf_counter() - start
+        print('{0:<16} {1:8.2f} us per step'.format(name, elapsed / steps * 1e6))
+
+    error = np.max(np.abs(machine.world_transforms - compact.world_transforms))
+    print('max transform difference {0:.2e}'.format(error))
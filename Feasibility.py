@@ -0,0 +1,188 @@
+import sys
+import time
+import argparse
+
+import numpy as np
+
+import Kinematics
+
+# travel, velocity, acceleration and jerk limits of the solved axis trajectory, must not import PyQt5 or OpenGL
+
+# tool path index of the first sample of every derivative, velocity k is the move from k to k + 1
+INDEX_OFFSETS = {'travel': 0, 'velocity': 1, 'acceleration': 1, 'jerk': 2}
+
+
+def stepTimes(tool_path, feed_rate=None, sample_time=None):
+    # (N - 1,) seconds per move, either fixed or the tool path distance at feed_rate [mm/min].
+    # pure rotations take no time at a programmed feed, their rotary speeds are reported as infinite
+    if sample_time is not None:
+        return np.full(max(len(tool_path) - 1, 0), float(sample_time))
+    moves = np.diff(np.asarray(tool_path)[:, :3], axis=0)
+    return np.sqrt(np.sum(np.square(moves), axis=1)) / (feed_rate / 60)
+
+
+def unwrapRotations(states, tool_pos_without_rot, previous=None):
+    # getAngle puts a into [0, 360), so a turn through 0 jumps by 360, and when the tool normal passes the pole
+    # a jumps by 180 while b changes its sign. (a + 180, -b) gives the same normal, so every sample is put on the
+    # branch closest to its predecessor and a is unwrapped to a continuous angle.
+    # the xyz positions of samples on the other branch are compensated again, the tool tip does not move.
+    # returns the new states and the indices of the a wraps and the b flips.
+    # previous is the last unwrapped state before states, to unwrap a trajectory block by block
+    if previous is not None:
+        states, wraps, flips = unwrapRotations(np.concatenate([np.reshape(previous, (1, 5)), states]), tool_pos_without_rot)
+        return states[1:], wraps - 1, flips - 1
+    states = np.array(states, dtype=float)
+    a = states[:, Kinematics.A]
+    b = states[:, Kinematics.B]
+    if len(states) < 2:
+        return states, np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+
+    step_a = np.diff(a)
+    same_branch = np.abs(np.mod(step_a + 180, 360) - 180) + np.abs(np.diff(b))
+    other_branch = np.abs(np.mod(step_a, 360) - 180) + np.abs(b[1:] + b[:-1])
+    flips = np.flatnonzero(other_branch < same_branch) + 1
+
+    flipped = np.zeros(len(states), dtype=bool)
+    flipped[flips] = True
+    flipped = np.logical_xor.accumulate(flipped)
+
+    # at the pole itself a is arbitrary, it keeps the angle of the sample before
+    pole = np.abs(b) < 1e-9
+    rows = np.flatnonzero(flipped | pole)
+    if len(rows):
+        old = np.stack(Kinematics.rotationCompensation(a[rows], b[rows], tool_pos_without_rot), axis=1)
+        a[flipped] = np.mod(a[flipped] + 180, 360)
+        b[flipped] *= -1
+        previous = np.where(pole, -1, np.arange(len(states)))
+        np.maximum.accumulate(previous, out=previous)
+        pole &= previous >= 0
+        a[pole] = a[previous[pole]]
+        new = np.stack(Kinematics.rotationCompensation(a[rows], b[rows], tool_pos_without_rot), axis=1)
+        states[rows, :3] += (old - new) * 1000
+
+    step_a = np.diff(a)
+    wraps = np.flatnonzero(np.abs(step_a) > 180) + 1
+    a[1:] -= np.cumsum(np.round(step_a / 360) * 360)
+    return states, wraps, flips
+
+
+def rate(change, seconds):
+    # change per second, no change in no time has no rate instead of 0/0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = change / seconds
+    values[change == 0] = 0.0
+    return values
+
+
+def findRanges(mask):
+    # (K, 2) start and end indices of the runs of True
+    edges = np.diff(mask.astype(np.int8), prepend=0, append=0)
+    return np.stack([np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)], axis=1)
+
+
+class FeasibilityReport:
+    # violations and peaks per (role, quantity), ranges are [start, end) tool path indices
+
+    def __init__(self, states, wraps, flips, samples=None):
+        self.states = states
+        self.wraps = wraps
+        self.flips = flips
+        # tool path index of every checked sample, repeated points are left out
+        self.samples = np.arange(len(states)) if samples is None else samples
+        self.violations = {}
+        self.peaks = {}
+        self.maxima = {}
+
+    def addQuantity(self, role, quantity, values, limit):
+        # fmax ignores nan, e.g. the change of two infinite rotary speeds
+        self.maxima[(role, quantity)] = float(np.fmax.reduce(np.abs(values))) if len(values) else 0.0
+        if limit is None:
+            return
+        # how far each sample is beyond the limit, positive where it is violated
+        if quantity == 'travel':
+            excess = np.maximum(limit[0] - values, values - limit[1])
+        else:
+            excess = np.abs(values) - limit
+        ranges = findRanges(excess > 0)
+        if len(ranges):
+            self.peaks[(role, quantity)] = np.fmax.reduceat(excess, ranges[:, 0])
+            ranges = ranges + INDEX_OFFSETS[quantity]
+            self.violations[(role, quantity)] = np.stack([self.samples[ranges[:, 0]], self.samples[ranges[:, 1] - 1] + 1], axis=1)
+
+    def isFeasible(self):
+        return not self.violations
+
+    def __str__(self):
+        lines = ['{0} a wraps and {1} b pole flips unwrapped'.format(len(self.wraps), len(self.flips))]
+        for (role, quantity), maximum in self.maxima.items():
+            ranges = self.violations.get((role, quantity), np.zeros((0, 2), dtype=int))
+            line = '{0} {1}: max {2:.6g}'.format(role, quantity, maximum)
+            if len(ranges):
+                line += ', {0} violations, {1} samples, first at {2}-{3}, up to {4:.6g} over the limit'.format(
+                    len(ranges), int(np.sum(ranges[:, 1] - ranges[:, 0])), ranges[0, 0], ranges[0, 1],
+                    float(self.peaks[(role, quantity)].max()))
+            lines.append(line)
+        return '\n'.join(lines)
+
+
+def checkFeasibility(machine, states, step_times, unwrap=True):
+    # states (N, 5) from Machine.calculateDesiredStates, step_times (N - 1,) seconds, e.g. from stepTimes
+    if unwrap:
+        states, wraps, flips = unwrapRotations(states, machine.getToolPositionWithoutRotation())
+    else:
+        wraps = flips = np.zeros(0, dtype=int)
+
+    # a repeated tool path point takes no time and does not move, it is merged into the sample before. kept as a
+    # sample it would stop every axis for no time and fake the accelerations around it
+    step_times = np.asarray(step_times, dtype=float)
+    repeated = np.zeros(len(states), dtype=bool)
+    repeated[1:] = step_times == 0
+    for column in range(states.shape[1]):
+        repeated[1:] &= states[1:, column] == states[:-1, column]
+    samples = np.flatnonzero(~repeated)
+    report = FeasibilityReport(states, wraps, flips, samples)
+    if len(samples) < len(states):
+        states = states[samples]
+        step_times = step_times[~repeated[1:]]
+
+    mid_times = (step_times[1:] + step_times[:-1]) / 2
+    for column, role in enumerate(('x_axis', 'y_axis', 'z_axis', 'a_axis', 'b_axis')):
+        axis = getattr(machine, role)
+        values = states[:, column]
+        report.addQuantity(role, 'travel', values, axis.travel_limits)
+        # one quantity at a time, so a 10M step program needs only a few (N,) temporaries
+        values = rate(np.diff(values), step_times)
+        report.addQuantity(role, 'velocity', values, axis.max_velocity)
+        values = rate(np.diff(values), mid_times)
+        report.addQuantity(role, 'acceleration', values, axis.max_acceleration)
+        values = rate(np.diff(values), step_times[1:-1])
+        report.addQuantity(role, 'jerk', values, axis.max_jerk)
+    return report
+
+
+def main(argv=None):
+    from Machine import buildDefaultMachine, loadMachine
+    from ToolPathReader import readToolPath
+
+    parser = argparse.ArgumentParser(description='checks the axis trajectory of a tool path against the axis limits of a machine')
+    parser.add_argument('tool_path', help='any tool path file Simulate.py reads')
+    parser.add_argument('--machine', default=None, help='json machine definition with axis limits, the demo machine if omitted')
+    parser.add_argument('--feed-rate', type=float, default=1000.0, help='mm/min along the tool path')
+    parser.add_argument('--sample-time', type=float, default=None, help='fixed seconds per tool path step instead of the feed rate')
+    args = parser.parse_args(argv)
+
+    machine = buildDefaultMachine() if args.machine is None else loadMachine(args.machine)
+    tool_path = np.concatenate(list(readToolPath(args.tool_path)))
+
+    start = time.perf_counter()
+    states = machine.calculateDesiredStates(tool_path)
+    report = checkFeasibility(machine, states, stepTimes(tool_path, args.feed_rate, args.sample_time))
+    duration = time.perf_counter() - start
+
+    print(report)
+    print('{0} steps in {1:.3f} s'.format(len(tool_path), duration))
+    return 0 if report.isFeasible() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import io
+import csv
+import json
+import time
+import pstats
+import cProfile
+import functools
+from contextlib import nullcontext
+
+import numpy as np
+
+# per frame timings of named sections, nothing is measured while disabled
+
+NULL_CONTEXT = nullcontext()
+
+
+class Section:
+    # rolling window of the last durations of one section
+
+    def __init__(self, capacity):
+        self.durations = np.zeros(capacity)
+        self.count = 0
+
+    def add(self, duration):
+        self.durations[self.count % len(self.durations)] = duration
+        self.count += 1
+
+    def getDurations(self):
+        return self.durations[:min(self.count, len(self.durations))]
+
+    def getSummary(self):
+        # milliseconds
+        durations = self.getDurations() * 1000
+        if len(durations) == 0:
+            return {'count': 0}
+        p50, p95, p99 = np.percentile(durations, [50, 95, 99])
+        return {'count': self.count, 'mean': float(durations.mean()), 'p50': float(p50), 'p95': float(p95),
+                'p99': float(p99), 'max': float(durations.max())}
+
+
+class Measurement:
+
+    def __init__(self, section):
+        self.section = section
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.section.add(time.perf_counter() - self.start)
+
+
+class FrameProfiler:
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.enabled = False
+        self.sections = {}
+        self.frame_times = Section(capacity)
+        self.last_frame = None
+        # (object, method name) pairs wrapped while enabled
+        self.instrumented = []
+        self.profile = None
+        self.profile_frames = 0
+        self.profile_path = None
+
+    def getSection(self, name):
+        section = self.sections.get(name)
+        if section is None:
+            section = Section(self.capacity)
+            self.sections[name] = section
+        return section
+
+    def measure(self, name):
+        # with profiler.measure('paintGL'): ..., a shared no-op context while disabled
+        if not self.enabled:
+            return NULL_CONTEXT
+        return Measurement(self.getSection(name))
+
+    def instrument(self, obj, *method_names):
+        # times methods of obj without touching their code, the wrappers only exist while enabled
+        for method_name in method_names:
+            self.instrumented.append((obj, method_name))
+            if self.enabled:
+                self.wrap(obj, method_name)
+
+    def wrap(self, obj, method_name):
+        method = getattr(obj, method_name)
+        section = self.getSection(method_name)
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                section.add(time.perf_counter() - start)
+
+        setattr(obj, method_name, timed)
+
+    def setEnabled(self, enabled):
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        for obj, method_name in self.instrumented:
+            if enabled:
+                self.wrap(obj, method_name)
+            else:
+                # removes the instance attribute, the class method is visible again
+                delattr(obj, method_name)
+        self.last_frame = None
+
+    def frameDone(self):
+        # called once per painted frame, for the frame rate and to end cProfile runs. the viewer keeps painting while
+        # isProfiling, so a run also ends when playback is paused and nothing changes
+        if self.profile is not None:
+            self.profile_frames -= 1
+            if self.profile_frames <= 0:
+                self.stopProfile()
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.last_frame is not None:
+            self.frame_times.add(now - self.last_frame)
+        self.last_frame = now
+
+    def getFps(self):
+        durations = self.frame_times.getDurations()
+        return len(durations) / np.sum(durations) if len(durations) else 0.0
+
+    def getSummary(self):
+        summary = {name: section.getSummary() for name, section in self.sections.items()}
+        summary['frame'] = self.frame_times.getSummary()
+        summary['fps'] = self.getFps()
+        return summary
+
+    def getText(self):
+        # lines for an on screen overlay
+        lines = ['{0:.1f} fps'.format(self.getFps())]
+        for name, section in sorted(self.sections.items()):
+            summary = section.getSummary()
+            if summary['count']:
+                lines.append('{0:<20} p50 {1:7.3f}  p95 {2:7.3f}  p99 {3:7.3f} ms'.format(
+                    name, summary['p50'], summary['p95'], summary['p99']))
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        # .json writes the summary, .csv every sample in the rolling windows as section, milliseconds
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['section', 'ms'])
+                for name, section in list(self.sections.items()) + [('frame', self.frame_times)]:
+                    for duration in section.getDurations():
+                        writer.writerow([name, '{0:.6f}'.format(duration * 1000)])
+        else:
+            with open(path, 'w') as f:
+                json.dump(self.getSummary(), f, indent=2)
+
+    def profileFrames(self, frames, path=None):
+        # runs cProfile over the next frames, the stats are written to path (.prof) and the top entries printed
+        if self.profile is not None:
+            return
+        self.profile = cProfile.Profile()
+        self.profile_frames = frames
+        self.profile_path = path
+        self.profile.enable()
+
+    def isProfiling(self):
+        return self.profile is not None
+
+    def stopProfile(self):
+        self.profile.disable()
+        if self.profile_path is not None:
+            self.profile.dump_stats(self.profile_path)
+        output = io.StringIO()
+        pstats.Stats(self.profile, stream=output).sort_stats('cumulative').print_stats(25)
+        print(output.getvalue())
+        self.profile = None
+
+
+profiler = FrameProfiler()
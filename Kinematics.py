@@ -0,0 +1,176 @@
+import numpy as np
+
+# column order of the arrays returned by solveInverse
+X, Y, Z, A, B = range(5)
+
+
+def getAngles(x, y):
+    # vectorized Machine.getAngle, angle of (x, y) in degrees within [0, 360)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        angle = np.arctan(y / x) / (2 * np.pi) * 360
+    angle = np.where(x < 0.0, 180 + angle, np.where(y < 0.0, 360 + angle, angle))
+
+    angle = np.where(x == 0.0, np.where(y > 0.0, 90.0, np.where(y < 0.0, 270.0, 0.0)), angle)
+    angle = np.where((y == 0.0) & (x != 0.0), np.where(x > 0.0, 0.0, 180.0), angle)
+    return angle
+
+
+def solveInverse(tool_path, tool_pos_without_rot, out=None):
+    # tool_path: (N, 6) array of x, y, z in mm and the tool normal
+    # tool_pos_without_rot: tool end relative to the a/b rotation center, in tool path axis order
+    # returns (N, 5) array of x, y, z in mm and a, b in degrees
+    tool_path = np.asarray(tool_path, dtype=float)
+    if out is None:
+        out = np.empty((len(tool_path), 5))
+
+    des_norm_x = tool_path[:, 3]
+    des_norm_y = tool_path[:, 4]
+    des_norm_z = tool_path[:, 5]
+
+    des_a = getAngles(des_norm_x, -des_norm_y)
+
+    # de-rotate the normal around z by -a, only x and z are needed for b
+    rad = np.deg2rad(-des_a)
+    cos_a = np.cos(rad)
+    sin_a = np.sin(rad)
+    de_rotated_x = cos_a * des_norm_x + sin_a * des_norm_y
+    des_b = getAngles(de_rotated_x, des_norm_z) - 90
+
+    # compensate xyz translation for ab rotation
+    comp_x, comp_y, comp_z = rotationCompensation(des_a, des_b, tool_pos_without_rot)
+
+    out[:, X] = tool_path[:, 0] - comp_x * 1000
+    out[:, Y] = tool_path[:, 1] - comp_y * 1000
+    out[:, Z] = tool_path[:, 2] - comp_z * 1000
+    out[:, A] = des_a
+    out[:, B] = des_b
+    return out
+
+
+def rotationCompensation(des_a, des_b, tool_pos_without_rot):
+    # displacement [m] of the tool end caused by the a/b rotation [deg], in tool path axis order
+    tx, ty, tz = tool_pos_without_rot
+    rad = np.deg2rad(des_b)
+    cos_b = np.cos(rad)
+    sin_b = np.sin(rad)
+    rot_x = cos_b * tx - sin_b * tz
+    rot_y = ty
+    rot_z = sin_b * tx + cos_b * tz
+
+    rad = np.deg2rad(des_a)
+    cos_a = np.cos(rad)
+    sin_a = np.sin(rad)
+    comp_x = cos_a * rot_x + sin_a * rot_y - tx
+    comp_y = -sin_a * rot_x + cos_a * rot_y - ty
+    comp_z = rot_z - tz
+    return comp_x, comp_y, comp_z
+
+
+def rotationMatrices(angles, axis):
+    # (..., 3, 3) right handed rotations by angles [deg] around axis, same convention as glRotate
+    angles = np.deg2rad(np.asarray(angles, dtype=float))
+    axis = np.asarray(axis, dtype=float)
+    axis_len = np.sqrt(np.sum(np.square(axis)))
+    if axis_len == 0.0:
+        return np.broadcast_to(np.eye(3), angles.shape + (3, 3)).copy()
+    x, y, z = axis / axis_len
+
+    cos = np.cos(angles)[..., None, None]
+    sin = np.sin(angles)[..., None, None]
+    cross = np.array([[0.0, -z, y], [z, 0.0, -x], [-y, x, 0.0]])
+    outer = np.outer([x, y, z], [x, y, z])
+    return cos * np.eye(3) + sin * cross + (1 - cos) * outer
+
+
+def eulerToMatrix(rotation):
+    # fixed x, then y, then z rotation [deg]
+    return np.matmul(rotationMatrices(rotation[2], [0, 0, 1]),
+                     np.matmul(rotationMatrices(rotation[1], [0, 1, 0]), rotationMatrices(rotation[0], [1, 0, 0])))
+
+
+def matrixToEuler(matrix):
+    # inverse of eulerToMatrix for (..., 3, 3) matrices, returns (..., 3) angles [deg]
+    matrix = np.asarray(matrix)
+    rot_y = np.arcsin(np.clip(-matrix[..., 2, 0], -1.0, 1.0))
+    rot_x = np.arctan2(matrix[..., 2, 1], matrix[..., 2, 2])
+    rot_z = np.arctan2(matrix[..., 1, 0], matrix[..., 0, 0])
+    return np.rad2deg(np.stack([rot_x, rot_y, rot_z], axis=-1))
+
+
+class KinematicChain:
+    # flattened copy of an Axis tree, parents always come before their children
+
+    def __init__(self, base):
+        self.axes = []
+        parents = []
+        stack = [(base, -1)]
+        while stack:
+            axis, parent = stack.pop()
+            parents.append(parent)
+            self.axes.append(axis)
+            for child in reversed(axis.children):
+                stack.append((child, len(self.axes) - 1))
+
+        self.names = [axis.name for axis in self.axes]
+        self.parents = np.array(parents, dtype=int)
+        self.relative_translation = np.array([axis.relative_translation for axis in self.axes], dtype=float)
+        self.linear_movement = np.array([axis.linear_movement for axis in self.axes], dtype=float)
+        self.rotational_movement = np.array([axis.rotational_movement for axis in self.axes], dtype=float)
+        self.relative_rotation = np.array([eulerToMatrix(axis.relative_rotation) for axis in self.axes])
+
+    def __len__(self):
+        return len(self.axes)
+
+    def indexOf(self, axis):
+        if isinstance(axis, str):
+            return self.names.index(axis)
+        return self.axes.index(axis)
+
+    def currentPositions(self):
+        return np.array([axis.axis_position for axis in self.axes], dtype=float)
+
+    def localTransforms(self, axis_positions):
+        # axis_positions: (N, n_axes) in meters or degrees, returns (N, n_axes, 4, 4)
+        axis_positions = np.asarray(axis_positions, dtype=float)
+        n_samples = len(axis_positions)
+        local = np.zeros((n_samples, len(self), 4, 4))
+        local[:, :, 3, 3] = 1.0
+        local[:, :, :3, 3] = self.relative_translation + axis_positions[:, :, None] * self.linear_movement
+        for i in range(len(self)):
+            rotation = rotationMatrices(axis_positions[:, i], self.rotational_movement[i])
+            local[:, i, :3, :3] = np.matmul(self.relative_rotation[i], rotation)
+        return local
+
+    def worldTransforms(self, axis_positions):
+        # composes the local transforms down the chain, returns (N, n_axes, 4, 4)
+        world = self.localTransforms(axis_positions)
+        for i, parent in enumerate(self.parents):
+            if parent >= 0:
+                world[:, i] = np.matmul(world[:, parent], world[:, i])
+        return world
+
+    def updateWorldTransforms(self, world, axis_positions, indices):
+        # recomputes world[indices] of a single (n_axes, 4, 4) sample in place, e.g. for the axes that moved.
+        # indices must be sorted and contain the whole subtree of every axis in it
+        for i in indices:
+            local = np.identity(4)
+            local[:3, 3] = self.relative_translation[i] + axis_positions[i] * self.linear_movement[i]
+            local[:3, :3] = np.matmul(self.relative_rotation[i], rotationMatrices(axis_positions[i], self.rotational_movement[i]))
+            parent = self.parents[i]
+            world[i] = local if parent < 0 else np.matmul(world[parent], local)
+        return world
+
+    def transformPoints(self, world, axis, points):
+        # points (3,) or (N, 3) given in the frame of axis, returns (N, 3) world positions
+        transforms = world[:, self.indexOf(axis)]
+        points = np.broadcast_to(np.asarray(points, dtype=float), (len(transforms), 3))
+        return np.einsum('nij,nj->ni', transforms[:, :3, :3], points) + transforms[:, :3, 3]
+
+
+def normalsFromAngles(a, b):
+    # inverse of the a/b angles found by solveInverse, (N, 3) tool normals for a and b [deg]
+    a = np.deg2rad(np.asarray(a, dtype=float))
+    b = np.deg2rad(np.asarray(b, dtype=float))
+    return np.stack([-np.sin(b) * np.cos(a), np.sin(b) * np.sin(a), np.cos(b)], axis=-1)
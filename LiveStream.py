@@ -0,0 +1,165 @@
+import time
+import asyncio
+import threading
+
+import numpy as np
+
+from FrameProfiler import profiler
+
+# live machine positions from a controller over a local TCP or UNIX socket, without Qt.
+# every line is one sample of whitespace separated numbers, five are an axis state x y z [mm] a b [deg], six are a
+# tool path point x y z [mm] and the tool normal. an asyncio server on a background thread puts the samples into a
+# bounded ring buffer, the GUI takes everything that arrived since the last frame and draws only the newest state
+
+STATE = 0
+POINT = 1
+
+
+def parseAddress(address):
+    # 'unix:/path', 'tcp:host:port', 'host:port' or 'port'
+    if address.startswith('unix:'):
+        return 'unix', address[5:]
+    if address.startswith('tcp:'):
+        address = address[4:]
+    host, _, port = address.rpartition(':')
+    return 'tcp', (host or '127.0.0.1', int(port))
+
+
+class RingBuffer:
+    # the last capacity samples that were not taken yet, safe to use from two threads
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.values = np.zeros((capacity, 6))
+        self.kinds = np.zeros(capacity, dtype=np.int8)
+        self.arrivals = np.zeros(capacity)
+        self.lock = threading.Lock()
+        # total number of samples written and taken, the unread ones are start..end
+        self.end = 0
+        self.start = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def isFull(self):
+        return len(self) >= self.capacity
+
+    def push(self, kind, values, arrival):
+        # overwrites the oldest unread sample when full
+        with self.lock:
+            if self.end - self.start >= self.capacity:
+                self.start += 1
+                self.dropped += 1
+            row = self.end % self.capacity
+            self.values[row, :len(values)] = values
+            self.kinds[row] = kind
+            self.arrivals[row] = arrival
+            self.end += 1
+
+    def take(self):
+        # (kinds, values, arrivals) of all unread samples, oldest first
+        with self.lock:
+            rows = np.arange(self.start, self.end) % self.capacity
+            self.start = self.end
+            return self.kinds[rows], self.values[rows], self.arrivals[rows]
+
+
+class LiveReceiver:
+    # overflow 'drop' keeps the newest samples when the GUI falls behind, 'block' stops reading from the socket
+    # until the GUI took the buffered samples, so TCP flow control slows the controller down
+
+    def __init__(self, address='tcp:127.0.0.1:5007', capacity=1024, overflow='drop'):
+        self.address = parseAddress(address)
+        self.buffer = RingBuffer(capacity)
+        self.overflow = overflow
+        self.loop = None
+        self.space = None
+        self.stopped = None
+        # set once the server listens or failed to start, error is what start() raises then
+        self.ready = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name='LiveReceiver', daemon=True)
+
+        self.received = 0
+        self.invalid = 0
+        self.coalesced = 0
+        self.connections = 0
+        # seconds from the arrival of a sample until the frame showing it was painted, part of the profiler overlay
+        self.latency = profiler.getSection('live_latency')
+
+    def start(self):
+        self.thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stopped.set)
+            self.thread.join()
+            self.loop = None
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except Exception as error:
+            # e.g. the address is in use, the loop is closed already
+            self.error = error
+            self.loop = None
+        finally:
+            self.ready.set()
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.space = asyncio.Event()
+        self.stopped = asyncio.Event()
+        kind, address = self.address
+        if kind == 'unix':
+            server = await asyncio.start_unix_server(self.handle, address)
+        else:
+            server = await asyncio.start_server(self.handle, address[0], address[1])
+        self.ready.set()
+        async with server:
+            await self.stopped.wait()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                arrival = time.perf_counter()
+                try:
+                    values = [float(value) for value in line.split()]
+                except ValueError:
+                    values = []
+                if len(values) not in (5, 6):
+                    self.invalid += 1
+                    continue
+                if self.overflow == 'block':
+                    while self.buffer.isFull():
+                        self.space.clear()
+                        await self.space.wait()
+                self.buffer.push(STATE if len(values) == 5 else POINT, values, arrival)
+                self.received += 1
+        finally:
+            writer.close()
+
+    def take(self):
+        # every sample since the last call, called once per frame by the GUI
+        samples = self.buffer.take()
+        if len(samples[0]) > 1:
+            self.coalesced += len(samples[0]) - 1
+        if self.overflow == 'block' and self.loop is not None:
+            self.loop.call_soon_threadsafe(self.space.set)
+        return samples
+
+    def addLatency(self, arrival):
+        self.latency.add(time.perf_counter() - arrival)
+
+    def getStats(self):
+        return {'received': self.received, 'dropped': self.buffer.dropped, 'coalesced': self.coalesced,
+                'invalid': self.invalid, 'connections': self.connections, 'latency': self.latency.getSummary()}
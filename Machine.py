@@ -1,6 +1,12 @@
-import ObjParser
+import os
+import json
+import weakref
+import Kinematics
+import MeshRegistry
 import numpy as np
-from PyQt5.QtGui import QColor
+
+# models without a path are looked up next to this file
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
 
 class Machine:
     ready = False
@@ -15,32 +21,128 @@ class Machine:
     b_axis = None
 
     tool_path = None
+    # incremented by setToolPath so views can cache geometry derived from the tool path
+    tool_path_version = 0
+
+    kinematic_chain = None
+    kinematic_chain_version = -1
+
+    # (n_axes, 4, 4) world transforms of the current axis positions and the chain they were computed for
+    world_transforms = None
+    world_chain = None
+    # incremented whenever an axis moved, so views can skip repainting an unchanged machine
+    state_version = 0
 
     def __init__(self):
         self.base = None
         self.axes = []
         self.tool_path = []
+        self.kinematic_chain = None
+        self.world_transforms = None
+        self.world_chain = None
+
+    def getKinematicChain(self):
+        # flattened axis tree, rebuilt whenever an axis definition changed
+        if self.kinematic_chain is None or self.kinematic_chain_version != Axis.definition_version \
+                or self.kinematic_chain.axes[0] is not self.base:
+            self.kinematic_chain = Kinematics.KinematicChain(self.base)
+            self.kinematic_chain_version = Axis.definition_version
+            self.axes = self.kinematic_chain.axes
+        return self.kinematic_chain
 
     def buildMachinState(self):
         #print('building machine state...')
-        self.buildAxisState(self.base, np.array([0,0,0]), np.array([0,0,0]), 0)
-
-    def buildAxisState(self, axis, parent_abs_trans, parent_abs_rot, recursion_level):
-        position = np.add(axis.relative_translation, np.multiply(axis.axis_position, axis.linear_movement))
-        axis.absolute_translation = np.add(position, parent_abs_trans)
-
-        rotation = np.add(axis.relative_rotation, np.multiply(axis.axis_position, axis.rotational_movement))
-        axis.absolute_rotation = np.add(rotation, parent_abs_rot)
-
-        #print('|-' * recursion_level + axis.name, 'abs. pos:', axis.absolute_translation, 'abs. rot:', axis.absolute_rotation)
-
-        for child in axis.children:
-            recursion_level += 1
-            self.buildAxisState(child, axis.absolute_translation, axis.absolute_rotation, recursion_level)
-            recursion_level -= 1
+        # only axes whose position changed and everything below them are recomputed, returns False if nothing moved
+        chain = self.getKinematicChain()
+        if self.world_chain is not chain:
+            dirty = np.ones(len(chain), dtype=bool)
+            self.world_transforms = np.zeros((len(chain), 4, 4))
+            self.world_chain = chain
+        else:
+            dirty = np.array([axis.position_dirty for axis in chain.axes])
+        for i, parent in enumerate(chain.parents):
+            if parent >= 0 and dirty[parent]:
+                dirty[i] = True
+
+        indices = np.flatnonzero(dirty)
+        if len(indices) == 0:
+            return False
+        chain.updateWorldTransforms(self.world_transforms, chain.currentPositions(), indices)
+        self.applyWorldTransforms(indices)
+        return True
+
+    def setWorldTransforms(self, world):
+        # (n_axes, 4, 4) transforms in kinematic chain order, e.g. one sample of a cached trajectory
+        chain = self.getKinematicChain()
+        if self.world_chain is chain and np.array_equal(world, self.world_transforms):
+            for axis in chain.axes:
+                axis.position_dirty = False
+            return False
+        self.world_transforms = np.array(world, dtype=float)
+        self.world_chain = chain
+        self.applyWorldTransforms(np.arange(len(chain)))
+        return True
+
+    def applyWorldTransforms(self, indices):
+        # the absolute_* attributes of the axes are views into world_transforms
+        chain = self.world_chain
+        rotations = Kinematics.matrixToEuler(self.world_transforms[indices, :3, :3])
+        for i, rotation in zip(indices, rotations):
+            axis = chain.axes[i]
+            axis.absolute_transform = self.world_transforms[i]
+            axis.absolute_translation = self.world_transforms[i, :3, 3]
+            axis.absolute_rotation = rotation
+        for axis in chain.axes:
+            axis.position_dirty = False
+        self.state_version += 1
+
+    def axisPositionsFromStates(self, states):
+        # maps (N, 5) x/y/z [mm] and a/b [deg] states onto (N, n_axes) chain positions
+        chain = self.getKinematicChain()
+        states = np.atleast_2d(states)
+        axis_positions = np.empty((len(states), len(chain)))
+        axis_positions[:] = chain.currentPositions()
+        axis_positions[:, chain.indexOf(self.x_axis)] = states[:, Kinematics.X] / 1000
+        axis_positions[:, chain.indexOf(self.y_axis)] = states[:, Kinematics.Y] / 1000
+        axis_positions[:, chain.indexOf(self.z_axis)] = states[:, Kinematics.Z] / 1000
+        axis_positions[:, chain.indexOf(self.a_axis)] = states[:, Kinematics.A]
+        axis_positions[:, chain.indexOf(self.b_axis)] = states[:, Kinematics.B]
+        return axis_positions
+
+    def calculateWorldTransforms(self, states):
+        # (N, n_axes, 4, 4) world transforms of every axis for (N, 5) states
+        return self.getKinematicChain().worldTransforms(self.axisPositionsFromStates(states))
+
+    def calculateToolTipPositions(self, states):
+        # (N, 3) world positions of the b-axis tool end for (N, 5) states
+        world = self.calculateWorldTransforms(states)
+        return self.getKinematicChain().transformPoints(world, self.b_axis, self.b_axis.tool_end_offset)
+
+    def calculateToolTipPathPositions(self, states):
+        # tool end in tool path coordinates [mm], i.e. relative to the moving y-axis table, for comparison with the tool path
+        tool_tip = self.calculateToolTipPositions(states)
+        table_offset = np.atleast_2d(states)[:, Kinematics.Y, None] / 1000 * self.y_axis.linear_movement
+        return np.subtract(tool_tip, table_offset)[:, [0, 2, 1]] * 1000
+
+    def calculateToolAxes(self, states):
+        # (N, 3) unit vectors from the tool end towards the spindle in tool path coordinates, i.e. the tool path normals
+        world = self.calculateWorldTransforms(states)
+        rotations = world[:, self.getKinematicChain().indexOf(self.b_axis), :3, :3]
+        directions = -np.einsum('nij,j->ni', rotations, self.b_axis.tool_end_offset)
+        directions /= np.sqrt(np.sum(np.square(directions), axis=1))[:, None]
+        return directions[:, [0, 2, 1]]
+
+    def getDefinition(self):
+        # inverse of buildMachine, e.g. for saving the machine as json
+        axes = self.getKinematicChain().axes
+        return {
+            'base': self.base.getDefinition(),
+            'roles': {role: getattr(self, role).name for role in ROLES if getattr(self, role) in axes},
+        }
 
     def setToolPath(self, tool_path):
         self.tool_path = tool_path
+        self.tool_path_version += 1
 
     def getAngle(self, vector):
         x = vector[0]
@@ -78,40 +180,28 @@ class Machine:
         return final_vec
 
 
+    def getToolPositionWithoutRotation(self):
+        # tool end relative to the a/b rotation center, swapped into tool path axis order
+        tool_pos_without_rot = np.add(self.b_axis.relative_translation, self.b_axis.tool_end_offset)
+        return [tool_pos_without_rot[0], tool_pos_without_rot[2], tool_pos_without_rot[1]]
+
+    def calculateDesiredStates(self, tool_path):
+        # solves a whole (N, 6) tool path at once, returns (N, 5) x/y/z [mm] and a/b [deg] axis positions
+        return Kinematics.solveInverse(np.atleast_2d(tool_path), self.getToolPositionWithoutRotation())
+
     def calculateDesiredState(self, tool_step):
-        # 3-axis example
-        des_x = tool_step[0]
-        des_y = tool_step[1]
-        des_z = tool_step[2]
+        self.setState(self.calculateDesiredStates(tool_step)[0])
 
-        des_norm_x = tool_step[3]
-        des_norm_y = tool_step[4]
-        des_norm_z = tool_step[5]
+    def setState(self, state):
+        # x/y/z [mm] and a/b [deg] axis positions, e.g. one row of calculateDesiredStates
+        des_x, des_y, des_z, des_a, des_b = state
 
-        angle_around_z = self.getAngle([des_norm_x, -des_norm_y])
-        des_a = angle_around_z
         self.a_axis.setAxisPositionInDeg(des_a)
-
-        de_rotated = self.rotate3D([des_norm_x, des_norm_y, des_norm_z], -angle_around_z, [0,0,1])
-        angle_around_y = self.getAngle([de_rotated[0], de_rotated[2]])
-        des_b = angle_around_y - 90
         self.b_axis.setAxisPositionInDeg(des_b)
 
-
-
-        # compensate xyz translation for ab rotation - WORKS!!!
-        tool_pos_without_rot = np.add(self.b_axis.relative_translation, self.b_axis.tool_end_offset)
-        tool_pos_without_rot = [tool_pos_without_rot[0], tool_pos_without_rot[2], tool_pos_without_rot[1]]
-
-        tool_pos_with_rot = self.rotate3D(tool_pos_without_rot, des_b, [0, 1, 0])
-        tool_pos_with_rot = self.rotate3D(tool_pos_with_rot, des_a, [0, 0, 1])
-        tool_pos_with_rot = np.add(np.array(tool_pos_with_rot), -np.array(tool_pos_without_rot))
-
-        #print(tool_pos_without_rot, tool_pos_with_rot)
-
-        self.x_axis.setAxisPositionInMM(des_x-tool_pos_with_rot[0]*1000)
-        self.y_axis.setAxisPositionInMM(des_y-tool_pos_with_rot[1]*1000)
-        self.z_axis.setAxisPositionInMM(des_z-tool_pos_with_rot[2]*1000)
+        self.x_axis.setAxisPositionInMM(des_x)
+        self.y_axis.setAxisPositionInMM(des_y)
+        self.z_axis.setAxisPositionInMM(des_z)
 
 
 
@@ -127,10 +217,16 @@ class Axis:
     color = None
     children = None
 
-    raw_vertices = None
+    model_path = ''
+    mesh_key = None
+    mesh_release = None
+
+    # bumped whenever any axis changes its static definition
+    definition_version = 0
 
     relative_translation = None
     absolute_translation = None
+    absolute_transform = None
 
     relative_rotation = None
     absolute_rotation = None
@@ -139,47 +235,104 @@ class Axis:
     rotational_movement = None
 
     movement_type = ''
+    movement_axis = 'x'
+    movement_negative = False
     axis_position = 0.0
+    # set when axis_position changed since the last Machine.buildMachinState
+    position_dirty = True
     #end_stop = 0.0
 
+    # limits in the units of the axis states, mm and mm/s... for linear axes, deg and deg/s... for rotations.
+    # travel_limits is a (min, max) pair, None means unlimited
+    travel_limits = None
+    max_velocity = None
+    max_acceleration = None
+    max_jerk = None
+
     tool_end_offset = None
 
     def __init__(self, name):
         self.name = name
-        self.color = QColor(0,0,0)
+        self.color = (0, 0, 0)
         self.children = []
-        self.raw_vertices = []
         self.relative_translation = np.array([0.0, 0.0, 0.0])
         self.absolute_translation = np.array([0.0, 0.0, 0.0])
         self.relative_rotation = np.array([0.0, 0.0, 0.0])
         self.absolute_rotation = np.array([0.0, 0.0, 0.0])
+        self.absolute_transform = np.identity(4)
         self.linear_movement = np.array([0.0, 0.0, 0.0])
         self.rotational_movement = np.array([0.0, 0.0, 0.0])
         self.tool_end_offset = np.array([0.0, 0.0, 0.0])
         self.defineMovement()
-        self.loadModel('cube.obj')
+        self.loadModel(os.path.join(MODEL_DIR, 'cube.obj'))
 
 
     def loadModel(self, path):
-        self.raw_vertices = ObjParser.parsOBJ(path)
+        # only registers the model, the file is parsed when the mesh is first needed
+        if self.mesh_release is not None:
+            self.mesh_release()
+        self.model_path = path
+        self.mesh_key = MeshRegistry.registry.acquire(path)
+        self.mesh_release = weakref.finalize(self, MeshRegistry.registry.release, self.mesh_key)
+
+    def getMesh(self):
+        return MeshRegistry.registry.get(self.mesh_key)
 
     def getVertices(self):
-        return self.raw_vertices
+        # non-indexed triangle vertices
+        return self.getMesh().getTriangleVertices()
 
     def setColor(self,r,g,b):
-        self.color = QColor(r,g,b)
+        # 0-255 rgb, kept as a plain tuple so the kinematics work without Qt
+        self.color = (r, g, b)
+
+    def getDefinition(self):
+        definition = {
+            'name': self.name,
+            'model': self.model_path,
+            'color': list(self.color),
+            'position': np.asarray(self.relative_translation).tolist(),
+        }
+        if self.movement_type in ('linear', 'rotation'):
+            definition['movement'] = {'type': self.movement_type, 'axis': self.movement_axis, 'negative': self.movement_negative}
+        if np.any(self.tool_end_offset):
+            definition['tool_end_offset'] = np.asarray(self.tool_end_offset).tolist()
+        if self.getLimits():
+            definition['limits'] = {name: list(value) if name == 'travel' else value for name, value in self.getLimits().items()}
+        if self.children:
+            definition['children'] = [child.getDefinition() for child in self.children]
+        return definition
+
+    def setLimits(self, travel=None, velocity=None, acceleration=None, jerk=None):
+        self.travel_limits = None if travel is None else (float(travel[0]), float(travel[1]))
+        self.max_velocity = velocity
+        self.max_acceleration = acceleration
+        self.max_jerk = jerk
+
+    def getLimits(self):
+        limits = {'travel': self.travel_limits, 'velocity': self.max_velocity,
+                  'acceleration': self.max_acceleration, 'jerk': self.max_jerk}
+        return {name: value for name, value in limits.items() if value is not None}
+
+    def getColorF(self):
+        return (self.color[0] / 255, self.color[1] / 255, self.color[2] / 255, 1.0)
 
     def setRelativePosition(self,x,y,z):
         self.relative_translation = np.array([x,y,z])
+        Axis.definition_version += 1
 
     def setToolEndOffset(self,x,y,z):
         self.tool_end_offset = np.array([x,y,z])
+        Axis.definition_version += 1
 
     def addChild(self, child):
         self.children.append(child)
+        Axis.definition_version += 1
 
     def defineMovement(self, type='liner', axis='x', negative=False):
         self.movement_type = type
+        self.movement_axis = axis
+        self.movement_negative = negative
         if axis == 'x':
             movement_axis = np.array([1.0, 0.0, 0.0])
         elif axis == 'y':
@@ -194,13 +347,101 @@ class Axis:
             self.linear_movement = movement_axis
         elif type == 'rotation':
             self.rotational_movement = movement_axis
+        Axis.definition_version += 1
 
     def setAxisPositionInMM(self, value):
-        self.axis_position = value/1000
+        value = value/1000
+        if value != self.axis_position:
+            self.axis_position = value
+            self.position_dirty = True
 
     def setAxisPositionInDeg(self, value):
-        self.axis_position = value
+        if value != self.axis_position:
+            self.axis_position = value
+            self.position_dirty = True
+
+
+
+# the 5-axis demo machine shown by RoboticVisualizer, model paths are relative to MODEL_DIR
+DEFAULT_MACHINE = {
+    'base': {
+        'name': 'base', 'model': 'base_frame.obj', 'color': [200, 200, 200], 'position': [1.5, -0.85, -1.15],
+        'children': [
+            {
+                'name': 'x_axis', 'model': 'x_axis.obj', 'color': [200, 25, 25], 'position': [-1.5, 4.55, 0.35],
+                'movement': {'type': 'linear', 'axis': 'x'},
+                'children': [
+                    {
+                        'name': 'z_axis', 'model': 'z_axis.obj', 'color': [25, 25, 200], 'position': [0, -0.15, 0],
+                        'movement': {'type': 'linear', 'axis': 'y'},
+                        'children': [
+                            {
+                                'name': 'a_axis', 'model': 'a_axis.obj', 'color': [200, 200, 25], 'position': [0, -2.8, 0],
+                                'movement': {'type': 'rotation', 'axis': 'y'},
+                                'children': [
+                                    {
+                                        'name': 'b_axis', 'model': 'b_axis_tool.obj', 'color': [200, 25, 200], 'position': [0, 0, 0.8],
+                                        'movement': {'type': 'rotation', 'axis': 'z'},
+                                        'tool_end_offset': [0, -0.75, 0],
+                                    },
+                                ],
+                            },
+                        ],
+                    },
+                ],
+            },
+            {
+                'name': 'y_axis', 'model': 'y_axis.obj', 'color': [25, 200, 25], 'position': [0, 0, 3.125],
+                'movement': {'type': 'linear', 'axis': 'z', 'negative': True},
+            },
+        ],
+    },
+    # which axis in the tree is driven by which tool path coordinate
+    'roles': {'x_axis': 'x_axis', 'y_axis': 'y_axis', 'z_axis': 'z_axis', 'a_axis': 'a_axis', 'b_axis': 'b_axis'},
+}
+
+ROLES = ('x_axis', 'y_axis', 'z_axis', 'a_axis', 'b_axis')
+
+
+def buildAxis(definition, model_dir):
+    axis = Axis(definition['name'])
+    if 'model' in definition:
+        axis.loadModel(os.path.join(model_dir, definition['model']))
+    if 'color' in definition:
+        axis.setColor(*definition['color'])
+    if 'movement' in definition:
+        movement = definition['movement']
+        axis.defineMovement(type=movement['type'], axis=movement['axis'], negative=movement.get('negative', False))
+    axis.setRelativePosition(*definition.get('position', [0, 0, 0]))
+    if 'tool_end_offset' in definition:
+        axis.setToolEndOffset(*definition['tool_end_offset'])
+    if 'limits' in definition:
+        axis.setLimits(**definition['limits'])
+    for child in definition.get('children', []):
+        axis.addChild(buildAxis(child, model_dir))
+    return axis
+
+
+def buildMachine(definition, model_dir=None):
+    if model_dir is None:
+        model_dir = MODEL_DIR
+    machine = Machine()
+    machine.base = buildAxis(definition['base'], model_dir)
+    axes = {axis.name: axis for axis in machine.getKinematicChain().axes}
+    for role in ROLES:
+        setattr(machine, role, axes[definition['roles'][role]])
+    return machine
+
+
+def buildDefaultMachine():
+    return buildMachine(DEFAULT_MACHINE)
+
 
+def loadMachine(path):
+    # json machine definition in the format of DEFAULT_MACHINE, models are relative to the json file
+    with open(path, 'r') as f:
+        definition = json.load(f)
+    return buildMachine(definition, os.path.dirname(os.path.abspath(path)))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,78 @@
+import numpy as np
+import OpenGL.GL as gl
+
+import MeshRegistry
+from MeshBuffer import MeshBuffer, MeshShader
+
+
+class MachineRenderer:
+    # draws the axes of a Machine, needs a current GL context but no Qt widget
+
+    def __init__(self, immediate_mode=False, load_meshes=True):
+        # immediate_mode keeps the old glBegin/glVertex path, e.g. for frame time comparisons.
+        # without load_meshes only axes whose mesh is already loaded are drawn, e.g. while a worker thread loads them
+        self.immediate_mode = immediate_mode
+        self.load_meshes = load_meshes
+        self.shader = None
+        self.mesh_buffers = {}
+
+    def initializeGL(self):
+        self.shader = MeshShader()
+
+    def getMeshBuffer(self, axis):
+        # axes using the same file share one buffer, like they share the mesh in the registry
+        mesh = axis.getMesh()
+        mesh_buffer = self.mesh_buffers.get(axis.mesh_key)
+        if mesh_buffer is None or mesh_buffer.source is not mesh:
+            if mesh_buffer is not None:
+                mesh_buffer.delete()
+            mesh_buffer = MeshBuffer.fromMesh(mesh)
+            self.mesh_buffers[axis.mesh_key] = mesh_buffer
+        return mesh_buffer
+
+    def drawMachine(self, machine):
+        gl.glPushMatrix()
+
+        if self.immediate_mode:
+            self.drawAxisImmediate(machine.base, 0)
+        else:
+            self.shader.bind()
+            for axis in machine.getKinematicChain().axes:
+                if self.load_meshes or MeshRegistry.registry.isLoaded(axis.mesh_key):
+                    self.drawAxis(axis)
+            self.shader.release()
+
+        gl.glPopMatrix()
+
+    def drawAxis(self, axis):
+        self.shader.setModelMatrix(axis.absolute_transform)
+        self.shader.setColor(*axis.getColorF())
+        self.getMeshBuffer(axis).draw()
+
+    def drawAxisImmediate(self, axis, recursion_level):
+        position = np.add(axis.relative_translation, np.multiply(axis.axis_position, axis.linear_movement))
+        gl.glTranslatef(position[0], position[1], position[2])
+
+        gl.glRotatef(axis.axis_position, axis.rotational_movement[0], axis.rotational_movement[1], axis.rotational_movement[2])
+
+        gl.glBegin(gl.GL_TRIANGLES)
+        gl.glColor4f(*axis.getColorF())
+        for vertex in axis.getVertices():
+            gl.glVertex3f(vertex[0], vertex[1], vertex[2])
+        gl.glEnd()
+
+        for child in axis.children:
+            recursion_level += 1
+            self.drawAxisImmediate(child, recursion_level)
+            recursion_level -= 1
+
+        gl.glTranslatef(-position[0], -position[1], -position[2])
+        gl.glRotatef(axis.axis_position, -axis.rotational_movement[0], -axis.rotational_movement[1] ,-axis.rotational_movement[2])
+
+    def cleanup(self):
+        for mesh_buffer in self.mesh_buffers.values():
+            mesh_buffer.delete()
+        self.mesh_buffers = {}
+        if self.shader is not None:
+            self.shader.delete()
+            self.shader = None
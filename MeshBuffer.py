@@ -0,0 +1,120 @@
+import numpy as np
+import OpenGL.GL as gl
+
+VERTEX_SHADER = '''
+#version 120
+uniform mat4 model;
+attribute vec3 position;
+void main()
+{
+    gl_Position = gl_ModelViewProjectionMatrix * model * vec4(position, 1.0);
+}
+'''
+
+FRAGMENT_SHADER = '''
+#version 120
+uniform vec4 color;
+void main()
+{
+    gl_FragColor = color;
+}
+'''
+
+POSITION_LOCATION = 0
+
+
+def compileShader(source, shader_type):
+    shader = gl.glCreateShader(shader_type)
+    gl.glShaderSource(shader, source)
+    gl.glCompileShader(shader)
+    if not gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS):
+        raise RuntimeError('shader compilation failed: ' + str(gl.glGetShaderInfoLog(shader)))
+    return shader
+
+
+class MeshShader:
+    # flat colored meshes placed by a per mesh model matrix on top of the current modelview
+
+    def __init__(self):
+        vertex_shader = compileShader(VERTEX_SHADER, gl.GL_VERTEX_SHADER)
+        fragment_shader = compileShader(FRAGMENT_SHADER, gl.GL_FRAGMENT_SHADER)
+        self.program = gl.glCreateProgram()
+        gl.glAttachShader(self.program, vertex_shader)
+        gl.glAttachShader(self.program, fragment_shader)
+        gl.glBindAttribLocation(self.program, POSITION_LOCATION, 'position')
+        gl.glLinkProgram(self.program)
+        if not gl.glGetProgramiv(self.program, gl.GL_LINK_STATUS):
+            raise RuntimeError('shader linking failed: ' + str(gl.glGetProgramInfoLog(self.program)))
+        gl.glDeleteShader(vertex_shader)
+        gl.glDeleteShader(fragment_shader)
+
+        self.model_location = gl.glGetUniformLocation(self.program, 'model')
+        self.color_location = gl.glGetUniformLocation(self.program, 'color')
+
+    def bind(self):
+        gl.glUseProgram(self.program)
+
+    def release(self):
+        gl.glUseProgram(0)
+
+    def setModelMatrix(self, matrix):
+        # matrix is a row major 4x4 numpy array, GL_TRUE lets GL transpose it
+        gl.glUniformMatrix4fv(self.model_location, 1, gl.GL_TRUE, np.asarray(matrix, dtype=np.float32))
+
+    def setColor(self, r, g, b, a=1.0):
+        gl.glUniform4f(self.color_location, r, g, b, a)
+
+    def delete(self):
+        gl.glDeleteProgram(self.program)
+
+
+class MeshBuffer:
+    # vertices (and triangle indices if given) uploaded once into buffers, drawn with a single call per frame
+
+    def __init__(self, vertices, indices=None, primitive=gl.GL_QUADS):
+        self.source = vertices
+        self.primitive = primitive if indices is None else gl.GL_TRIANGLES
+        vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 3)
+        self.vertex_count = len(vertices)
+
+        self.vbo = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, vertices.nbytes, vertices, gl.GL_STATIC_DRAW)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+        self.ibo = None
+        self.index_count = 0
+        if indices is not None:
+            indices = np.ascontiguousarray(indices, dtype=np.uint32)
+            self.index_count = len(indices)
+            self.ibo = gl.glGenBuffers(1)
+            gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+            gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, gl.GL_STATIC_DRAW)
+            gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    @classmethod
+    def fromMesh(cls, mesh):
+        mesh_buffer = cls(mesh.vertices, mesh.indices)
+        mesh_buffer.source = mesh
+        return mesh_buffer
+
+    def draw(self):
+        if self.vertex_count == 0:
+            return
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        gl.glEnableVertexAttribArray(POSITION_LOCATION)
+        gl.glVertexAttribPointer(POSITION_LOCATION, 3, gl.GL_FLOAT, gl.GL_FALSE, 0, None)
+        if self.ibo is not None:
+            gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+            gl.glDrawElements(self.primitive, self.index_count, gl.GL_UNSIGNED_INT, None)
+            gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+        else:
+            gl.glDrawArrays(self.primitive, 0, self.vertex_count)
+        gl.glDisableVertexAttribArray(POSITION_LOCATION)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+    def delete(self):
+        buffers = [self.vbo] if self.ibo is None else [self.vbo, self.ibo]
+        gl.glDeleteBuffers(len(buffers), buffers)
+        self.vbo = 0
+        self.ibo = None
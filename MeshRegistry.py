@@ -0,0 +1,84 @@
+import os
+import threading
+from collections import OrderedDict
+
+import ObjParser
+
+
+class MeshRegistry:
+    # process wide mesh store: one copy per file, loaded on first use, unused meshes are kept in an LRU pool
+
+    def __init__(self, max_unused_bytes=256 * 1024 * 1024):
+        self.max_unused_bytes = max_unused_bytes
+        self.lock = threading.RLock()
+        self.meshes = {}
+        self.ref_counts = {}
+        self.unused = OrderedDict()
+        self.unused_bytes = 0
+        self.loads = 0
+
+    def getKey(self, path, with_normals=True):
+        return (os.path.abspath(path), with_normals)
+
+    def acquire(self, path, with_normals=True):
+        # registers a user of the mesh without loading it, returns the key for get and release
+        key = self.getKey(path, with_normals)
+        with self.lock:
+            self.ref_counts[key] = self.ref_counts.get(key, 0) + 1
+            if key in self.unused:
+                self.unused_bytes -= self.getSize(self.unused.pop(key))
+        return key
+
+    def release(self, key):
+        with self.lock:
+            ref_count = self.ref_counts.get(key, 0) - 1
+            if ref_count > 0:
+                self.ref_counts[key] = ref_count
+                return
+            self.ref_counts.pop(key, None)
+            mesh = self.meshes.get(key)
+            if mesh is not None:
+                self.unused[key] = mesh
+                self.unused_bytes += self.getSize(mesh)
+                self.evict()
+
+    def get(self, key):
+        with self.lock:
+            mesh = self.meshes.get(key)
+            if mesh is None:
+                mesh = ObjParser.loadOBJ(key[0], with_normals=key[1])
+                self.meshes[key] = mesh
+                self.loads += 1
+                if self.ref_counts.get(key, 0) == 0:
+                    self.unused[key] = mesh
+                    self.unused_bytes += self.getSize(mesh)
+                    self.evict()
+            elif key in self.unused:
+                self.unused.move_to_end(key)
+            return mesh
+
+    def isLoaded(self, key):
+        return key in self.meshes
+
+    def evict(self):
+        # drops the least recently used meshes nobody references anymore
+        while self.unused and self.unused_bytes > self.max_unused_bytes:
+            key, mesh = self.unused.popitem(last=False)
+            self.unused_bytes -= self.getSize(mesh)
+            del self.meshes[key]
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.unused):
+                del self.meshes[key]
+            self.unused.clear()
+            self.unused_bytes = 0
+
+    def getSize(self, mesh):
+        size = mesh.vertices.nbytes + mesh.indices.nbytes
+        if mesh.normals is not None:
+            size += mesh.normals.nbytes
+        return size
+
+
+registry = MeshRegistry()
@@ -0,0 +1,70 @@
+import sys
+import asyncio
+import argparse
+
+import numpy as np
+
+from LiveStream import parseAddress
+from Machine import buildDefaultMachine
+from ToolPathCreator import circle
+from ToolPathReader import readToolPath
+
+# stand in for a machine controller, streams a tool path to LiveStream.LiveReceiver at a fixed rate
+
+
+async def stream(address, samples, rate, loops=1):
+    # samples: (N, 5) states or (N, 6) tool path points, sent at rate [Hz] on absolute deadlines so the rate does
+    # not drift. loops=0 repeats forever
+    kind, address = parseAddress(address)
+    if kind == 'unix':
+        reader, writer = await asyncio.open_unix_connection(address)
+    else:
+        reader, writer = await asyncio.open_connection(address[0], address[1])
+
+    lines = [(' '.join('{0:.6f}'.format(value) for value in sample) + '\n').encode('ascii') for sample in samples]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time()
+    sent = 0
+    repeat = 0
+    try:
+        while loops == 0 or repeat < loops:
+            for line in lines:
+                writer.write(line)
+                # waits here if the receiver applies backpressure
+                await writer.drain()
+                sent += 1
+                deadline += 1 / rate
+                delay = deadline - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            repeat += 1
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return sent
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='streams a tool path like a machine controller')
+    parser.add_argument('tool_path', nargs='?', default=None, help='tool path file, a demo circle if omitted')
+    parser.add_argument('--connect', default='tcp:127.0.0.1:5007', help="'tcp:host:port' or 'unix:/path'")
+    parser.add_argument('--rate', type=float, default=250.0, help='samples per second')
+    parser.add_argument('--mode', choices=['states', 'points'], default='states',
+                        help='send solved axis states or the raw tool path points')
+    parser.add_argument('--loops', type=int, default=0, help='times to send the tool path, 0 repeats forever')
+    args = parser.parse_args(argv)
+
+    tool_path = circle(500, [1.5, 2, 1]) if args.tool_path is None else np.concatenate(list(readToolPath(args.tool_path)))
+    samples = tool_path[:, :6]
+    if args.mode == 'states':
+        samples = buildDefaultMachine().calculateDesiredStates(tool_path)
+    try:
+        sent = asyncio.run(stream(args.connect, samples, args.rate, args.loops))
+    except KeyboardInterrupt:
+        return 0
+    print('{0} samples sent'.format(sent))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,66 @@
+import os
+import glob
+import hashlib
 import numpy as np
 
-def parsOBJ(path):
+# compiled meshes are stored next to the obj files in this directory
+CACHE_DIR_NAME = '__meshcache__'
+
+
+def getCachePath(path, suffix='.npy'):
+    # cache entries are keyed by absolute path, size and modification time of the obj file
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = '{0}|{1}|{2}'.format(path, stat.st_size, stat.st_mtime_ns)
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(os.path.dirname(path), CACHE_DIR_NAME, '{0}-{1}{2}'.format(os.path.basename(path), digest, suffix))
+
+
+def loadCached(cache_path):
+    try:
+        return np.load(cache_path, mmap_mode='r')
+    except ValueError:
+        # empty meshes can not be memory mapped
+        return np.load(cache_path)
+
+
+def removeCached(cache_path, suffix='.npy', keep=None):
+    # entries of every version of the obj file with this suffix, except keep
+    prefix = cache_path[:-len(suffix)]
+    prefix = prefix[:prefix.rindex('-')]
+    for stale_path in glob.glob(glob.escape(prefix) + '-????????????????' + glob.escape(suffix)):
+        if stale_path != keep:
+            os.remove(stale_path)
+
+
+def storeCached(cache_path, array, suffix='.npy'):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # entries of older versions of the same file are stale now
+        removeCached(cache_path, suffix, cache_path)
+        temp_path = '{0}.{1}.tmp'.format(cache_path, os.getpid())
+        with open(temp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # a read-only model directory just means no cache
+        pass
+
+
+def parsOBJ(path, use_cache=True):
+    if use_cache:
+        cache_path = getCachePath(path)
+        if os.path.exists(cache_path):
+            print('loading', path, '(cached)')
+            return loadCached(cache_path)
+
+    vertices = parseOBJFile(path)
+    if use_cache:
+        storeCached(cache_path, vertices)
+    return vertices
+
+
+def parseOBJFile(path):
     print('loading', path)
 
     vertices = []
@@ -29,4 +89,210 @@ def parsOBJ(path):
         gl_vertices.append(vertices[face[2]])
         gl_vertices.append(vertices[face[3]])
 
-    return np.asarray(gl_vertices)
\ No newline at end of file
+    return np.asarray(gl_vertices)
+
+class Mesh:
+    # indexed triangle mesh, normals is None if the obj file has none or they were not requested
+    def __init__(self, vertices, indices, normals=None):
+        self.vertices = vertices
+        self.indices = indices
+        self.normals = normals
+        self.triangle_vertices = None
+
+    def getTriangleVertices(self):
+        # non-indexed (T*3, 3) copy, e.g. for immediate mode drawing
+        if self.triangle_vertices is None:
+            self.triangle_vertices = np.asarray(self.vertices)[np.asarray(self.indices)]
+        return self.triangle_vertices
+
+    def getTriangleCount(self):
+        return len(self.indices) // 3
+
+
+MESH_ARRAYS = ('vertices', 'indices', 'normals')
+
+VERTEX_LINE = 1
+NORMAL_LINE = 2
+FACE_LINE = 3
+
+
+def loadOBJ(path, with_normals=True, use_cache=True):
+    if use_cache:
+        suffixes = ['.{0}{1}.npy'.format(name, '' if with_normals else '-nonormals') for name in MESH_ARRAYS]
+        cache_paths = [getCachePath(path, suffix) for suffix in suffixes]
+        if os.path.exists(cache_paths[0]) and os.path.exists(cache_paths[1]):
+            print('loading', path, '(cached)')
+            arrays = [loadCached(cache_path) if os.path.exists(cache_path) else None for cache_path in cache_paths]
+            return Mesh(*arrays)
+
+    mesh = parseOBJMesh(path, with_normals)
+    if use_cache:
+        for cache_path, suffix, name in zip(cache_paths, suffixes, MESH_ARRAYS):
+            if getattr(mesh, name) is not None:
+                storeCached(cache_path, getattr(mesh, name), suffix)
+            else:
+                # normals of an older version of the file would never be read or replaced again
+                try:
+                    removeCached(cache_path, suffix)
+                except OSError:
+                    pass
+    return mesh
+
+
+def parseOBJMesh(path, with_normals=True):
+    # bulk parser, lines are classified and tokenized with numpy instead of one by one
+    print('loading', path)
+    with open(path, 'rb') as f:
+        data = np.frombuffer(f.read() + b'\n', dtype=np.uint8).copy()
+
+    line_ends = np.flatnonzero(data == ord('\n'))
+    line_starts = np.concatenate([[0], line_ends[:-1] + 1])
+    line_lengths = line_ends - line_starts + 1
+
+    # comments run from # to the end of the line, also after the numbers of a line
+    hashes = np.flatnonzero(data == ord('#'))
+    if len(hashes):
+        comment_lines, first_hashes = np.unique(np.searchsorted(line_ends, hashes), return_index=True)
+        marks = np.zeros(len(data) + 1, dtype=np.int8)
+        marks[hashes[first_hashes]] = 1
+        marks[line_ends[comment_lines]] = -1
+        data[np.cumsum(marks[:-1], dtype=np.int8) > 0] = ord(' ')
+
+    # keywords may be indented
+    keyword_starts = line_starts.copy()
+    for line in np.flatnonzero((data[line_starts] == ord(' ')) | (data[line_starts] == ord('\t'))):
+        while data[keyword_starts[line]] in (ord(' '), ord('\t')):
+            keyword_starts[line] += 1
+    first = data[keyword_starts]
+    second = data[np.minimum(keyword_starts + 1, len(data) - 1)]
+    is_blank = (second == ord(' ')) | (second == ord('\t'))
+
+    line_types = np.zeros(len(line_starts), dtype=np.uint8)
+    line_types[(first == ord('v')) & is_blank] = VERTEX_LINE
+    line_types[(first == ord('v')) & (second == ord('n'))] = NORMAL_LINE
+    line_types[(first == ord('f')) & is_blank] = FACE_LINE
+    byte_types = np.repeat(line_types, line_lengths)
+
+    # keywords and line breaks become separators
+    data[keyword_starts[line_types != 0]] = ord(' ')
+    data[keyword_starts[line_types == NORMAL_LINE] + 1] = ord(' ')
+    data[(data == ord('\r')) | (data == ord('\t')) | (data == ord('\n'))] = ord(' ')
+
+    positions = parseNumbers(path, data, line_lengths, line_types, byte_types, VERTEX_LINE)
+    if not np.any(line_types == FACE_LINE):
+        return Mesh(positions.astype(np.float32), np.zeros(0, dtype=np.uint32), None)
+    normals = None
+    if with_normals:
+        normals = parseNumbers(path, data, line_lengths, line_types, byte_types, NORMAL_LINE)
+
+    # corners per face from the token starts on each line
+    face_bytes = data[byte_types == FACE_LINE]
+    face_sizes, token_positions = countTokens(face_bytes, line_lengths[line_types == FACE_LINE])
+
+    # every corner is v, v/vt, v//vn or v/vt/vn on its own, files may mix them
+    corner_count = int(np.sum(face_sizes))
+    slashes = np.flatnonzero(face_bytes == ord('/'))
+    slash_counts = np.bincount(np.searchsorted(token_positions, slashes, side='right') - 1, minlength=corner_count)
+    double_slashes = slashes[1:][np.diff(slashes) == 1]
+    number_counts = slash_counts + 1 - np.bincount(np.searchsorted(token_positions, double_slashes, side='right') - 1,
+                                                   minlength=corner_count)
+    has_normal = slash_counts == 2
+
+    face_bytes[slashes] = ord(' ')
+    numbers = np.array(face_bytes.tobytes().split(), dtype=np.int64)
+    if len(numbers) != np.sum(number_counts) or np.any(slash_counts > 2):
+        raise ValueError('{0}: malformed face indices'.format(path))
+    number_starts = np.cumsum(number_counts) - number_counts
+
+    # negative indices are relative to the vertices defined before the face
+    face_line_indices = np.flatnonzero(line_types == FACE_LINE)
+    vertex_counts = np.repeat(np.cumsum(line_types == VERTEX_LINE)[face_line_indices], face_sizes)
+    corner_vertices = numbers[number_starts]
+    corner_vertices = np.where(corner_vertices < 0, corner_vertices + vertex_counts, corner_vertices - 1)
+
+    # fan triangulation of triangles, quads and n-gons
+    face_offsets = np.cumsum(face_sizes) - face_sizes
+    triangle_counts = np.maximum(face_sizes - 2, 0)
+    triangle_faces = np.repeat(np.arange(len(face_sizes)), triangle_counts)
+    fan_steps = np.arange(len(triangle_faces)) - np.repeat(np.cumsum(triangle_counts) - triangle_counts, triangle_counts) + 1
+    fan_starts = face_offsets[triangle_faces]
+    corners = np.stack([fan_starts, fan_starts + fan_steps, fan_starts + fan_steps + 1], axis=1).ravel()
+
+    # normals are only used if every corner has one
+    if normals is not None and len(normals) > 0 and np.all(has_normal):
+        normal_counts = np.repeat(np.cumsum(line_types == NORMAL_LINE)[face_line_indices], face_sizes)
+        corner_normals = numbers[number_starts + number_counts - 1]
+        corner_normals = np.where(corner_normals < 0, corner_normals + normal_counts, corner_normals - 1)
+        # unique (vertex, normal) pairs, packed into one integer key
+        keys = corner_vertices[corners] * len(normals) + corner_normals[corners]
+        unique_keys, indices = np.unique(keys, return_inverse=True)
+        vertices = positions[unique_keys // len(normals)]
+        normals = normals[unique_keys % len(normals)].astype(np.float32)
+    else:
+        # obj vertices are indexed already, only unreferenced ones are dropped
+        used = np.zeros(len(positions), dtype=bool)
+        used[corner_vertices] = True
+        remap = np.cumsum(used) - 1
+        indices = remap[corner_vertices[corners]]
+        vertices = positions[used]
+        normals = None
+
+    return Mesh(vertices.astype(np.float32), indices.reshape(-1).astype(np.uint32), normals)
+
+
+def countTokens(line_bytes, line_lengths):
+    # tokens per line and the positions where they start, lines have to begin with a separator
+    filled = line_bytes != ord(' ')
+    token_starts = np.flatnonzero(filled[1:] & ~filled[:-1]) + 1
+    line_offsets = np.cumsum(line_lengths) - line_lengths
+    return np.diff(np.searchsorted(token_starts, np.append(line_offsets, len(line_bytes)))), token_starts
+
+
+def parseNumbers(path, data, line_lengths, line_types, byte_types, line_type, columns=3):
+    # (n, columns) numbers of the lines of one type, further numbers like the w or the color of a vertex are dropped
+    line_bytes = data[byte_types == line_type]
+    counts = countTokens(line_bytes, line_lengths[line_types == line_type])[0]
+    if len(counts) == 0:
+        return np.zeros((0, columns))
+    if np.any(counts < columns):
+        raise ValueError('{0}: line {1} has fewer than {2} numbers'.format(
+            path, np.flatnonzero(line_types == line_type)[np.argmax(counts < columns)] + 1, columns))
+    numbers = np.array(line_bytes.tobytes().split(), dtype=np.float64)
+    if np.all(counts == columns):
+        return numbers.reshape(-1, columns)
+    return numbers[(np.cumsum(counts) - counts)[:, None] + np.arange(columns)]
+
+
+def writeGridOBJ(path, faces):
+    # flat grid of about faces quads, e.g. for load time measurements, returns the number of quads
+    size = int(np.sqrt(faces))
+    u, v = np.meshgrid(np.arange(size + 1, dtype=float), np.arange(size + 1, dtype=float))
+    grid = np.arange((size + 1) * (size + 1)).reshape(size + 1, size + 1) + 1
+    quads = np.stack([grid[:-1, :-1], grid[:-1, 1:], grid[1:, 1:], grid[1:, :-1]], axis=-1).reshape(-1, 4)
+    with open(path, 'w') as f:
+        np.savetxt(f, np.stack([u.ravel(), v.ravel(), np.zeros(u.size)], axis=1), fmt='v %.6f %.6f %.6f')
+        np.savetxt(f, quads, fmt='f %d %d %d %d')
+    return len(quads)
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    import tempfile
+
+    # load time of the line by line parser compared to the bulk loader on a generated quad grid
+    faces = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'grid.obj')
+        quad_count = writeGridOBJ(path, faces)
+
+        start = time.perf_counter()
+        quad_vertices = parsOBJ(path, use_cache=False)
+        parse_time = time.perf_counter() - start
+        start = time.perf_counter()
+        mesh = loadOBJ(path, use_cache=False)
+        load_time = time.perf_counter() - start
+
+        print('{0} faces'.format(quad_count))
+        print('parsOBJ: {0:7.3f} s, {1:8.1f} MB'.format(parse_time, quad_vertices.nbytes / 1e6))
+        print('loadOBJ: {0:7.3f} s, {1:8.1f} MB'.format(load_time, (mesh.vertices.nbytes + mesh.indices.nbytes) / 1e6))
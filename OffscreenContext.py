@@ -0,0 +1,61 @@
+import os
+import ctypes
+
+# must be configured before OpenGL is imported anywhere in the process
+os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+if not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'):
+    # lets Mesa create contexts without any window system, e.g. llvmpipe on render nodes
+    os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+from OpenGL import EGL
+import OpenGL.GL as gl
+
+
+class OffscreenContext:
+    # EGL pbuffer context with a legacy compatible OpenGL profile, no window or Qt needed
+
+    def __init__(self, width=1920, height=1080):
+        self.width = width
+        self.height = height
+
+        self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        if not EGL.eglInitialize(self.display, ctypes.pointer(major), ctypes.pointer(minor)):
+            raise RuntimeError('could not initialize EGL display')
+
+        config_attributes = [
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RED_SIZE, 8,
+            EGL.EGL_GREEN_SIZE, 8,
+            EGL.EGL_BLUE_SIZE, 8,
+            EGL.EGL_ALPHA_SIZE, 8,
+            EGL.EGL_DEPTH_SIZE, 24,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_NONE,
+        ]
+        config = EGL.EGLConfig()
+        config_count = EGL.EGLint()
+        EGL.eglChooseConfig(self.display, (EGL.EGLint * len(config_attributes))(*config_attributes),
+                            ctypes.pointer(config), 1, ctypes.pointer(config_count))
+        if config_count.value == 0:
+            raise RuntimeError('no matching EGL config')
+
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        surface_attributes = [EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height, EGL.EGL_NONE]
+        self.surface = EGL.eglCreatePbufferSurface(self.display, config,
+                                                   (EGL.EGLint * len(surface_attributes))(*surface_attributes))
+        self.context = EGL.eglCreateContext(self.display, config, EGL.EGL_NO_CONTEXT, None)
+        self.makeCurrent()
+
+    def makeCurrent(self):
+        if not EGL.eglMakeCurrent(self.display, self.surface, self.surface, self.context):
+            raise RuntimeError('could not make EGL context current')
+
+    def getOpenglInfo(self):
+        return '{0} / {1}'.format(gl.glGetString(gl.GL_RENDERER), gl.glGetString(gl.GL_VERSION))
+
+    def release(self):
+        EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        EGL.eglDestroyContext(self.display, self.context)
+        EGL.eglDestroySurface(self.display, self.surface)
+        EGL.eglTerminate(self.display)
@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from Machine import buildMachine
+from Simulate import simulateChunk
+
+# per process state of the pool workers, set up once by initWorker
+worker = {}
+
+
+def attachArray(name, shape):
+    memory = shared_memory.SharedMemory(name=name)
+    return memory, np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+
+
+def initWorker(definition, axis_positions, names, capacity):
+    machine = buildMachine(definition)
+    for axis, axis_position in zip(machine.getKinematicChain().axes, axis_positions):
+        axis.axis_position = axis_position
+    worker['machine'] = machine
+    worker['arrays'] = [attachArray(name, (capacity, columns)) for name, columns in zip(names, (6, 5, 3))]
+
+
+def solveRange(start, end):
+    machine = worker['machine']
+    (_, tool_path), (_, states), (_, tool_tips) = worker['arrays']
+    states[start:end], tool_tips[start:end] = simulateChunk(machine, tool_path[start:end])
+    return end - start
+
+
+class ParallelSolver:
+    # tool path, axis states and tool tips live in shared memory, workers only receive index ranges
+
+    def __init__(self, machine, workers=None, capacity=1000000, chunk_size=50000):
+        self.workers = workers or os.cpu_count()
+        self.capacity = capacity
+        self.chunk_size = chunk_size
+
+        self.memories = []
+        self.arrays = []
+        for columns in (6, 5, 3):
+            memory = shared_memory.SharedMemory(create=True, size=capacity * columns * 8)
+            self.memories.append(memory)
+            self.arrays.append(np.ndarray((capacity, columns), dtype=np.float64, buffer=memory.buf))
+
+        chain = machine.getKinematicChain()
+        self.pool = ProcessPoolExecutor(self.workers, initializer=initWorker,
+                                        initargs=(machine.getDefinition(), chain.currentPositions(),
+                                                  [memory.name for memory in self.memories], capacity))
+
+    def solve(self, tool_path):
+        # returns (N, 5) axis states and (N, 3) tool tip positions, identical to Simulate.simulateChunk
+        tool_path = np.asarray(tool_path)
+        states = np.empty((len(tool_path), 5))
+        tool_tips = np.empty((len(tool_path), 3))
+        shared_path, shared_states, shared_tool_tips = self.arrays
+
+        for block_start in range(0, len(tool_path), self.capacity):
+            block_end = min(block_start + self.capacity, len(tool_path))
+            block_length = block_end - block_start
+            shared_path[:block_length] = tool_path[block_start:block_end, :6]
+
+            ranges = [(start, min(start + self.chunk_size, block_length)) for start in range(0, block_length, self.chunk_size)]
+            for future in [self.pool.submit(solveRange, start, end) for start, end in ranges]:
+                future.result()
+
+            states[block_start:block_end] = shared_states[:block_length]
+            tool_tips[block_start:block_end] = shared_tool_tips[:block_length]
+        return states, tool_tips
+
+    def close(self):
+        self.pool.shutdown()
+        self.arrays = []
+        for memory in self.memories:
+            memory.close()
+            memory.unlink()
+        self.memories = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def solveParallel(machine, tool_path, workers=None, chunk_size=50000):
+    with ParallelSolver(machine, workers, max(len(tool_path), 1), chunk_size) as solver:
+        return solver.solve(tool_path)
+
+
+if __name__ == '__main__':
+    from Machine import buildDefaultMachine
+    from ToolPathCreator import circle
+
+    # scaling benchmark from one core up to all cores
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    machine = buildDefaultMachine()
+    tool_path = np.tile(circle(1000, [1.5, 2, 1]), (steps // 1000 + 1, 1))[:steps]
+
+    start = time.perf_counter()
+    serial_states, serial_tool_tips = simulateChunk(machine, tool_path)
+    serial_time = time.perf_counter() - start
+    print('serial    : {0:7.3f} s'.format(serial_time))
+
+    worker_counts = sorted(set([2 ** i for i in range(max_workers.bit_length()) if 2 ** i < max_workers] + [max_workers]))
+    for workers in worker_counts:
+        with ParallelSolver(machine, workers, len(tool_path)) as solver:
+            solver.solve(tool_path[:workers])
+            start = time.perf_counter()
+            states, tool_tips = solver.solve(tool_path)
+            duration = time.perf_counter() - start
+        identical = np.array_equal(states, serial_states) and np.array_equal(tool_tips, serial_tool_tips)
+        print('{0:2d} workers: {1:7.3f} s, speedup {2:5.2f}, identical: {3}'.format(workers, duration, serial_time / duration, identical))
@@ -0,0 +1,173 @@
+import time
+
+import numpy as np
+
+from Feasibility import stepTimes, unwrapRotations
+
+# plays a solved trajectory back in real time, independent of the frame rate, without Qt
+
+
+def appendRows(buffer, length, rows):
+    # writes rows after the first length rows of buffer, a buffer twice as large replaces it when it is full
+    if length + len(rows) > len(buffer):
+        grown = np.empty((max(2 * len(buffer), length + len(rows)),) + buffer.shape[1:])
+        grown[:length] = buffer[:length]
+        buffer = grown
+    buffer[length:length + len(rows)] = rows
+    return buffer
+
+
+class PlaybackScheduler:
+    # maps the wall clock onto a fractional tool path index. the time of every step comes from its length
+    # at the feed rate, frames only sample the playback time, so slow frames skip samples instead of slowing down
+
+    def __init__(self, feed_rate=1000.0, speed=1.0, loop=True, clock=time.perf_counter):
+        self.feed_rate = feed_rate
+        self.speed = speed
+        self.loop = loop
+        self.clock = clock
+        self.playing = True
+
+        self.states = np.zeros((1, 5))
+        self.tool_path = np.zeros((1, 6))
+        self.sample_times = np.zeros(1)
+        # the arrays above are views into these while a trajectory is extended block by block
+        self.states_buffer = self.states
+        self.tool_path_buffer = self.tool_path
+        self.sample_times_buffer = self.sample_times
+
+        # playback time [s] at the wall clock time of the anchor
+        self.anchor_clock = clock()
+        self.anchor_time = 0.0
+
+    def setTrajectory(self, machine, tool_path, states=None):
+        # states default to the solved tool path, rotations are unwrapped so a and b interpolate the short way
+        tool_path = np.asarray(tool_path, dtype=float)
+        if states is None:
+            states = machine.calculateDesiredStates(tool_path)
+        self.states = unwrapRotations(states, machine.getToolPositionWithoutRotation())[0]
+        self.tool_path = tool_path
+        self.updateSampleTimes()
+        self.states_buffer = self.states
+        self.tool_path_buffer = self.tool_path
+        self.sample_times_buffer = self.sample_times
+        self.seek(0)
+
+    def setSolvedTrajectory(self, tool_path, states, sample_times):
+        # unwrapped states and their sample times [s] from elsewhere, e.g. memory mapped from a TrajectoryFile.
+        # nothing is computed, so samples are only read when they are played
+        self.tool_path = tool_path
+        self.states = states
+        self.sample_times = sample_times
+        self.states_buffer = self.states
+        self.tool_path_buffer = self.tool_path
+        self.sample_times_buffer = self.sample_times
+        self.seek(0)
+
+    def extendTrajectory(self, tool_path, states):
+        # appends samples after the current ones without moving the playback time, e.g. while the rest of a large
+        # program is still being solved. states have to continue the unwrapped rotations of the samples before
+        self.reanchor()
+        length = len(self.states)
+        tool_path = np.asarray(tool_path, dtype=float)
+        step_times = self.getStepTimes(np.concatenate([self.tool_path[-1:], tool_path]))
+        self.states_buffer = appendRows(self.states_buffer, length, states)
+        self.tool_path_buffer = appendRows(self.tool_path_buffer, length, tool_path)
+        self.sample_times_buffer = appendRows(self.sample_times_buffer, length, self.sample_times[-1] + np.cumsum(step_times))
+        self.states = self.states_buffer[:length + len(states)]
+        self.tool_path = self.tool_path_buffer[:length + len(states)]
+        self.sample_times = self.sample_times_buffer[:length + len(states)]
+
+    def getStepTimes(self, tool_path):
+        step_times = stepTimes(tool_path, self.feed_rate)
+        if len(step_times) and np.sum(step_times) <= 0.0:
+            # nothing but rotations, one step per frame at 60 Hz
+            step_times = stepTimes(tool_path, sample_time=1 / 60)
+        return step_times
+
+    def updateSampleTimes(self):
+        self.sample_times = np.concatenate([[0.0], np.cumsum(self.getStepTimes(self.tool_path))])
+        self.sample_times_buffer = self.sample_times
+
+    def getDuration(self):
+        # seconds for the whole program at the feed rate, without the speed multiplier
+        return self.sample_times[-1]
+
+    def getTime(self, now=None):
+        now = self.clock() if now is None else now
+        if not self.playing:
+            return self.anchor_time
+        playback_time = self.anchor_time + (now - self.anchor_clock) * self.speed
+        duration = self.getDuration()
+        if duration <= 0.0:
+            return 0.0
+        if self.loop:
+            return playback_time % duration
+        return min(playback_time, duration)
+
+    def reanchor(self):
+        # keeps the current position when the speed, the feed rate or the play state change
+        now = self.clock()
+        self.anchor_time = self.getTime(now)
+        self.anchor_clock = now
+
+    def setSpeed(self, speed):
+        self.reanchor()
+        self.speed = speed
+
+    def setFeedRate(self, feed_rate):
+        position = self.getPosition()
+        self.feed_rate = feed_rate
+        self.updateSampleTimes()
+        self.seek(position)
+
+    def setPlaying(self, playing):
+        self.reanchor()
+        self.playing = playing
+
+    def seek(self, position):
+        # jumps to a fractional tool path index
+        position = min(max(position, 0.0), len(self.sample_times) - 1)
+        index = min(int(position), len(self.sample_times) - 2) if len(self.sample_times) > 1 else 0
+        fraction = position - index
+        times = self.sample_times
+        self.anchor_time = times[index] + (times[min(index + 1, len(times) - 1)] - times[index]) * fraction
+        self.anchor_clock = self.clock()
+
+    def getPosition(self, now=None):
+        # fractional tool path index for the playback time
+        playback_time = self.getTime(now)
+        times = self.sample_times
+        index = int(np.searchsorted(times, playback_time, side='right')) - 1
+        index = min(max(index, 0), len(times) - 1)
+        if index == len(times) - 1:
+            return float(index)
+        step_time = times[index + 1] - times[index]
+        return index + ((playback_time - times[index]) / step_time if step_time > 0.0 else 0.0)
+
+    def getPositions(self, playback_times):
+        # vectorized getPosition for playback times [s], e.g. the frames of a rendered video
+        times = self.sample_times
+        playback_times = np.asarray(playback_times, dtype=float)
+        index = np.clip(np.searchsorted(times, playback_times, side='right') - 1, 0, len(times) - 1)
+        next_index = np.minimum(index + 1, len(times) - 1)
+        step_time = times[next_index] - times[index]
+        fraction = np.where(step_time > 0.0, (playback_times - times[index]) / np.where(step_time > 0.0, step_time, 1.0), 0.0)
+        return index + np.clip(fraction, 0.0, 1.0)
+
+    def getStates(self, playback_times):
+        # (F, 5) states interpolated like getState
+        positions = self.getPositions(playback_times)
+        index = np.minimum(positions.astype(int), len(self.states) - 1)
+        next_index = np.minimum(index + 1, len(self.states) - 1)
+        fraction = (positions - index)[:, None]
+        return self.states[index] * (1 - fraction) + self.states[next_index] * fraction
+
+    def getState(self, now=None):
+        # (5,) axis state interpolated between the two samples around the playback time
+        position = self.getPosition(now)
+        index = int(position)
+        if index >= len(self.states) - 1:
+            return self.states[-1].copy()
+        fraction = position - index
+        return self.states[index] * (1 - fraction) + self.states[index + 1] * fraction
@@ -0,0 +1,72 @@
+import argparse
+import time
+
+from OffscreenContext import OffscreenContext
+
+import OpenGL.GL as gl
+import OpenGL.GLU as glu
+
+from Machine import buildDefaultMachine
+from MachineRenderer import MachineRenderer
+from ToolPathCreator import circle
+
+
+def setupCamera(width, height):
+    # same projection and view as GLWidget.resizeGL and GLWidget.paintGL
+    gl.glViewport(0, 0, width, height)
+    gl.glMatrixMode(gl.GL_PROJECTION)
+    gl.glLoadIdentity()
+    glu.gluPerspective(45.0, (width / height), 0.0001, 10000.0)
+    gl.glMatrixMode(gl.GL_MODELVIEW)
+    gl.glLoadIdentity()
+    gl.glTranslated(0, -2.0, -12.5)
+    gl.glRotated(20, 1.0, 0.0, 0.0)
+    gl.glRotated(-45, 0.0, 1.0, 0.0)
+
+
+def timeFrames(renderer, machine, tool_path, frames):
+    frame_times = []
+    for i in range(frames):
+        start = time.perf_counter()
+        machine.calculateDesiredState(tool_path[i % len(tool_path)])
+        machine.buildMachinState()
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+        renderer.drawMachine(machine)
+        gl.glFinish()
+        frame_times.append(time.perf_counter() - start)
+    frame_times.sort()
+    return frame_times[len(frame_times) // 2]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='compares immediate mode and vertex buffer machine rendering offscreen')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--mesh', default=None, help='obj file loaded into every axis instead of the demo meshes')
+    args = parser.parse_args()
+
+    context = OffscreenContext(args.width, args.height)
+    print(context.getOpenglInfo())
+    gl.glEnable(gl.GL_DEPTH_TEST)
+    gl.glEnable(gl.GL_CULL_FACE)
+    gl.glClearColor(1.0, 1.0, 1.0, 1.0)
+    setupCamera(args.width, args.height)
+
+    machine = buildDefaultMachine()
+    if args.mesh is not None:
+        for axis in machine.getKinematicChain().axes:
+            axis.loadModel(args.mesh)
+    triangle_count = sum(axis.getMesh().getTriangleCount() for axis in machine.getKinematicChain().axes)
+    tool_path = circle(500, [1.5, 2, 1])
+
+    for immediate_mode in (True, False):
+        renderer = MachineRenderer(immediate_mode=immediate_mode)
+        renderer.initializeGL()
+        timeFrames(renderer, machine, tool_path, 5)
+        frame_time = timeFrames(renderer, machine, tool_path, args.frames)
+        print('{0:>10}: {1:8.3f} ms/frame ({2} triangles)'.format(
+            'immediate' if immediate_mode else 'vbo', frame_time * 1000, triangle_count))
+        renderer.cleanup()
+
+    context.release()
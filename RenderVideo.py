@@ -0,0 +1,190 @@
+import os
+import sys
+import time
+import zlib
+import struct
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from Machine import buildDefaultMachine, buildMachine, loadMachine
+from Playback import PlaybackScheduler
+from ToolPathCreator import circle
+from ToolPathReader import readToolPath
+import TrajectoryCache
+
+# renders the scene of the viewer into offscreen EGL framebuffers, no window or display needed. the frames are
+# split over worker processes, every worker has its own GL context and renders whole chunks of frames
+
+# per process state of the pool workers, set up once by initWorker
+worker = {}
+
+
+def writePNG(path, image, level=3):
+    # (height, width, 3) uint8 rgb image, written with zlib only
+    height, width = image.shape[:2]
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = image.reshape(height, width * 3)
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(rows.tobytes(), level)))
+        f.write(chunk(b'IEND', b''))
+
+
+def calculateFrameStates(machine, tool_path, fps, feed_rate, speed, states=None):
+    # (F, 5) machine states of the video frames, the program plays at the feed rate times speed like in the viewer
+    playback = PlaybackScheduler(feed_rate, speed, loop=False)
+    playback.setTrajectory(machine, tool_path, states)
+    frame_count = int(playback.getDuration() / speed * fps) + 1
+    return playback.getStates(np.arange(frame_count) / fps * speed)
+
+
+def initWorker(definition, tool_path_file, frame_states, width, height, rotation, position):
+    # imported here, EGL has to be set up in every process on its own
+    from OffscreenContext import OffscreenContext
+    import OpenGL.GL as gl
+    from SceneRenderer import SceneRenderer
+
+    # the mesh loader reports on stdout, which may carry the frames
+    sys.stdout = sys.stderr
+    context = OffscreenContext(width, height)
+    scene = SceneRenderer()
+    scene.initializeGL()
+    scene.resize(width, height, fill=True)
+    gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+
+    machine = buildMachine(definition)
+    machine.setToolPath(np.load(tool_path_file, mmap_mode='r'))
+    worker.update(context=context, scene=scene, machine=machine, frame_states=frame_states, width=width,
+                  height=height, rotation=rotation, position=position)
+
+
+def renderFrame(index):
+    import OpenGL.GL as gl
+
+    machine = worker['machine']
+    machine.setState(worker['frame_states'][index])
+    machine.buildMachinState()
+    worker['scene'].paint(machine, worker['rotation'], worker['position'])
+    gl.glFinish()
+    pixels = gl.glReadPixels(0, 0, worker['width'], worker['height'], gl.GL_RGB, gl.GL_UNSIGNED_BYTE)
+    # GL rows start at the bottom
+    return np.frombuffer(pixels, dtype=np.uint8).reshape(worker['height'], worker['width'], 3)[::-1]
+
+
+def renderToFiles(start, end, frames_dir):
+    for index in range(start, end):
+        writePNG(os.path.join(frames_dir, 'frame_{0:06d}.png'.format(index)), renderFrame(index))
+    return end - start
+
+
+def renderToBytes(start, end):
+    return b''.join(renderFrame(index).tobytes() for index in range(start, end))
+
+
+def renderVideo(machine, tool_path, frames_dir=None, output=None, width=1920, height=1080, fps=30, feed_rate=5000.0,
+                speed=1.0, workers=None, chunk_size=8, rotation=(20.0, -45.0, 0.0), position=(0.0, 0.0, 0.0),
+                encoder='ffmpeg', frame_range=None):
+    # frames_dir gets a png per frame, output gets raw rgb24 frames ('-' for stdout, .rgb/.raw files) or is encoded
+    # by the encoder, e.g. output='review.mp4', only one of them is written. returns the number of rendered frames
+    if (frames_dir is None) == (output is None):
+        raise ValueError('renderVideo needs either frames_dir or output')
+    workers = workers or os.cpu_count()
+    tool_path = np.asarray(tool_path, dtype=float)
+    states = TrajectoryCache.cache.get(machine, tool_path).getStates()
+    frame_states = calculateFrameStates(machine, tool_path, fps, feed_rate, speed, states)
+    start, end = frame_range if frame_range is not None else (0, len(frame_states))
+    end = min(end, len(frame_states))
+    chunks = [(chunk_start, min(chunk_start + chunk_size, end)) for chunk_start in range(start, end, chunk_size)]
+
+    sink = None
+    encoder_process = None
+    if output == '-':
+        sink = sys.__stdout__.buffer
+    elif output is not None and os.path.splitext(output)[1].lower() in ('.rgb', '.raw'):
+        sink = open(output, 'wb')
+    elif output is not None:
+        encoder_process = subprocess.Popen([encoder, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                                            '-s', '{0}x{1}'.format(width, height), '-r', str(fps), '-i', '-',
+                                            '-pix_fmt', 'yuv420p', output], stdin=subprocess.PIPE)
+        sink = encoder_process.stdin
+    if frames_dir is not None:
+        os.makedirs(frames_dir, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # workers memory map the tool path instead of receiving a copy each
+        tool_path_file = os.path.join(temp_dir, 'tool_path.npy')
+        np.save(tool_path_file, tool_path)
+        with ProcessPoolExecutor(workers, initializer=initWorker,
+                                 initargs=(machine.getDefinition(), tool_path_file, frame_states, width, height,
+                                           tuple(rotation), tuple(position))) as pool:
+            if sink is None:
+                for future in [pool.submit(renderToFiles, chunk_start, chunk_end, frames_dir) for chunk_start, chunk_end in chunks]:
+                    future.result()
+            else:
+                # frames go to the sink in order, only a few chunks per worker are kept in flight
+                pending = []
+                for chunk_start, chunk_end in chunks:
+                    pending.append(pool.submit(renderToBytes, chunk_start, chunk_end))
+                    if len(pending) >= 2 * workers:
+                        sink.write(pending.pop(0).result())
+                for future in pending:
+                    sink.write(future.result())
+
+    if encoder_process is not None:
+        encoder_process.stdin.close()
+        if encoder_process.wait() != 0:
+            raise RuntimeError('{0} failed with exit code {1}'.format(encoder, encoder_process.returncode))
+    elif sink is not None and sink is not sys.__stdout__.buffer:
+        sink.close()
+    return end - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='renders a simulation video without a display')
+    parser.add_argument('tool_path', nargs='?', default=None, help='tool path file, a demo circle if omitted')
+    parser.add_argument('--machine', default=None, help='json machine definition, the demo machine if omitted')
+    parser.add_argument('--frames-dir', default=None, help='write frame_000000.png... into this directory')
+    parser.add_argument('--output', default=None, help='video file encoded by --encoder, .rgb/.raw for raw rgb24 frames, - for stdout')
+    parser.add_argument('--encoder', default='ffmpeg', help='encoder reading raw rgb24 frames from stdin')
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--feed-rate', type=float, default=5000.0, help='mm/min along the tool path')
+    parser.add_argument('--speed', type=float, default=1.0, help='playback speed multiplier')
+    parser.add_argument('--frames', type=int, nargs=2, default=None, metavar=('START', 'END'), help='render only these frames')
+    parser.add_argument('--workers', type=int, default=None, help='render processes, one per cpu if omitted')
+    parser.add_argument('--chunk-size', type=int, default=8, help='frames per task')
+    parser.add_argument('--rotation', type=float, nargs=3, default=[20.0, -45.0, 0.0], help='camera rotation [deg]')
+    parser.add_argument('--position', type=float, nargs=3, default=[0.0, 0.0, 0.0], help='camera offset')
+    args = parser.parse_args(argv)
+    if (args.frames_dir is None) == (args.output is None):
+        parser.error('exactly one of --frames-dir or --output is required')
+
+    if args.output == '-':
+        sys.stdout = sys.stderr
+    machine = buildDefaultMachine() if args.machine is None else loadMachine(args.machine)
+    if args.tool_path is None:
+        tool_path = circle(500, [1.5, 2, 1])
+    else:
+        tool_path = np.concatenate(list(readToolPath(args.tool_path)))
+
+    start = time.perf_counter()
+    frames = renderVideo(machine, tool_path, args.frames_dir, args.output, args.width, args.height, args.fps,
+                         args.feed_rate, args.speed, args.workers, args.chunk_size, args.rotation, args.position,
+                         args.encoder, args.frames)
+    elapsed = time.perf_counter() - start
+    print('{0} frames in {1:.1f} s, {2:.1f} frames/s'.format(frames, elapsed, frames / max(elapsed, 1e-9)), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,20 +1,29 @@
 import sys
 import math
+import argparse
 import numpy as np
 
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import (QApplication, QHBoxLayout, QOpenGLWidget, QSlider,
-                             QWidget, QPushButton)
+                             QWidget, QPushButton, QLabel, QProgressBar)
 
 import OpenGL.GL as gl
-import OpenGL.GLU as glu
 
-from Machine import Machine, Axis
+import TrajectoryCache
+from BackgroundLoader import BackgroundLoader
+from FrameProfiler import profiler
+from LiveStream import LiveReceiver, STATE
+from Machine import Machine, Axis, buildDefaultMachine
+from Playback import PlaybackScheduler
+from SceneRenderer import SceneRenderer
+from StockSimulation import VoxelStock, StockSimulator
 from ToolPathCreator import circle
+from TrajectoryFile import TrajectoryFile, EXTENSION, saveTrajectory
 
 class Window(QWidget):
-    def __init__(self):
+    def __init__(self, tool_path_file=None, feed_rate=5000.0, speed=1.0, stock=None, tool_radius=3.0,
+                 cutting_length=20.0, resolution=0.5, listen=None, overflow='drop'):
         super(Window, self).__init__()
 
         self.glWidget = GLWidget(self)
@@ -24,57 +33,37 @@ class Window(QWidget):
 
         self.setWindowTitle("5-Axis Simulator")
 
-        self.machine = Machine()
-        self.machine.base = Axis('base')
-        self.machine.base.loadModel('base_frame.obj')
-        self.machine.base.setColor(200,200,200)
-        self.machine.base.setRelativePosition(1.5,-0.85,-1.15)
-
-        x_axis = Axis('x_axis')
-        x_axis.loadModel('x_axis.obj')
-        x_axis.setColor(200,25,25)
-        x_axis.defineMovement(type='linear', axis='x')
-        x_axis.setRelativePosition(-1.5,4.55,0.35)
-
-        y_axis = Axis('y_axis')
-        y_axis.loadModel('y_axis.obj')
-        y_axis.setColor(25,200,25)
-        y_axis.defineMovement(type='linear', axis='z', negative=True)
-        y_axis.setRelativePosition(0,0,3.125)
-
-        z_axis = Axis('z_axis')
-        z_axis.loadModel('z_axis.obj')
-        z_axis.setColor(25,25,200)
-        z_axis.defineMovement(type='linear', axis='y')
-        z_axis.setRelativePosition(0,-0.15,0)
-
-
-        a_axis = Axis('a_axis')
-        a_axis.loadModel('a_axis.obj')
-        a_axis.setColor(200,200,25)
-        a_axis.defineMovement(type='rotation', axis='y')
-        a_axis.setRelativePosition(0, -2.8, 0)
-
-        b_axis = Axis('b_axis')
-        b_axis.loadModel('b_axis_tool.obj')
-        b_axis.setColor(200,25,200)
-        b_axis.defineMovement(type='rotation', axis='z')
-        b_axis.setRelativePosition(0, 0, 0.8)
-        b_axis.setToolEndOffset(0,-0.75,0)
-
-
-        self.machine.base.addChild(x_axis)
-        self.machine.base.addChild(y_axis)
-        x_axis.addChild(z_axis)
-
-        z_axis.addChild(a_axis)
-        a_axis.addChild(b_axis)
-
-        self.machine.x_axis = x_axis
-        self.machine.y_axis = y_axis
-        self.machine.z_axis = z_axis
-        self.machine.a_axis = a_axis
-        self.machine.b_axis = b_axis
+        self.slider = QSlider(Qt.Horizontal, self)
+        self.slider.setGeometry(20, 1040, 1880, 30)
+        self.slider.sliderPressed.connect(self.slider_pressed)
+        self.slider.sliderMoved.connect(self.slider_moved)
+        self.slider.sliderReleased.connect(self.slider_released)
+        self.was_playing = True
+
+        # frame timings, toggled with P
+        self.profileLabel = QLabel(self)
+        self.profileLabel.setGeometry(20, 20, 640, 240)
+        self.profileLabel.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+        self.profileLabel.setStyleSheet('font-family: monospace; background-color: rgba(255, 255, 255, 200);')
+        self.profileLabel.hide()
+        self.profile_label_time = 0.0
+
+        self.progressBar = QProgressBar(self)
+        self.progressBar.setGeometry(20, 1000, 480, 30)
+        self.progressBar.setRange(0, 1000)
+
+        # a saved trajectory brings its machine along and needs no solving
+        self.trajectory_file = None
+        if tool_path_file is not None and tool_path_file.endswith(EXTENSION):
+            self.trajectory_file = TrajectoryFile(tool_path_file)
+            self.machine = self.trajectory_file.buildMachine()
+        else:
+            self.machine = buildDefaultMachine()
+        x_axis = self.machine.x_axis
+        y_axis = self.machine.y_axis
+        z_axis = self.machine.z_axis
+        a_axis = self.machine.a_axis
+        b_axis = self.machine.b_axis
 
         self.machine.buildMachinState()
 
@@ -86,30 +75,248 @@ class Window(QWidget):
         b_axis.setAxisPositionInDeg(0)
 
         self.machine.buildMachinState()
-        self.machine.setToolPath(circle(500, [1.5,2,1]))
-        self.machine.ready = True
 
+        # meshes, the tool path and its solution come from a worker thread, the window shows up right away and
+        # playback starts with the first solved block. once everything is solved the trajectory is cached, so replays
+        # and scrubbing only look up the cached samples
+        self.trajectory = None
+        self.playback = PlaybackScheduler(feed_rate, speed)
+        self.glWidget.scene.machineRenderer.load_meshes = False
+        # with a listen address the axes follow a controller instead, see LiveStream
+        self.receiver = None
+        self.live_arrival = None
+        self.live_points = np.zeros((0, 6))
+        if listen is not None:
+            self.receiver = LiveReceiver(listen, overflow=overflow).start()
+            tool_path_file = None
+            self.slider.hide()
+        elif self.trajectory_file is not None:
+            self.openTrajectoryFile(self.trajectory_file)
+            tool_path_file = None
+        elif tool_path_file is None:
+            tool_path_file = circle(500, [1.5,2,1])
+        self.loader = BackgroundLoader(self.machine, tool_path_file)
+        self.loader.start()
+        self.loadTimer = QTimer()
+        self.loadTimer.timeout.connect(self.load_step)
+        self.loadTimer.start(50)
+
+        # material removal follows the playback if a stock block (x0, y0, z0, x1, y1, z1) [mm] is given
+        self.stockSimulator = None
+        self.max_stock_steps = 5000
+        if stock is not None:
+            voxel_stock = VoxelStock(stock[:3], np.subtract(stock[3:], stock[:3]), resolution)
+            self.stockSimulator = StockSimulator(voxel_stock, tool_radius, cutting_length)
+            self.glWidget.scene.setStock(voxel_stock)
+
+        profiler.instrument(self.machine, 'calculateDesiredState', 'setState', 'buildMachinState', 'setWorldTransforms')
+        profiler.instrument(self.glWidget.scene, 'drawMachine', 'drawToolPath', 'drawTrail')
+
+        # one tick per display refresh, where the machine is comes from the playback clock and not from the tick count
         self.timer = QTimer()
+        self.timer.setTimerType(Qt.PreciseTimer)
         self.timer.timeout.connect(self.timer_step)
-        self.timer.setInterval(1/60)
+        self.timer.setInterval(self.getFrameInterval())
         self.timer.start()
         self.time_step = 0
-
+        self.painted_state_version = -1
+        # last trajectory index whose tool tip is in the executed trail
+        self.trail_index = -1
+
+    def getFrameInterval(self):
+        # ms between frames, never faster than the display refreshes
+        screen = QGuiApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen is not None and screen.refreshRate() > 0 else 60.0
+        return int(math.ceil(1000 / refresh_rate))
+
+    def load_step(self):
+        for event in self.loader.poll():
+            if event[0] == 'progress':
+                self.progressBar.setFormat('{0} %p%'.format(event[1]))
+                self.progressBar.setValue(int(event[2] * 1000))
+            elif event[0] == 'mesh':
+                self.glWidget.update()
+            elif event[0] == 'block':
+                self.addBlock(event[1], event[2])
+            elif event[0] == 'done':
+                self.trajectory = event[1]
+                if self.trajectory is not None:
+                    self.machine.setToolPath(self.trajectory.tool_path)
+            elif event[0] == 'error':
+                print(event[1])
+        if self.loader.done:
+            self.loadTimer.stop()
+            self.progressBar.hide()
+            self.glWidget.update()
+
+    def openTrajectoryFile(self, trajectory_file):
+        # the columns stay memory mapped, playback and seeking only read the samples they show. the file plays at
+        # the feed rate of its timestamps, the drawn tool path is its overview
+        self.playback.feed_rate = trajectory_file.feed_rate
+        self.playback.setSolvedTrajectory(trajectory_file.getToolPath(), trajectory_file.getStates(), trajectory_file.getTimes())
+        self.machine.setToolPath(trajectory_file.getOverview())
+        self.machine.ready = len(trajectory_file) > 0
+        self.slider.setRange(0, max(len(trajectory_file) - 1, 0))
+
+    def saveTrajectory(self, path='trajectory' + EXTENSION):
+        if self.trajectory is None:
+            print('no solved trajectory to save')
+            return
+        saveTrajectory(path, self.machine, self.trajectory.tool_path, self.trajectory.getStates(),
+                       feed_rate=self.playback.feed_rate)
+        print('trajectory written to {0}'.format(path))
+
+    def addBlock(self, tool_path, states):
+        if not self.machine.ready:
+            self.playback.setTrajectory(self.machine, tool_path, states)
+            self.machine.ready = True
+        else:
+            self.playback.extendTrajectory(tool_path, states)
+        # the drawn tool path is rebuilt each time the loaded part doubled, not for every block
+        if len(self.playback.tool_path) >= 2 * len(self.machine.tool_path):
+            self.machine.setToolPath(self.playback.tool_path)
+        self.slider.setRange(0, len(self.playback.states) - 1)
 
     def timer_step(self):
-        if self.machine.ready:
-            self.time_step += 1
-            #self.time_step = 25
-            if self.time_step >= len(self.machine.tool_path):
-                self.time_step = 0
-
-            tool_step = self.machine.tool_path[int(self.time_step)]
-            self.machine.calculateDesiredState(tool_step)
-            self.machine.buildMachinState()
+        with profiler.measure('timer_step'):
+            if self.receiver is not None:
+                self.live_step()
+            elif self.machine.ready:
+                self.time_step = self.playback.getPosition()
+                if self.trajectory is not None:
+                    self.trajectory.applyTo(self.machine, self.time_step)
+                else:
+                    # still loading, the states of the blocks solved so far
+                    self.machine.setState(self.playback.getState())
+                    self.machine.buildMachinState()
+                self.advanceTrail(int(self.time_step))
+                if self.stockSimulator is not None:
+                    self.advanceStock(int(self.time_step))
+                if not self.slider.isSliderDown():
+                    self.slider.blockSignals(True)
+                    self.slider.setValue(int(self.time_step))
+                    self.slider.blockSignals(False)
+            else:
+                pass
+                #print('machine not ready')
+        # an unchanged machine is not repainted, camera moves request their own repaint
+        if self.machine.state_version != self.painted_state_version:
+            self.painted_state_version = self.machine.state_version
+            self.glWidget.update()
+        if self.profileLabel.isVisible() and profiler.last_frame is not None and profiler.last_frame - self.profile_label_time > 0.5:
+            self.profile_label_time = profiler.last_frame
+            self.profileLabel.setText(self.getProfileText())
+
+    def live_step(self):
+        # everything received since the last tick, only the newest sample moves the machine. received tool path
+        # points are drawn as the path, up to the capacity of the receive buffer
+        kinds, values, arrivals = self.receiver.take()
+        if len(kinds) == 0:
+            return
+        points = kinds != STATE
+        states = values[:, :5].copy()
+        if np.any(points):
+            self.live_points = np.concatenate([self.live_points, values[points]])[-self.receiver.buffer.capacity:]
+            self.machine.setToolPath(self.live_points)
+            states[points] = self.machine.calculateDesiredStates(values[points])
+        self.machine.setState(states[-1])
+        self.machine.buildMachinState()
+        # the samples skipped for drawing still belong to the executed path
+        self.glWidget.scene.trailRenderer.append(self.machine.calculateToolTipPathPositions(states))
+        self.live_arrival = arrivals[-1]
+
+    def framePainted(self):
+        # latency from the arrival of the newest live sample until the frame showing it
+        if self.live_arrival is not None:
+            self.receiver.addLatency(self.live_arrival)
+            self.live_arrival = None
+
+    def closeEvent(self, event):
+        if self.receiver is not None and self.receiver.loop is not None:
+            self.receiver.stop()
+            print(self.receiver.getStats())
+        super(Window, self).closeEvent(event)
+
+    def advanceTrail(self, index):
+        # appends the executed tool tips of the samples passed since the last tick, at most a trail capacity of them.
+        # jumping backwards, e.g. when the playback loops, starts a new trail
+        trail = self.glWidget.scene.trailRenderer
+        if index < self.trail_index:
+            trail.clear()
+            self.trail_index = -1
+        if index == self.trail_index:
+            return
+        start = max(self.trail_index + 1, index + 1 - trail.capacity)
+        with profiler.measure('advanceTrail'):
+            trail.append(self.machine.calculateToolTipPathPositions(self.playback.states[start:index + 1]))
+        self.trail_index = index
+
+    def advanceStock(self, index):
+        # cuts up to the playback position, at most max_stock_steps per tick so the GUI stays responsive.
+        # jumping backwards starts over with an uncut stock
+        simulator = self.stockSimulator
+        if index + 1 < simulator.position:
+            simulator.stock.reset()
+            simulator.reset()
+        with profiler.measure('advanceStock'):
+            simulator.advance(self.machine, self.playback.states, min(index + 1, simulator.position + self.max_stock_steps))
+
+    def setProfiling(self, enabled):
+        profiler.setEnabled(enabled)
+        self.profileLabel.setVisible(enabled)
+        self.profileLabel.setText(self.getProfileText())
+
+    def getProfileText(self):
+        return profiler.getText() + '\n' + TrajectoryCache.cache.getText()
+
+    def setPlaying(self, playing):
+        # no ticks at all while paused
+        self.playback.setPlaying(playing)
+        if playing:
+            self.timer.start()
         else:
-            pass
-            #print('machine not ready')
-        self.glWidget.update()
+            self.timer.stop()
+
+    def slider_pressed(self):
+        self.was_playing = self.playback.playing
+        self.setPlaying(False)
+        self.slider_moved(self.slider.value())
+
+    def slider_moved(self, value):
+        self.playback.seek(value)
+        self.timer_step()
+
+    def slider_released(self):
+        self.playback.seek(self.slider.value())
+        self.setPlaying(self.was_playing)
+
+    def keyPressEvent(self, event):
+        # space pauses, + and - double or halve the playback speed, P shows the frame timings, D writes them to files
+        # and C runs cProfile over the next 300 frames, T shows or hides the executed tool tip trail and S saves the
+        # solved trajectory
+        if event.key() == Qt.Key_Space:
+            self.setPlaying(not self.playback.playing)
+        elif event.key() == Qt.Key_Plus:
+            self.playback.setSpeed(self.playback.speed * 2)
+        elif event.key() == Qt.Key_Minus:
+            self.playback.setSpeed(self.playback.speed / 2)
+        elif event.key() == Qt.Key_P:
+            self.setProfiling(not profiler.enabled)
+        elif event.key() == Qt.Key_D:
+            profiler.dump('frame_profile.json')
+            profiler.dump('frame_profile.csv')
+            print('frame timings written to frame_profile.json and frame_profile.csv')
+        elif event.key() == Qt.Key_C:
+            profiler.profileFrames(300, 'frame_profile.prof')
+            self.glWidget.update()
+        elif event.key() == Qt.Key_S:
+            self.saveTrajectory()
+        elif event.key() == Qt.Key_T:
+            trail = self.glWidget.scene.trailRenderer
+            trail.visible = not trail.visible
+            self.glWidget.update()
+        else:
+            super(Window, self).keyPressEvent(event)
 
 
 
@@ -133,6 +340,8 @@ class GLWidget(QOpenGLWidget):
 
         self.lastPos = QPoint()
 
+        self.scene = SceneRenderer()
+
     def getOpenglInfo(self):
         info = """
             Vendor: {0}
@@ -158,62 +367,51 @@ class GLWidget(QOpenGLWidget):
         angle = self.normalizeAngle(angle)
         if angle != self.xRot:
             self.xRot = angle
+            self.update()
 
     def setYRotation(self, angle):
         angle = self.normalizeAngle(angle)
         if angle != self.yRot:
             self.yRot = angle
+            self.update()
 
     def setZRotation(self, angle):
         angle = self.normalizeAngle(angle)
         if angle != self.zRot:
             self.zRot = angle
+            self.update()
 
     def setXPosition(self, pos):
         if pos != self.xPos:
             self.xPos = pos
+            self.update()
 
     def setYPosition(self, pos):
         if pos != self.yPos:
             self.yPos = pos
+            self.update()
 
     def setZPosition(self, pos):
         if pos != self.zPos:
             self.zPos = pos
+            self.update()
 
     def initializeGL(self):
         print(self.getOpenglInfo())
-        self.setClearColor(QColor(255,255,255))
-        self.axisIndicator = self.makeAxisIndicator(0.75, label=True)
-        self.baseGrid = self.makeBaseGrid(10, coarse_spacing=1, fine_spacing=0.1)
-
-        gl.glShadeModel(gl.GL_SMOOTH)
-        gl.glEnable(gl.GL_DEPTH_TEST)
-        gl.glEnable(gl.GL_CULL_FACE)
-        gl.glEnable(gl.GL_MULTISAMPLE)
-        #gl.glCullFace(gl.GL_FRONT)
+        self.scene.initializeGL()
 
     def paintGL(self):
-        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
-        gl.glLoadIdentity()
-        gl.glTranslated(self.xPos, self.yPos-2.0, self.zPos-12.5)
-        gl.glRotated(self.xRot / 16.0, 1.0, 0.0, 0.0)
-        gl.glRotated(self.yRot / 16.0, 0.0, 1.0, 0.0)
-        gl.glRotated(self.zRot / 16.0, 0.0, 0.0, 1.0)
-        gl.glCallList(self.baseGrid)
-        gl.glCallList(self.axisIndicator)
-        self.drawMachine(self.parent().machine)
-        self.drawToolPath(self.parent().machine.tool_path)
+        # measures the python and GL call time of the frame, the GPU works on it asynchronously
+        with profiler.measure('paintGL'):
+            self.scene.paint(self.parent().machine, (self.xRot / 16.0, self.yRot / 16.0, self.zRot / 16.0),
+                             (self.xPos, self.yPos, self.zPos))
+        self.parent().framePainted()
+        profiler.frameDone()
+        if profiler.isProfiling():
+            self.update()
 
     def resizeGL(self, width, height):
-        side = min(width, height)
-        if side < 0:
-            return
-        gl.glViewport((width) // 2, (height - side) // 2, side, side)
-        gl.glMatrixMode(gl.GL_PROJECTION)
-        gl.glLoadIdentity()
-        glu.gluPerspective(45.0, (1920/1080), 0.0001, 10000.0)
-        gl.glMatrixMode(gl.GL_MODELVIEW)
+        self.scene.resize(width, height)
 
     def mousePressEvent(self, event):
         self.lastPos = event.pos()
@@ -231,154 +429,6 @@ class GLWidget(QOpenGLWidget):
             self.setYPosition(self.yPos - 0.003 * dy)
         self.lastPos = event.pos()
 
-    def makeAxisIndicator(self, size=1.0, label=False):
-        genList = gl.glGenLists(1)
-        gl.glNewList(genList, gl.GL_COMPILE)
-
-        gl.glLineWidth(3.0)
-
-        gl.glBegin(gl.GL_LINES)
-
-        # draw base x-axis lines
-        self.setColor(QColor(255, 0, 0))
-        gl.glVertex3d(0, 0, 0)
-        gl.glVertex3d(size, 0, 0)
-        # draw 'X'
-        gl.glVertex3d(1.05 * size, 0.1 * size, 0)
-        gl.glVertex3d(1.2 * size, -0.1 * size, 0)
-        gl.glVertex3d(1.05 * size, -0.1 * size, 0)
-        gl.glVertex3d(1.2 * size, 0.1 * size, 0)
-
-        # draw base y_axis-lines
-        self.setColor(QColor(0, 255, 0))
-        gl.glVertex3d(0, 0, 0)
-        gl.glVertex3d(0, size, 0)
-        # draw 'Y'
-        gl.glVertex3d(0.075 * size, 1.3 * size, 0)
-        gl.glVertex3d(0, 1.15 * size, 0)
-        gl.glVertex3d(-0.075 * size, 1.3 * size, 0)
-        gl.glVertex3d(0, 1.15 * size, 0)
-        gl.glVertex3d(0, 1.05 * size, 0)
-        gl.glVertex3d(0, 1.15 * size, 0)
-
-        # draw base z_axis-lines
-        self.setColor(QColor(0, 0, 255))
-        gl.glVertex3d(0, 0, 0)
-        gl.glVertex3d(0, 0, size)
-        # draw 'Z'
-        gl.glVertex3d(-0.075*size, 0.1*size, 1.05*size)
-        gl.glVertex3d(0.075*size, 0.1*size, 1.05*size)
-        gl.glVertex3d(-0.075 * size, -0.1 * size, 1.05 * size)
-        gl.glVertex3d(0.075 * size, -0.1 * size, 1.05 * size)
-        gl.glVertex3d(0.075 * size, 0.1 * size, 1.05 * size)
-        gl.glVertex3d(-0.075 * size, -0.1 * size, 1.05 * size)
-
-        gl.glEnd()
-        gl.glLineWidth(1.0)
-        gl.glEndList()
-        return genList
-
-    def makeBaseGrid(self, size, coarse_spacing=10.0, fine_spacing=1.0):
-        genList = gl.glGenLists(1)
-        gl.glNewList(genList, gl.GL_COMPILE)
-        gl.glBegin(gl.GL_LINES)
-
-        self.setColor(QColor(150, 150, 150))
-        # draw base x-axis lines
-        gl.glVertex3d(-size//2, 0, 0)
-        gl.glVertex3d(size//2, 0, 0)
-        # draw base z_axis-lines
-        gl.glVertex3d(0, 0, size//2)
-        gl.glVertex3d(0, 0, -size//2)
-
-        for i in range(int((size/2)/coarse_spacing)):
-            # draw coarse x-axis lines
-            gl.glVertex3d(-size//2, 0, (i+1)*coarse_spacing)
-            gl.glVertex3d(size//2, 0, (i+1)*coarse_spacing)
-            gl.glVertex3d(-size//2, 0, -(i + 1) * coarse_spacing)
-            gl.glVertex3d(size//2, 0, -(i + 1) * coarse_spacing)
-            # draw coarse z-axis lines
-            gl.glVertex3d((i + 1) * coarse_spacing,0,-size//2)
-            gl.glVertex3d((i + 1) * coarse_spacing,0,size//2)
-            gl.glVertex3d(-(i + 1) * coarse_spacing,0,-size//2)
-            gl.glVertex3d(-(i + 1) * coarse_spacing,0,size//2)
-
-        self.setColor(QColor(225, 225, 225))
-        for i in range(int((size/2)/fine_spacing)):
-            # draw coarse x-axis lines
-            gl.glVertex3d(-size//2, 0, (i+1)*fine_spacing)
-            gl.glVertex3d(size//2, 0, (i+1)*fine_spacing)
-            gl.glVertex3d(-size//2, 0, -(i + 1) * fine_spacing)
-            gl.glVertex3d(size//2, 0, -(i + 1) * fine_spacing)
-            # draw coarse z-axis lines
-            gl.glVertex3d((i + 1) * fine_spacing,0,-size//2)
-            gl.glVertex3d((i + 1) * fine_spacing,0,size//2)
-            gl.glVertex3d(-(i + 1) * fine_spacing,0,-size//2)
-            gl.glVertex3d(-(i + 1) * fine_spacing,0,size//2)
-
-        gl.glEnd()
-        gl.glEndList()
-        return genList
-
-    def drawToolPath(self, tool_path):
-        gl.glPushMatrix()
-        offset = np.multiply(self.parent().machine.y_axis.axis_position, self.parent().machine.y_axis.linear_movement)
-        gl.glTranslatef(offset[0], offset[1], offset[2])
-
-        gl.glBegin(gl.GL_LINES)
-        self.setColor(QColor(0, 0, 255))
-        #print('drawing toolpath of length:', len(tool_path))
-        for i in range(len(tool_path)-1):
-            #draw tool path
-            gl.glVertex3d(tool_path[i][0]/1000, tool_path[i][2]/1000, tool_path[i][1]/1000)
-            gl.glVertex3d(tool_path[i+1][0]/1000, tool_path[i+1][2]/1000, tool_path[i+1][1]/1000)
-
-        self.setColor(QColor(255, 0, 0))
-        for i in range(len(tool_path)):
-            #draw tool normal
-            gl.glVertex3d(tool_path[i][0] / 1000, tool_path[i][2] / 1000, tool_path[i][1] / 1000)
-            gl.glVertex3d(tool_path[i][0+3]+tool_path[i][0] / 1000, tool_path[i][2+3]+tool_path[i][2] / 1000, tool_path[i][1+3]+tool_path[i][1] / 1000)
-
-        gl.glEnd()
-
-        gl.glPopMatrix()
-
-    def drawMachine(self, machine):
-        gl.glPushMatrix()
-
-
-        self.drawAxis(machine.base, 0)
-
-
-        gl.glPopMatrix()
-
-    def drawAxis(self, axis, recursion_level):
-        #print('recursion_level:', recursion_level)
-        #print('drawing', axis.name)
-
-        position = np.add(axis.relative_translation, np.multiply(axis.axis_position, axis.linear_movement))
-        gl.glTranslatef(position[0], position[1], position[2])
-
-        #rotation = np.add(axis.relative_rotation, np.multiply(axis.axis_position, axis.rotational_movement))
-        gl.glRotatef(axis.axis_position, axis.rotational_movement[0], axis.rotational_movement[1], axis.rotational_movement[2])
-
-        gl.glBegin(gl.GL_QUADS)
-        self.setColor(axis.color)
-        for vertex in axis.getVertices():
-            gl.glVertex3f(vertex[0], vertex[1], vertex[2])
-        gl.glEnd()
-
-        for child in axis.children:
-            recursion_level += 1
-            self.drawAxis(child, recursion_level)
-            recursion_level -= 1
-
-        gl.glTranslatef(-position[0], -position[1], -position[2])
-        gl.glRotatef(axis.axis_position, -axis.rotational_movement[0], -axis.rotational_movement[1] ,-axis.rotational_movement[2])
-
-
-
-
     def normalizeAngle(self, angle):
         while angle < 0:
             angle += 360 * 16
@@ -386,11 +436,6 @@ class GLWidget(QOpenGLWidget):
             angle -= 360 * 16
         return angle
 
-    def setClearColor(self, c):
-        gl.glClearColor(c.redF(), c.greenF(), c.blueF(), c.alphaF())
-
-    def setColor(self, c):
-        gl.glColor4f(c.redF(), c.greenF(), c.blueF(), c.alphaF())
 
 
 
@@ -400,7 +445,32 @@ class GLWidget(QOpenGLWidget):
 
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    window = Window()
+    parser = argparse.ArgumentParser(description='5-axis simulator')
+    parser.add_argument('tool_path', nargs='?', default=None,
+                        help='tool path file or solved .traj trajectory, a demo circle if omitted')
+    parser.add_argument('--feed-rate', type=float, default=5000.0, help='mm/min along the tool path')
+    parser.add_argument('--speed', type=float, default=1.0, help='playback speed multiplier')
+    parser.add_argument('--profile', action='store_true', help='show the frame timing overlay from the start')
+    parser.add_argument('--profile-frames', type=int, default=0, help='run cProfile over the first N frames')
+    parser.add_argument('--stock', type=float, nargs=6, default=None, metavar=('X0', 'Y0', 'Z0', 'X1', 'Y1', 'Z1'),
+                        help='simulate material removal from this block [mm, tool path coordinates]')
+    parser.add_argument('--tool-radius', type=float, default=3.0, help='ball end mill radius [mm]')
+    parser.add_argument('--cutting-length', type=float, default=20.0, help='cutting length from the tool end [mm]')
+    parser.add_argument('--resolution', type=float, default=0.5, help='voxel edge of the stock [mm]')
+    parser.add_argument('--listen', default=None, help="follow a controller streaming to 'tcp:host:port' or 'unix:/path'")
+    parser.add_argument('--overflow', choices=['drop', 'block'], default='drop',
+                        help='drop the oldest samples or slow the controller down when the GUI falls behind')
+    parser.add_argument('--cache-dir', default=None,
+                        help='solved trajectory blocks evicted from memory are kept in this directory')
+    args, qt_args = parser.parse_known_args()
+    TrajectoryCache.cache.spill_dir = args.cache_dir
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = Window(args.tool_path, args.feed_rate, args.speed, args.stock, args.tool_radius, args.cutting_length,
+                    args.resolution, args.listen, args.overflow)
+    if args.profile:
+        window.setProfiling(True)
+    if args.profile_frames:
+        profiler.profileFrames(args.profile_frames, 'frame_profile.prof')
     window.show()
     sys.exit(app.exec_())
\ No newline at end of file
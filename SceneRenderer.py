@@ -0,0 +1,187 @@
+import OpenGL.GL as gl
+import OpenGL.GLU as glu
+
+from MachineRenderer import MachineRenderer
+from StockRenderer import StockRenderer
+from ToolPathRenderer import ToolPathRenderer
+from TrailRenderer import TrailRenderer
+
+
+class SceneRenderer:
+    # everything GLWidget draws, without Qt, so it also runs in offscreen contexts
+
+    def __init__(self):
+        self.machineRenderer = MachineRenderer()
+        self.toolPathRenderer = ToolPathRenderer()
+        # executed tool tip positions, empty unless something appends to it
+        self.trailRenderer = TrailRenderer()
+        # set by setStock when material removal is simulated
+        self.stockRenderer = None
+        self.axisIndicator = None
+        self.baseGrid = None
+
+    def initializeGL(self):
+        self.setClearColor(255, 255, 255)
+        self.axisIndicator = self.makeAxisIndicator(0.75, label=True)
+        self.baseGrid = self.makeBaseGrid(10, coarse_spacing=1, fine_spacing=0.1)
+        self.machineRenderer.initializeGL()
+
+        gl.glShadeModel(gl.GL_SMOOTH)
+        gl.glEnable(gl.GL_DEPTH_TEST)
+        gl.glEnable(gl.GL_CULL_FACE)
+        gl.glEnable(gl.GL_MULTISAMPLE)
+        #gl.glCullFace(gl.GL_FRONT)
+
+    def paint(self, machine, rotation=(20.0, -45.0, 0.0), position=(0.0, 0.0, 0.0)):
+        # rotation [deg] and position of the camera like the mouse controls of GLWidget
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+        gl.glLoadIdentity()
+        gl.glTranslated(position[0], position[1]-2.0, position[2]-12.5)
+        gl.glRotated(rotation[0], 1.0, 0.0, 0.0)
+        gl.glRotated(rotation[1], 0.0, 1.0, 0.0)
+        gl.glRotated(rotation[2], 0.0, 0.0, 1.0)
+        gl.glCallList(self.baseGrid)
+        gl.glCallList(self.axisIndicator)
+        self.drawMachine(machine)
+        self.drawToolPath(machine)
+        self.drawTrail(machine)
+        if self.stockRenderer is not None:
+            self.drawStock(machine)
+
+    def resize(self, width, height, fill=False):
+        # fill uses the whole surface with its aspect ratio, e.g. for rendered videos, GLWidget keeps its square viewport
+        side = min(width, height)
+        if side < 0:
+            return
+        if fill:
+            gl.glViewport(0, 0, width, height)
+        else:
+            gl.glViewport((width) // 2, (height - side) // 2, side, side)
+        gl.glMatrixMode(gl.GL_PROJECTION)
+        gl.glLoadIdentity()
+        glu.gluPerspective(45.0, (width / height) if fill else (1920/1080), 0.0001, 10000.0)
+        gl.glMatrixMode(gl.GL_MODELVIEW)
+
+    def makeAxisIndicator(self, size=1.0, label=False):
+        genList = gl.glGenLists(1)
+        gl.glNewList(genList, gl.GL_COMPILE)
+
+        gl.glLineWidth(3.0)
+
+        gl.glBegin(gl.GL_LINES)
+
+        # draw base x-axis lines
+        self.setColor(255, 0, 0)
+        gl.glVertex3d(0, 0, 0)
+        gl.glVertex3d(size, 0, 0)
+        # draw 'X'
+        gl.glVertex3d(1.05 * size, 0.1 * size, 0)
+        gl.glVertex3d(1.2 * size, -0.1 * size, 0)
+        gl.glVertex3d(1.05 * size, -0.1 * size, 0)
+        gl.glVertex3d(1.2 * size, 0.1 * size, 0)
+
+        # draw base y_axis-lines
+        self.setColor(0, 255, 0)
+        gl.glVertex3d(0, 0, 0)
+        gl.glVertex3d(0, size, 0)
+        # draw 'Y'
+        gl.glVertex3d(0.075 * size, 1.3 * size, 0)
+        gl.glVertex3d(0, 1.15 * size, 0)
+        gl.glVertex3d(-0.075 * size, 1.3 * size, 0)
+        gl.glVertex3d(0, 1.15 * size, 0)
+        gl.glVertex3d(0, 1.05 * size, 0)
+        gl.glVertex3d(0, 1.15 * size, 0)
+
+        # draw base z_axis-lines
+        self.setColor(0, 0, 255)
+        gl.glVertex3d(0, 0, 0)
+        gl.glVertex3d(0, 0, size)
+        # draw 'Z'
+        gl.glVertex3d(-0.075*size, 0.1*size, 1.05*size)
+        gl.glVertex3d(0.075*size, 0.1*size, 1.05*size)
+        gl.glVertex3d(-0.075 * size, -0.1 * size, 1.05 * size)
+        gl.glVertex3d(0.075 * size, -0.1 * size, 1.05 * size)
+        gl.glVertex3d(0.075 * size, 0.1 * size, 1.05 * size)
+        gl.glVertex3d(-0.075 * size, -0.1 * size, 1.05 * size)
+
+        gl.glEnd()
+        gl.glLineWidth(1.0)
+        gl.glEndList()
+        return genList
+
+    def makeBaseGrid(self, size, coarse_spacing=10.0, fine_spacing=1.0):
+        genList = gl.glGenLists(1)
+        gl.glNewList(genList, gl.GL_COMPILE)
+        gl.glBegin(gl.GL_LINES)
+
+        self.setColor(150, 150, 150)
+        # draw base x-axis lines
+        gl.glVertex3d(-size//2, 0, 0)
+        gl.glVertex3d(size//2, 0, 0)
+        # draw base z_axis-lines
+        gl.glVertex3d(0, 0, size//2)
+        gl.glVertex3d(0, 0, -size//2)
+
+        for i in range(int((size/2)/coarse_spacing)):
+            # draw coarse x-axis lines
+            gl.glVertex3d(-size//2, 0, (i+1)*coarse_spacing)
+            gl.glVertex3d(size//2, 0, (i+1)*coarse_spacing)
+            gl.glVertex3d(-size//2, 0, -(i + 1) * coarse_spacing)
+            gl.glVertex3d(size//2, 0, -(i + 1) * coarse_spacing)
+            # draw coarse z-axis lines
+            gl.glVertex3d((i + 1) * coarse_spacing,0,-size//2)
+            gl.glVertex3d((i + 1) * coarse_spacing,0,size//2)
+            gl.glVertex3d(-(i + 1) * coarse_spacing,0,-size//2)
+            gl.glVertex3d(-(i + 1) * coarse_spacing,0,size//2)
+
+        self.setColor(225, 225, 225)
+        for i in range(int((size/2)/fine_spacing)):
+            # draw coarse x-axis lines
+            gl.glVertex3d(-size//2, 0, (i+1)*fine_spacing)
+            gl.glVertex3d(size//2, 0, (i+1)*fine_spacing)
+            gl.glVertex3d(-size//2, 0, -(i + 1) * fine_spacing)
+            gl.glVertex3d(size//2, 0, -(i + 1) * fine_spacing)
+            # draw coarse z-axis lines
+            gl.glVertex3d((i + 1) * fine_spacing,0,-size//2)
+            gl.glVertex3d((i + 1) * fine_spacing,0,size//2)
+            gl.glVertex3d(-(i + 1) * fine_spacing,0,-size//2)
+            gl.glVertex3d(-(i + 1) * fine_spacing,0,size//2)
+
+        gl.glEnd()
+        gl.glEndList()
+        return genList
+
+    def drawToolPath(self, machine):
+        self.toolPathRenderer.drawToolPath(machine)
+
+    def drawTrail(self, machine):
+        self.trailRenderer.drawTrail(machine)
+
+    def drawMachine(self, machine):
+        self.machineRenderer.drawMachine(machine)
+
+    def drawStock(self, machine):
+        self.stockRenderer.drawStock(machine)
+
+    def setStock(self, stock):
+        # a StockSimulation.VoxelStock, its buffers are created with the next frame
+        if self.stockRenderer is not None:
+            self.stockRenderer.cleanup()
+        self.stockRenderer = None if stock is None else StockRenderer(stock)
+
+    def setClearColor(self, r, g, b):
+        gl.glClearColor(r / 255, g / 255, b / 255, 1.0)
+
+    def setColor(self, r, g, b):
+        gl.glColor4f(r / 255, g / 255, b / 255, 1.0)
+
+    def cleanup(self):
+        self.machineRenderer.cleanup()
+        self.trailRenderer.cleanup()
+        if self.stockRenderer is not None:
+            self.stockRenderer.cleanup()
+        if self.baseGrid is not None:
+            gl.glDeleteLists(self.baseGrid, 1)
+            gl.glDeleteLists(self.axisIndicator, 1)
+            self.baseGrid = None
+            self.axisIndicator = None
@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+import argparse
+import struct
+
+import numpy as np
+
+from Machine import buildDefaultMachine, loadMachine
+from ToolPathReader import readToolPath, ReadStats
+from TrajectoryFile import TrajectoryWriter
+
+# headless batch simulation, must not import PyQt5 or OpenGL
+
+
+def simulateChunk(machine, tool_path):
+    # inverse kinematics for the axes, forward kinematics for where the tool actually ends up
+    states = machine.calculateDesiredStates(tool_path)
+    tool_tips = machine.calculateToolTipPathPositions(states)
+    return states, tool_tips
+
+
+class NpyTrajectoryWriter:
+    # axes.npy (N, 5) and tool_tip.npy (N, 3), appended chunk by chunk, the shape in the header is patched on close
+
+    HEADER_LENGTH = 128
+
+    def __init__(self, out_dir):
+        self.files = [open(os.path.join(out_dir, name), 'wb') for name in ('axes.npy', 'tool_tip.npy')]
+        self.columns = (5, 3)
+        self.rows = 0
+        self.writeHeaders()
+
+    def writeHeaders(self):
+        for f, columns in zip(self.files, self.columns):
+            header = "{{'descr': '<f8', 'fortran_order': False, 'shape': ({0}, {1}), }}".format(self.rows, columns)
+            header = header.ljust(self.HEADER_LENGTH - 11) + '\n'
+            f.seek(0)
+            f.write(b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1'))
+
+    def write(self, tool_path, states, tool_tips):
+        for f, array in zip(self.files, (states, tool_tips)):
+            f.write(np.ascontiguousarray(array, dtype='<f8').tobytes())
+        self.rows += len(states)
+
+    def close(self):
+        self.writeHeaders()
+        for f in self.files:
+            f.close()
+
+
+class CsvTrajectoryWriter:
+    # trajectory.csv, appended chunk by chunk without knowing the length in advance
+
+    def __init__(self, out_dir):
+        self.file = open(os.path.join(out_dir, 'trajectory.csv'), 'w')
+        self.file.write('x,y,z,a,b,tool_tip_x,tool_tip_y,tool_tip_z\n')
+
+    def write(self, tool_path, states, tool_tips):
+        np.savetxt(self.file, np.hstack([states, tool_tips]), delimiter=',', fmt='%.6f')
+
+    def close(self):
+        self.file.close()
+
+
+def simulate(machine, tool_path_file, out_dir, chunk_size=100000, output_format='npy', workers=1, stats=None,
+             feed_rate=5000.0, dtype='<f8', delta=False):
+    # feed_rate, dtype and delta only apply to the traj format, see TrajectoryFile
+    os.makedirs(out_dir, exist_ok=True)
+    if output_format == 'npy':
+        writer = NpyTrajectoryWriter(out_dir)
+    elif output_format == 'traj':
+        writer = TrajectoryWriter(os.path.join(out_dir, 'trajectory.traj'), machine, feed_rate, dtype, delta)
+    else:
+        writer = CsvTrajectoryWriter(out_dir)
+
+    solver = None
+    block_size = chunk_size
+    if workers > 1:
+        from ParallelKinematics import ParallelSolver
+        # every block is split into chunk_size tasks for the pool
+        block_size = chunk_size * workers
+        solver = ParallelSolver(machine, workers, block_size, chunk_size)
+
+    steps = 0
+    max_deviation = 0.0
+    for tool_path in readToolPath(tool_path_file, block_size, stats):
+        if solver is None:
+            states, tool_tips = simulateChunk(machine, tool_path)
+        else:
+            states, tool_tips = solver.solve(tool_path)
+        writer.write(tool_path, states, tool_tips)
+        if len(tool_path) > 0:
+            deviation = np.sqrt(np.sum(np.square(tool_tips - tool_path[:, :3]), axis=1))
+            max_deviation = max(max_deviation, float(deviation.max()))
+        steps += len(tool_path)
+    writer.close()
+    if solver is not None:
+        solver.close()
+    return steps, max_deviation
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='solves a tool path for a machine without a GUI')
+    parser.add_argument('tool_path', help='G-code (.nc, .ngc, .gcode, .tap), (N, 6) .npy/.bin array, or .csv/.txt with x y z nx ny nz per line')
+    parser.add_argument('--machine', default=None, help='json machine definition, the demo machine if omitted')
+    parser.add_argument('--out-dir', default='simulation_output')
+    parser.add_argument('--format', choices=['npy', 'csv', 'traj'], default='npy',
+                        help='traj writes one memory mappable trajectory.traj, see TrajectoryFile.py')
+    parser.add_argument('--feed-rate', type=float, default=5000.0, help='mm/min for the timestamps of the traj format')
+    parser.add_argument('--dtype', choices=['float64', 'float32'], default='float64', help='traj column precision')
+    parser.add_argument('--delta', action='store_true', help='delta encode the traj columns against their block start')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=1, help='processes solving chunks in parallel')
+    args = parser.parse_args(argv)
+
+    machine = buildDefaultMachine() if args.machine is None else loadMachine(args.machine)
+
+    stats = ReadStats()
+    start = time.perf_counter()
+    steps, max_deviation = simulate(machine, args.tool_path, args.out_dir, args.chunk_size, args.format, args.workers, stats,
+                                    args.feed_rate, args.dtype, args.delta)
+    duration = time.perf_counter() - start
+
+    print('{0} steps in {1:.3f} s ({2:.0f} steps/s)'.format(steps, duration, steps / max(duration, 1e-9)))
+    print('reading: {0}'.format(stats))
+    print('max tool tip deviation from tool path: {0:.6f} mm'.format(max_deviation))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import numpy as np
+import OpenGL.GL as gl
+
+# direction of the light shading the stock surface, in tool path coordinates
+LIGHT = np.array([0.3, -0.4, 0.85]) / np.sqrt(0.3 ** 2 + 0.4 ** 2 + 0.85 ** 2)
+STOCK_COLOR = np.array([0.8, 0.72, 0.55])
+
+
+class StockRenderer:
+    # top surface of a StockSimulation.VoxelStock as a height field with one vertex per voxel column.
+    # only the columns cut since the last frame are recomputed and uploaded with glBufferSubData
+
+    def __init__(self, stock):
+        self.stock = stock
+        self.vbo = None
+        self.color_vbo = None
+        self.ibo = None
+        self.index_count = 0
+        self.heights = None
+
+    def initializeGL(self):
+        nx, ny = self.stock.shape[:2]
+        self.heights = self.stock.getHeights()
+        self.stock.takeDirtyBox()
+
+        positions, colors = self.getRows(0, nx)
+        self.vbo, self.color_vbo = gl.glGenBuffers(2)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, positions.nbytes, positions, gl.GL_DYNAMIC_DRAW)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.color_vbo)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, colors.nbytes, colors, gl.GL_DYNAMIC_DRAW)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+        # two triangles per cell between four neighbouring columns
+        corners = (np.arange(nx - 1)[:, None] * ny + np.arange(ny - 1)[None, :]).ravel()
+        indices = np.stack([corners, corners + ny, corners + ny + 1, corners, corners + ny + 1, corners + 1], axis=1)
+        indices = np.ascontiguousarray(indices, dtype=np.uint32).ravel()
+        self.index_count = len(indices)
+        self.ibo = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, gl.GL_STATIC_DRAW)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def getRows(self, x0, x1):
+        # vertex positions in GL coordinates and shaded colors of the columns in rows x0 to x1
+        stock = self.stock
+        ny = stock.shape[1]
+        rows = np.arange(x0, x1)
+        heights = self.heights[x0:x1]
+        positions = np.empty((x1 - x0, ny, 3), dtype=np.float32)
+        # tool path is in mm with z up, GL uses meters with y up
+        positions[:, :, 0] = (stock.origin[0] + (rows[:, None] + 0.5) * stock.resolution) / 1000
+        positions[:, :, 1] = heights / 1000
+        positions[:, :, 2] = (stock.origin[1] + (np.arange(ny)[None, :] + 0.5) * stock.resolution) / 1000
+
+        # normals from the height differences to the neighbouring columns
+        before = self.heights[np.maximum(rows - 1, 0)]
+        after = self.heights[np.minimum(rows + 1, len(self.heights) - 1)]
+        slope_x = (after - before) / (2 * stock.resolution)
+        slope_y = np.gradient(heights, stock.resolution, axis=1) if ny > 1 else np.zeros_like(heights)
+        normals = np.stack([-slope_x, -slope_y, np.ones_like(heights)], axis=-1)
+        normals /= np.sqrt(np.sum(np.square(normals), axis=-1))[:, :, None]
+        brightness = 0.35 + 0.65 * np.maximum(np.dot(normals, LIGHT), 0.0)
+        colors = np.ascontiguousarray(brightness[:, :, None] * STOCK_COLOR, dtype=np.float32)
+        return positions, colors
+
+    def update(self):
+        # uploads the rows around the columns cut since the last update
+        box = self.stock.takeDirtyBox()
+        if box is None:
+            return
+        nx, ny = self.stock.shape[:2]
+        x0, x1, y0, y1 = box
+        self.heights[x0:x1, y0:y1] = self.stock.getHeights(x0, x1, y0, y1)
+        # the normals of the rows next to the cut changed as well
+        x0 = max(x0 - 1, 0)
+        x1 = min(x1 + 1, nx)
+        positions, colors = self.getRows(x0, x1)
+        row_bytes = ny * 3 * 4
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        gl.glBufferSubData(gl.GL_ARRAY_BUFFER, x0 * row_bytes, positions.nbytes, positions)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.color_vbo)
+        gl.glBufferSubData(gl.GL_ARRAY_BUFFER, x0 * row_bytes, colors.nbytes, colors)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+    def drawStock(self, machine):
+        if self.vbo is None:
+            self.initializeGL()
+        self.update()
+
+        gl.glPushMatrix()
+        # the stock is clamped to the table, which moves with the y-axis
+        offset = np.multiply(machine.y_axis.axis_position, machine.y_axis.linear_movement)
+        gl.glTranslatef(offset[0], offset[1], offset[2])
+        # the surface is seen from below through cut through areas
+        gl.glDisable(gl.GL_CULL_FACE)
+
+        gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glEnableClientState(gl.GL_COLOR_ARRAY)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        gl.glVertexPointer(3, gl.GL_FLOAT, 0, None)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.color_vbo)
+        gl.glColorPointer(3, gl.GL_FLOAT, 0, None)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+        gl.glDrawElements(gl.GL_TRIANGLES, self.index_count, gl.GL_UNSIGNED_INT, None)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glDisableClientState(gl.GL_COLOR_ARRAY)
+        gl.glDisableClientState(gl.GL_VERTEX_ARRAY)
+
+        gl.glEnable(gl.GL_CULL_FACE)
+        gl.glPopMatrix()
+
+    def cleanup(self):
+        if self.vbo is not None:
+            gl.glDeleteBuffers(3, [self.vbo, self.color_vbo, self.ibo])
+            self.vbo = None
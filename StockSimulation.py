@@ -0,0 +1,276 @@
+import sys
+import math
+import time
+import argparse
+
+import numpy as np
+
+# material removal: a stock block as a bit packed voxel grid in tool path coordinates [mm], the volume swept by a
+# ball end mill along the solved trajectory is cleared batch by batch
+
+# set bits per byte value
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def sphereStencil(radius, hollow=False):
+    # integer voxel offsets within radius [voxels] of the center voxel, (S, 3). hollow keeps only the offsets
+    # further than radius - sqrt(3) from the center, the voxels a sphere moved by at most one voxel per axis can reach.
+    # spheres up to sqrt(3) voxels have no inner part the previous sphere surely cleared, they stay full
+    reach = int(math.ceil(radius))
+    grid = np.arange(-reach, reach + 1)
+    offsets = np.stack(np.meshgrid(grid, grid, grid, indexing='ij'), axis=-1).reshape(-1, 3)
+    distance = np.sum(np.square(offsets), axis=1)
+    inside = distance <= radius * radius
+    if hollow and radius > math.sqrt(3):
+        inside &= distance > (radius - math.sqrt(3)) ** 2
+    return offsets[inside]
+
+
+class VoxelStock:
+    # one bit per voxel, packed along z so the memory is nx * ny * nz / 8 bytes
+
+    def __init__(self, origin, size, resolution=0.5):
+        # origin: lowest corner [mm], size: extent of the block [mm], resolution: voxel edge [mm]
+        self.origin = np.asarray(origin, dtype=float)
+        self.resolution = float(resolution)
+        self.shape = tuple(int(math.ceil(s / self.resolution)) for s in size)
+        self.bits = None
+        self.reset()
+
+    def reset(self):
+        nx, ny, nz = self.shape
+        self.bits = np.full((nx, ny, (nz + 7) // 8), 0xFF, dtype=np.uint8)
+        if nz % 8:
+            # the padding bits of the last byte are never material
+            self.bits[:, :, -1] = np.packbits(np.arange(8) < nz % 8)[0]
+        self.removed = 0
+        self.version = 0
+        self.dirty_box = (0, nx, 0, ny)
+
+    def getVoxelCount(self):
+        return int(np.sum(POPCOUNT[self.bits], dtype=np.int64))
+
+    def getVolume(self):
+        # remaining material [mm^3]
+        return self.getVoxelCount() * self.resolution ** 3
+
+    def getMemory(self):
+        return self.bits.nbytes
+
+    def toVoxels(self, points):
+        # voxel indices containing points [mm]
+        return np.floor((np.asarray(points, dtype=float) - self.origin) / self.resolution).astype(np.int64)
+
+    def removeSpheres(self, centers, radius, hollow=False, max_indices=1 << 22):
+        # clears every voxel whose center is within radius [mm] of one of the (M, 3) centers [mm], see sphereStencil
+        # for hollow. returns the number of removed voxels
+        stencil = sphereStencil(radius / self.resolution, hollow)
+        reach = int(math.ceil(radius / self.resolution))
+        shape = np.array(self.shape)
+        voxels = self.toVoxels(centers)
+        voxels = voxels[np.all((voxels >= -reach) & (voxels < shape + reach), axis=1)]
+        if len(voxels) == 0:
+            return 0
+        # neighbouring tool poses mostly fall into the same voxels, unique on one key per voxel is a lot cheaper
+        # than on rows
+        key_shape = shape + 2 * reach
+        keys = np.unique(np.ravel_multi_index((voxels + reach).T, key_shape))
+        voxels = np.stack(np.unravel_index(keys, key_shape), axis=1) - reach
+
+        # the part of the stock the spheres can reach, whole bytes along z
+        low = np.maximum(voxels.min(axis=0) - reach, 0)
+        high = np.minimum(voxels.max(axis=0) + reach + 1, shape)
+        if np.any(high <= low):
+            return 0
+        byte_low = low[2] // 8
+        byte_high = (high[2] + 7) // 8
+        packed = self.bits[low[0]:high[0], low[1]:high[1], byte_low:byte_high]
+        block = np.unpackbits(packed, axis=2)
+        before = int(np.sum(POPCOUNT[packed], dtype=np.int64))
+        if before == 0:
+            return 0
+
+        # work array large enough that no stencil index leaves it, so there are no bounds checks per voxel
+        block_low = np.array([low[0], low[1], byte_low * 8])
+        work_low = np.minimum(voxels.min(axis=0) - reach, block_low)
+        work_high = np.maximum(voxels.max(axis=0) + reach + 1, block_low + block.shape)
+        work = np.zeros(work_high - work_low, dtype=np.uint8)
+        start = block_low - work_low
+        work_block = work[start[0]:start[0] + block.shape[0], start[1]:start[1] + block.shape[1], start[2]:start[2] + block.shape[2]]
+        work_block[:] = block
+
+        # spheres whose bounding box holds no material are skipped, which after the first pass over an area is most
+        # of the tool, the material is counted with a summed volume table of the work array
+        local = voxels - work_low
+        table = np.zeros(np.array(work.shape) + 1, dtype=np.int32 if work.size < 2 ** 31 else np.int64)
+        table[1:, 1:, 1:] = work
+        for axis in range(3):
+            np.cumsum(table, axis=axis, out=table)
+        a = local - reach
+        b = local + reach + 1
+        material = (table[b[:, 0], b[:, 1], b[:, 2]] - table[a[:, 0], b[:, 1], b[:, 2]] - table[b[:, 0], a[:, 1], b[:, 2]]
+                    - table[b[:, 0], b[:, 1], a[:, 2]] + table[a[:, 0], a[:, 1], b[:, 2]] + table[a[:, 0], b[:, 1], a[:, 2]]
+                    + table[b[:, 0], a[:, 1], a[:, 2]] - table[a[:, 0], a[:, 1], a[:, 2]])
+        local = local[material > 0]
+
+        # 32 bit indices halve the memory traffic of the scatter below
+        index_type = np.int32 if work.size < 2 ** 31 else np.int64
+        strides = np.array([work.shape[1] * work.shape[2], work.shape[2], 1])
+        center_indices = np.dot(local, strides).astype(index_type)
+        stencil_indices = np.dot(stencil, strides).astype(index_type)
+        flat = work.reshape(-1)
+        chunk = max(1, max_indices // len(stencil_indices))
+        for i in range(0, len(center_indices), chunk):
+            flat[(center_indices[i:i + chunk, None] + stencil_indices[None, :]).ravel()] = 0
+
+        new_packed = np.packbits(work_block, axis=2)
+        removed = before - int(np.sum(POPCOUNT[new_packed], dtype=np.int64))
+        if removed:
+            packed[:] = new_packed
+            self.removed += removed
+            self.version += 1
+            self.addDirty(low[0], high[0], low[1], high[1])
+        return removed
+
+    def addDirty(self, x0, x1, y0, y1):
+        if self.dirty_box is None:
+            self.dirty_box = (int(x0), int(x1), int(y0), int(y1))
+        else:
+            box = self.dirty_box
+            self.dirty_box = (min(box[0], x0), max(box[1], x1), min(box[2], y0), max(box[3], y1))
+
+    def takeDirtyBox(self):
+        # (x0, x1, y0, y1) columns changed since the last call, None if nothing changed
+        box = self.dirty_box
+        self.dirty_box = None
+        return box
+
+    def getHeights(self, x0=0, x1=None, y0=0, y1=None):
+        # top of the remaining material per column [mm], the bottom of the stock for empty columns
+        nz = self.shape[2]
+        occupied = np.unpackbits(self.bits[x0:x1, y0:y1], axis=2)[:, :, :nz]
+        top = nz - np.argmax(occupied[:, :, ::-1], axis=2)
+        top[~occupied.any(axis=2)] = 0
+        return self.origin[2] + top * self.resolution
+
+    def save(self, path):
+        np.savez_compressed(path, bits=self.bits, origin=self.origin, resolution=self.resolution, shape=self.shape)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        stock = cls(data['origin'], np.array(data['shape']) * float(data['resolution']), float(data['resolution']))
+        stock.bits = data['bits']
+        return stock
+
+
+class StockSimulator:
+    # cuts a VoxelStock with a ball end mill along a solved trajectory. the tool is a chain of spheres from the ball
+    # center up to the end of the cutting length, tool poses are added between samples so no sphere moves more than
+    # a voxel. so only the first pose is cleared in full and every later one only in its outer shell
+
+    def __init__(self, stock, tool_radius=3.0, cutting_length=20.0, batch_size=4096):
+        self.stock = stock
+        self.tool_radius = tool_radius
+        self.cutting_length = max(cutting_length, 2 * tool_radius)
+        self.batch_size = batch_size
+        # sphere centers along the tool axis, measured from the tool end [mm]
+        shaft = self.cutting_length - 2 * tool_radius
+        count = int(math.ceil(shaft / stock.resolution))
+        self.sphere_offsets = tool_radius + np.linspace(0.0, shaft, count + 1)
+        self.reset()
+
+    def reset(self):
+        # next sample to cut and the tool pose of the sample before it
+        self.position = 0
+        self.last_tip = None
+        self.last_axis = None
+
+    def interpolatePoses(self, tips, axes):
+        # poses between consecutive samples, at most one voxel apart anywhere along the cutting length
+        if len(tips) < 2:
+            return tips, axes
+        distance = np.maximum(np.sqrt(np.sum(np.square(np.diff(tips, axis=0)), axis=1)),
+                              np.sqrt(np.sum(np.square(np.diff(axes, axis=0)), axis=1)) * self.cutting_length)
+        steps = np.maximum(np.ceil(distance / self.stock.resolution).astype(np.int64), 1)
+        segment = np.repeat(np.arange(len(steps)), steps)
+        fraction = (np.arange(len(segment)) - np.repeat(np.cumsum(steps) - steps, steps)) / steps[segment]
+        poses_tips = np.concatenate([tips[segment] + (tips[segment + 1] - tips[segment]) * fraction[:, None], tips[-1:]])
+        poses_axes = np.concatenate([axes[segment] + (axes[segment + 1] - axes[segment]) * fraction[:, None], axes[-1:]])
+        poses_axes /= np.sqrt(np.sum(np.square(poses_axes), axis=1))[:, None]
+        return poses_tips, poses_axes
+
+    def cut(self, tips, axes):
+        # removes the volume swept between the (n, 3) tool ends [mm] and axes, continuing from the last pose
+        first = self.last_tip is None
+        if not first:
+            tips = np.concatenate([self.last_tip[None], tips])
+            axes = np.concatenate([self.last_axis[None], axes])
+        if len(tips) == 0:
+            return 0
+        self.last_tip = tips[-1]
+        self.last_axis = axes[-1]
+        tips, axes = self.interpolatePoses(tips, axes)
+        centers = tips[:, None, :] + axes[:, None, :] * self.sphere_offsets[None, :, None]
+        removed = self.stock.removeSpheres(centers[0], self.tool_radius) if first else 0
+        return removed + self.stock.removeSpheres(centers.reshape(-1, 3), self.tool_radius, hollow=True)
+
+    def advance(self, machine, states, stop):
+        # cuts the samples from position up to stop (exclusive) of (N, 5) states, one batch at a time
+        removed = 0
+        stop = min(stop, len(states))
+        while self.position < stop:
+            end = min(self.position + self.batch_size, stop)
+            batch = states[self.position:end]
+            removed += self.cut(machine.calculateToolTipPathPositions(batch), machine.calculateToolAxes(batch))
+            self.position = end
+        return removed
+
+    def simulate(self, machine, states, progress=None):
+        # the whole trajectory, progress(fraction) is called after every batch
+        while self.position < len(states):
+            self.advance(machine, states, self.position + self.batch_size)
+            if progress is not None:
+                progress(self.position / len(states))
+        return self.stock
+
+
+def main(argv=None):
+    from Machine import buildDefaultMachine, loadMachine
+    from ToolPathReader import readToolPath
+
+    parser = argparse.ArgumentParser(description='material removal along a tool path')
+    parser.add_argument('tool_path', help='tool path file, see ToolPathReader')
+    parser.add_argument('--machine', default=None, help='json machine definition, the demo machine if omitted')
+    parser.add_argument('--stock', type=float, nargs=6, required=True, metavar=('X0', 'Y0', 'Z0', 'X1', 'Y1', 'Z1'),
+                        help='stock block corners in tool path coordinates [mm]')
+    parser.add_argument('--resolution', type=float, default=0.5, help='voxel edge [mm]')
+    parser.add_argument('--tool-radius', type=float, default=3.0, help='ball end mill radius [mm]')
+    parser.add_argument('--cutting-length', type=float, default=20.0, help='cutting length from the tool end [mm]')
+    parser.add_argument('--output', default=None, help='write the remaining stock as .npz')
+    args = parser.parse_args(argv)
+
+    machine = buildDefaultMachine() if args.machine is None else loadMachine(args.machine)
+    stock = VoxelStock(args.stock[:3], np.subtract(args.stock[3:], args.stock[:3]), args.resolution)
+    simulator = StockSimulator(stock, args.tool_radius, args.cutting_length)
+    volume = stock.getVolume()
+    print('{0} voxels, {1:.1f} MB'.format(np.prod(stock.shape), stock.getMemory() / 1e6))
+
+    start = time.perf_counter()
+    steps = 0
+    for block in readToolPath(args.tool_path):
+        states = machine.calculateDesiredStates(block)
+        simulator.position = 0
+        simulator.advance(machine, states, len(states))
+        steps += len(states)
+    elapsed = time.perf_counter() - start
+
+    print('{0} steps in {1:.1f} s, {2:.0f} steps/s'.format(steps, elapsed, steps / max(elapsed, 1e-9)))
+    print('removed {0:.1f} of {1:.1f} mm^3'.format(volume - stock.getVolume(), volume))
+    if args.output is not None:
+        stock.save(args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,41 +1,156 @@
 import numpy as np
-import matplotlib.pyplot as plt
-
-def normalize_vector(vec):
-    vec_len = np.sqrt(np.square(vec[0])+np.square(vec[1])+np.square(vec[2]))
-    new_vec = np.multiply(vec, 1/vec_len)
-    return new_vec
-
-
-
-# circle with radius 1
-def circle(segments, offset):
-    tool_path = []
-    for i in range(segments):
-        segment_radians = (i/segments)*np.pi*2
-
-        x = np.cos(segment_radians)+offset[0]
-        y = np.sin(segment_radians)+offset[1]
-        z = np.sin(segment_radians*2)+offset[2]
-
-        nx = np.cos(segment_radians)
-        ny = np.sin(segment_radians)
-        nz = np.abs(np.cos(segment_radians))
-        normal = normalize_vector([nx,ny,nz])
-
-        tool_step = [x*1000,y*1000,z*1000,normal[0],normal[1],normal[2]]
-        tool_path.append(tool_step)
-
-    print(np.array(tool_path))
-
-    return np.array(tool_path)
-
 
+# tool paths are (N, 6) arrays of x, y, z [mm] and the unit tool normal nx, ny, nz
 
 
+def normalize_vector(vec):
+    # works for a single vector and for (N, 3) arrays
+    vec = np.asarray(vec, dtype=float)
+    vec_len = np.sqrt(np.square(vec[..., 0])+np.square(vec[..., 1])+np.square(vec[..., 2]))
+    new_vec = np.multiply(vec, (1/vec_len)[..., None])
+    return new_vec
 
 
+def make_tool_path(points, normals):
+    tool_path = np.empty((len(points), 6))
+    tool_path[:, :3] = points
+    tool_path[:, 3:] = normalize_vector(np.broadcast_to(normals, (len(points), 3)))
+    return tool_path
 
 
-tool_path = circle(10, [1.5,2,1])
-print(tool_path)
+# circle with radius 1
+def circle(segments, offset, chunk_size=65536):
+    # offset is given in meters like the machine geometry, the result is in mm
+    tool_path = np.empty((segments, 6))
+    # the columns of a chunk are computed contiguously while they fit in the cache and then written as rows
+    columns = np.empty((6, min(segments, chunk_size)))
+    for start in range(0, segments, chunk_size):
+        count = min(chunk_size, segments-start)
+        x, y, z, i, j, k = columns[:, :count]
+        np.multiply(np.arange(start, start+count), np.pi*2/segments, out=k)
+        np.cos(k, out=x)
+        np.sin(k, out=y)
+        # sin(2a) = 2 sin(a) cos(a)
+        np.multiply(x, y, out=z)
+        z *= 2
+
+        # normal (cos, sin, |cos|) normalized, its length is sqrt(1+cos^2)
+        np.square(x, out=k)
+        k += 1
+        np.sqrt(k, out=k)
+        np.divide(x, k, out=i)
+        np.divide(y, k, out=j)
+        np.abs(i, out=k)
+
+        x += offset[0]
+        y += offset[1]
+        z += offset[2]
+        columns[:3, :count] *= 1000
+        tool_path[start:start+count] = columns[:, :count].T
+
+    return tool_path
+
+
+def helix(segments, radius, pitch, turns, center=(0.0, 0.0, 0.0), tilt=0.0):
+    # helix around the z axis rising by pitch [mm] per turn, normals tilted outwards by tilt [deg]
+    angles = np.linspace(0.0, turns*np.pi*2, segments)
+    points = np.stack([np.cos(angles)*radius, np.sin(angles)*radius, angles/(np.pi*2)*pitch], axis=1) + center
+
+    tilt = np.deg2rad(tilt)
+    normals = np.stack([np.cos(angles)*np.sin(tilt), np.sin(angles)*np.sin(tilt), np.full(segments, np.cos(tilt))], axis=1)
+    return make_tool_path(points, normals)
+
+
+def raster(width, height, stepover, step, origin=(0.0, 0.0, 0.0), normal=(0.0, 0.0, 1.0), zigzag=True):
+    # lines along x, stepover [mm] apart in y, points every step [mm], every other line reversed for zigzag
+    xs = np.linspace(0.0, width, max(int(np.ceil(width/step)), 1)+1)
+    ys = np.linspace(0.0, height, max(int(np.ceil(height/stepover)), 1)+1)
+    grid_x = np.broadcast_to(xs, (len(ys), len(xs))).copy()
+    if zigzag:
+        grid_x[1::2] = grid_x[1::2, ::-1]
+    grid_y = np.broadcast_to(ys[:, None], grid_x.shape)
+
+    points = np.stack([grid_x.ravel(), grid_y.ravel(), np.zeros(grid_x.size)], axis=1) + origin
+    return make_tool_path(points, normal)
+
+
+def spiral(radius, spacing, step, center=(0.0, 0.0, 0.0), normal=(0.0, 0.0, 1.0)):
+    # archimedean spiral from the center outwards, spacing [mm] between the turns, points about step [mm] apart
+    # the arc length of r = spacing*angle/(2*pi) is approximately spacing/(4*pi)*angle^2
+    max_angle = radius/spacing*np.pi*2
+    length = spacing/(np.pi*4)*np.square(max_angle)
+    arc_lengths = np.linspace(0.0, length, max(int(np.ceil(length/step)), 1)+1)
+    angles = np.sqrt(arc_lengths*np.pi*4/spacing)
+    radii = angles/(np.pi*2)*spacing
+
+    points = np.stack([np.cos(angles)*radii, np.sin(angles)*radii, np.zeros(len(angles))], axis=1) + center
+    return make_tool_path(points, normal)
+
+
+def swept_surface(height, width, depth, stepover, step, origin=(0.0, 0.0, 0.0), zigzag=True):
+    # zigzag raster over the surface z = height(x, y), normals are the surface normals
+    # height gets and returns arrays of x, y [mm] relative to origin
+    tool_path = raster(width, depth, stepover, step, (0.0, 0.0, 0.0), zigzag=zigzag)
+    x = tool_path[:, 0]
+    y = tool_path[:, 1]
+    z = height(x, y)
+
+    # central differences of the height field give the gradient
+    delta = step*1e-3
+    dz_dx = (height(x+delta, y)-height(x-delta, y))/(2*delta)
+    dz_dy = (height(x, y+delta)-height(x, y-delta))/(2*delta)
+
+    tool_path[:, 2] = z
+    tool_path[:, :3] += origin
+    tool_path[:, 3:] = normalize_vector(np.stack([-dz_dx, -dz_dy, np.ones(len(x))], axis=1))
+    return tool_path
+
+
+def resample(tool_path, tolerance, max_step=None, min_step=None):
+    # re-spaces a tool path so the chords deviate at most about tolerance [mm] from the curve through its points.
+    # the chord length for a local radius r is sqrt(8*r*tolerance), straight parts get max_step long chords.
+    # the tool normals are interpolated along the arc length, so points that only turn the tool are merged away and
+    # a path without length, e.g. a pure a/b reorientation, is returned unchanged
+    tool_path = np.asarray(tool_path, dtype=float)
+    if len(tool_path) < 3 or tolerance <= 0:
+        return tool_path.copy()
+
+    segments = np.diff(tool_path[:, :3], axis=0)
+    segment_lengths = np.sqrt(np.sum(np.square(segments), axis=1))
+    arc_lengths = np.concatenate([[0.0], np.cumsum(segment_lengths)])
+    if arc_lengths[-1] == 0:
+        return tool_path.copy()
+    if max_step is None:
+        max_step = arc_lengths[-1]
+    if min_step is None:
+        min_step = tolerance
+
+    # curvature at the inner points from the turning angle over the neighbouring segments
+    directions = segments/np.maximum(segment_lengths, 1e-12)[:, None]
+    cos_turn = np.clip(np.sum(directions[1:]*directions[:-1], axis=1), -1.0, 1.0)
+    curvature = np.arccos(cos_turn)/np.maximum((segment_lengths[1:]+segment_lengths[:-1])/2, 1e-12)
+    curvature = np.concatenate([[curvature[0]], curvature, [curvature[-1]]])
+
+    with np.errstate(divide='ignore'):
+        spacing = np.sqrt(8*tolerance/curvature)
+    spacing = np.clip(spacing, min_step, max_step)
+
+    # sample count as a function of arc length, new points at every whole count
+    density = 1/spacing
+    counts = np.concatenate([[0.0], np.cumsum((density[1:]+density[:-1])/2*segment_lengths)])
+    sample_count = max(int(np.ceil(counts[-1])), 1)+1
+    new_arc_lengths = np.interp(np.linspace(0.0, counts[-1], sample_count), counts, arc_lengths)
+
+    resampled = np.empty((sample_count, 6))
+    for column in range(6):
+        resampled[:, column] = np.interp(new_arc_lengths, arc_lengths, tool_path[:, column])
+    resampled[:, 3:] = normalize_vector(resampled[:, 3:])
+    return resampled
+
+
+if __name__ == '__main__':
+    import time
+
+    start = time.perf_counter()
+    tool_path = circle(10000000, [1.5,2,1])
+    print('circle with {0} points in {1:.3f} s'.format(len(tool_path), time.perf_counter()-start))
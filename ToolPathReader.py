@@ -0,0 +1,308 @@
+import os
+import re
+import sys
+import time
+import warnings
+
+import numpy as np
+
+import Kinematics
+
+# streaming tool path readers, every reader yields (n, 6) blocks of x, y, z [mm] and the tool normal
+
+GCODE_EXTENSIONS = ('.nc', '.ngc', '.gcode', '.tap', '.cnc')
+BINARY_EXTENSIONS = ('.npy', '.bin')
+
+XYZ_COMMENT = re.compile(r'^[ \t]*#.*$', re.MULTILINE)
+# a header is the first line with text, if it starts with a letter
+XYZ_HEADER = re.compile(r'\s*([A-Za-z][^\n]*)')
+
+# G-code words used for tool paths, the words of other letters are dropped
+GCODE_LETTERS = 'GXYZIJKAB'
+GCODE_AXES = 'XYZAB'
+GCODE_COMMENT = re.compile(r'\([^)\n]*\)|;[^\n]*')
+# a word is a letter and a whole number, an exponent after the number belongs to it. without its words a line may only
+# have '/' block deletes and '%' tape marks left, anything else, e.g. #1=5 variables or X#1 parameters, makes it
+# unreadable
+GCODE_WORD = re.compile(r'[A-Z][ \t]*[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:E[-+]?\d+)?(?![\d.]|E[-+]?\d)')
+GCODE_OTHER = re.compile(r'[^\s/%]')
+# E right after a number is its exponent and not a word
+GCODE_EXPONENT = re.compile(r'(?<=[\d.])E(?=[-+]?\d)')
+GCODE_NEWLINE = -1
+# G codes whose axis words are no tool path positions: offsets, reference points and machine coordinates
+GCODE_NON_MOTION = (10.0, 28.0, 30.0, 53.0, 92.0)
+
+
+class ReadStats:
+    # bytes and time spent parsing, the time the consumer needs between blocks is not counted
+
+    def __init__(self):
+        self.bytes_read = 0
+        self.steps = 0
+        self.seconds = 0.0
+        # G-code lines that could not be read
+        self.skipped_lines = 0
+
+    def add(self, bytes_read, steps, seconds):
+        self.bytes_read += bytes_read
+        self.steps += steps
+        self.seconds += seconds
+
+    def getThroughput(self):
+        # MB/s
+        return self.bytes_read / 1e6 / max(self.seconds, 1e-9)
+
+    def __str__(self):
+        text = '{0} steps, {1:.1f} MB in {2:.3f} s ({3:.1f} MB/s)'.format(
+            self.steps, self.bytes_read / 1e6, self.seconds, self.getThroughput())
+        if self.skipped_lines:
+            text += ', {0} lines skipped'.format(self.skipped_lines)
+        return text
+
+
+def rechunk(blocks, block_size):
+    # turns blocks of any size into blocks of exactly block_size rows, except for the last one
+    pending = []
+    pending_length = 0
+    for block in blocks:
+        pending.append(block)
+        pending_length += len(block)
+        if pending_length < block_size:
+            continue
+        merged = np.concatenate(pending)
+        full = (len(merged) // block_size) * block_size
+        for start in range(0, full, block_size):
+            yield merged[start:start + block_size]
+        pending = [merged[full:]]
+        pending_length = len(merged) - full
+    if pending_length > 0:
+        yield np.concatenate(pending)
+
+
+def readTextBlocks(path, read_size):
+    # raw text cut at line ends, with the number of bytes each block covers
+    with open(path, 'rb') as f:
+        remainder = b''
+        while True:
+            data = f.read(read_size)
+            if not data:
+                break
+            data = remainder + data
+            cut = data.rfind(b'\n') + 1
+            if cut == 0:
+                remainder = data
+                continue
+            remainder = data[cut:]
+            yield data[:cut].decode('ascii', errors='replace'), cut
+        if remainder:
+            yield remainder.decode('ascii', errors='replace') + '\n', len(remainder)
+
+
+def readXYZ(path, block_size=100000, stats=None, read_size=16 * 1024 * 1024):
+    # csv or whitespace separated x y z nx ny nz per line, '#' comment lines and one header line are skipped.
+    # every line needs the number of values of the first one
+    stats = stats if stats is not None else ReadStats()
+
+    def parse():
+        columns = None
+        line_count = 0
+        for text, size in readTextBlocks(path, read_size):
+            start = time.perf_counter()
+            # skipped lines are blanked, so line numbers stay those of the file
+            if '#' in text:
+                text = XYZ_COMMENT.sub('', text)
+            if columns is None:
+                header = XYZ_HEADER.match(text)
+                if header is not None:
+                    text = text[:header.start(1)] + text[header.end(1):]
+            text = text.replace(',', ' ')
+
+            # values per line from the starts of the numbers
+            data = np.frombuffer(text.encode('ascii', errors='replace'), dtype=np.uint8)
+            filled = data > ord(' ')
+            value_starts = np.flatnonzero(filled & ~np.concatenate([[False], filled[:-1]]))
+            line_ends = np.flatnonzero(data == ord('\n'))
+            counts = np.diff(np.searchsorted(value_starts, np.concatenate([[0], line_ends + 1])))
+            if columns is None:
+                if not np.any(counts):
+                    line_count += len(counts)
+                    continue
+                columns = int(counts[np.argmax(counts > 0)])
+            wrong = np.flatnonzero((counts != 0) & (counts != columns))
+            if len(wrong):
+                raise ValueError('{0}: line {1} has {2} values instead of {3}'.format(
+                    path, line_count + wrong[0] + 1, counts[wrong[0]], columns))
+            line_count += len(counts)
+
+            # a value that is no number raises in newer numpy versions, older ones warn and stop early
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', DeprecationWarning)
+                    values = np.fromstring(text, dtype=np.float64, sep=' ')
+            except ValueError:
+                values = np.zeros(0)
+            if len(values) != np.sum(counts):
+                raise ValueError('{0}: text that is no number between lines {1} and {2}'.format(
+                    path, line_count - len(counts) + 1, line_count))
+            block = values.reshape(-1, columns)[:, :6]
+            stats.add(size, len(block), time.perf_counter() - start)
+            yield block
+
+    return rechunk(parse(), block_size)
+
+
+def readGCode(path, block_size=100000, stats=None, read_size=16 * 1024 * 1024):
+    # G0/G1 moves with the tool orientation given as IJK vector or as A/B angles of this machine type.
+    # words are modal, G2/G3 arcs are linearized to their end points, G91 makes the axis words incremental.
+    # lines that are not plain words are skipped with a warning
+    stats = stats if stats is not None else ReadStats()
+
+    def parse():
+        # modal state carried from block to block
+        state = {letter: np.nan for letter in GCODE_LETTERS}
+        state.update({'X': 0.0, 'Y': 0.0, 'Z': 0.0, 'A': 0.0, 'B': 0.0})
+        incremental = False
+        normal = np.array([0.0, 0.0, 1.0])
+
+        for text, size in readTextBlocks(path, read_size):
+            start = time.perf_counter()
+            # every word becomes a (letter code, value) pair and every line end a (GCODE_NEWLINE, 0) pair
+            text = GCODE_COMMENT.sub(' ', text.upper())
+            if not isWords(text):
+                text = skipLines(path, text, stats)
+            if 'E' in text:
+                text = GCODE_EXPONENT.sub('e', text)
+            text = text.replace('/', ' ').replace('%', ' ')
+            for code, letter in enumerate(GCODE_LETTERS):
+                text = text.replace(letter, ' {0} '.format(code))
+            # other letters are dropped with their words
+            text = re.sub(r'[A-Z]', ' {0} '.format(len(GCODE_LETTERS)), text)
+            text = text.replace('\n', ' {0} 0 '.format(GCODE_NEWLINE))
+            pairs = np.array(text.split(), dtype=np.float64).reshape(-1, 2)
+            codes = pairs[:, 0].astype(int)
+            numbers = pairs[:, 1]
+
+            newline = codes == GCODE_NEWLINE
+            line_count = int(np.sum(newline))
+            lines = np.cumsum(newline) - newline
+
+            # G90 and G91 set the distance mode, lines with offset or reference point G codes do not move
+            g_words = codes == 0
+            distance_modes = np.full(line_count, np.nan)
+            distance_modes[lines[g_words & (numbers == 90.0)]] = 0.0
+            distance_modes[lines[g_words & (numbers == 91.0)]] = 1.0
+            distance_modes = forwardFill(distance_modes, float(incremental)) == 1.0
+            if line_count:
+                incremental = bool(distance_modes[-1])
+            non_motion = np.zeros(line_count, dtype=bool)
+            non_motion[lines[g_words & np.isin(numbers, GCODE_NON_MOTION)]] = True
+
+            # only G0-G3 select the motion mode, other G codes do not touch it
+            words = ~newline & (codes < len(GCODE_LETTERS)) & (~g_words | np.isin(numbers, (0.0, 1.0, 2.0, 3.0)))
+
+            table = np.full((line_count, len(GCODE_LETTERS)), np.nan)
+            table[lines[words], codes[words]] = numbers[words]
+            table[non_motion, 1:] = np.nan
+
+            has_move = ~np.all(np.isnan(table[:, 1:]), axis=1)
+            has_vector = ~np.all(np.isnan(table[:, 4:7]), axis=1)
+            has_angles = ~np.all(np.isnan(table[:, 7:9]), axis=1)
+
+            for column, letter in enumerate(GCODE_LETTERS):
+                if letter in GCODE_AXES:
+                    table[:, column] = accumulatePositions(table[:, column], distance_modes, state[letter])
+                    state[letter] = table[-1, column] if line_count else state[letter]
+                elif letter not in 'IJK':
+                    table[:, column] = forwardFill(table[:, column], state[letter])
+                    state[letter] = table[-1, column] if line_count else state[letter]
+
+            linear = (table[:, 0] == 0.0) | (table[:, 0] == 1.0)
+            has_vector &= linear
+            has_angles &= linear & ~has_vector
+
+            normals = np.full((line_count, 3), np.nan)
+            vectors = np.nan_to_num(table[has_vector][:, 4:7])
+            lengths = np.sqrt(np.sum(np.square(vectors), axis=1))[:, None]
+            normals[has_vector] = vectors / np.where(lengths > 0.0, lengths, 1.0)
+            normals[has_angles] = Kinematics.normalsFromAngles(table[has_angles, 7], table[has_angles, 8])
+            for column in range(3):
+                normals[:, column] = forwardFill(normals[:, column], normal[column])
+            if line_count:
+                normal = normals[-1]
+
+            steps = has_move & ~np.isnan(table[:, 0])
+            block = np.hstack([table[steps][:, 1:4], normals[steps]])
+            stats.add(size, len(block), time.perf_counter() - start)
+            yield block
+
+    return rechunk(parse(), block_size)
+
+
+def forwardFill(values, initial):
+    # replaces nan by the last value before it, or by initial at the start
+    valid = ~np.isnan(values)
+    indices = np.where(valid, np.arange(len(values)), -1)
+    np.maximum.accumulate(indices, out=indices)
+    return np.where(indices >= 0, values[np.maximum(indices, 0)], initial)
+
+
+def isWords(text):
+    return GCODE_OTHER.search(GCODE_WORD.sub('', text)) is None
+
+
+def skipLines(path, text, stats):
+    # blanks the lines that are not only words and warns about them
+    lines = text.split('\n')
+    skipped = [index for index, line in enumerate(lines) if not isWords(line)]
+    warnings.warn('{0}: skipped {1} G-code lines that are not plain words, e.g. {2!r}'.format(
+        path, len(skipped), lines[skipped[0]].strip()))
+    stats.skipped_lines += len(skipped)
+    for index in skipped:
+        lines[index] = ''
+    return '\n'.join(lines)
+
+
+def accumulatePositions(values, incremental, initial):
+    # modal axis positions, values on incremental lines move relative to the line before, nan keeps the position
+    given = ~np.isnan(values)
+    absolute = given & ~incremental
+    total = np.cumsum(np.where(given & incremental, values, 0.0))
+    indices = np.where(absolute, np.arange(len(values)), -1)
+    np.maximum.accumulate(indices, out=indices)
+    last = np.maximum(indices, 0)
+    return np.where(indices >= 0, values[last] - total[last], initial) + total
+
+
+def openBinary(path):
+    # memory mapped (N, 6) view, .npy files or raw little endian float64 .bin files
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode='r')
+    return np.memmap(path, dtype='<f8', mode='r').reshape(-1, 6)
+
+
+def readBinary(path, block_size=100000, stats=None):
+    stats = stats if stats is not None else ReadStats()
+    tool_path = openBinary(path)
+    for start in range(0, len(tool_path), block_size):
+        begin = time.perf_counter()
+        block = np.asarray(tool_path[start:start + block_size, :6], dtype=np.float64)
+        stats.add(block.nbytes, len(block), time.perf_counter() - begin)
+        yield block
+
+
+def readToolPath(path, block_size=100000, stats=None):
+    # picks the reader by file extension
+    extension = os.path.splitext(path)[1].lower()
+    if extension in BINARY_EXTENSIONS:
+        return readBinary(path, block_size, stats)
+    if extension in GCODE_EXTENSIONS:
+        return readGCode(path, block_size, stats)
+    return readXYZ(path, block_size, stats)
+
+
+if __name__ == '__main__':
+    # parse throughput of a tool path file
+    stats = ReadStats()
+    for block in readToolPath(sys.argv[1], stats=stats):
+        pass
+    print(stats)
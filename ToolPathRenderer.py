@@ -0,0 +1,109 @@
+import numpy as np
+import OpenGL.GL as gl
+
+
+class ToolPathGeometry:
+    # line geometry of a tool path in GL coordinates, decimated versions are built on demand
+
+    def __init__(self, tool_path):
+        tool_path = np.asarray(tool_path, dtype=float).reshape(-1, 6)
+        self.point_count = len(tool_path)
+
+        # tool path is in mm with z up, GL uses meters with y up
+        self.points = np.ascontiguousarray(tool_path[:, [0, 2, 1]] / 1000, dtype=np.float32)
+        self.normal_lines = np.empty((self.point_count, 2, 3), dtype=np.float32)
+        self.normal_lines[:, 0] = self.points
+        self.normal_lines[:, 1] = self.points + tool_path[:, [3, 5, 4]]
+
+        if self.point_count > 0:
+            self.bounds_min = self.points.min(axis=0)
+            self.bounds_max = self.points.max(axis=0)
+            self.length = np.sum(np.sqrt(np.sum(np.square(np.diff(self.points, axis=0)), axis=1)))
+        else:
+            self.bounds_min = np.zeros(3)
+            self.bounds_max = np.zeros(3)
+            self.length = 0.0
+        self.levels = {}
+
+    def getLevel(self, stride):
+        # every stride-th point, the last point is always kept so the path ends where it should
+        level = self.levels.get(stride)
+        if level is None:
+            if stride == 1:
+                level = (self.points, self.normal_lines)
+            else:
+                points = self.points[::stride]
+                if (self.point_count - 1) % stride != 0:
+                    points = np.concatenate([points, self.points[-1:]])
+                level = (np.ascontiguousarray(points), np.ascontiguousarray(self.normal_lines[::stride]))
+            self.levels[stride] = level
+        return level
+
+    def getScreenExtent(self, modelview, projection, viewport):
+        # diagonal of the projected bounding box in pixels, None if it reaches behind the camera
+        corners = np.array([[x, y, z, 1.0] for x in (self.bounds_min[0], self.bounds_max[0])
+                            for y in (self.bounds_min[1], self.bounds_max[1])
+                            for z in (self.bounds_min[2], self.bounds_max[2])])
+        # GL returns column major matrices, so row vectors are multiplied from the left
+        clip = np.matmul(np.matmul(corners, modelview), projection)
+        if np.any(clip[:, 3] <= 0.0):
+            return None
+        ndc = clip[:, :2] / clip[:, 3:4]
+        pixels = ndc * 0.5 * np.array([viewport[2], viewport[3]])
+        return np.sqrt(np.sum(np.square(pixels.max(axis=0) - pixels.min(axis=0))))
+
+    def chooseStride(self, screen_extent, max_segments, pixels_per_segment):
+        segments = max_segments
+        world_extent = np.sqrt(np.sum(np.square(self.bounds_max - self.bounds_min)))
+        if screen_extent is not None and world_extent > 0.0:
+            screen_length = self.length * screen_extent / world_extent
+            segments = min(max_segments, max(1, int(screen_length / pixels_per_segment)))
+        stride = 1
+        while (self.point_count - 1) / stride > segments:
+            stride *= 2
+        return stride
+
+
+class ToolPathRenderer:
+    # draws the tool path and its normals from cached vertex arrays with a bounded segment count
+
+    def __init__(self, max_segments=20000, pixels_per_segment=2.0):
+        self.max_segments = max_segments
+        self.pixels_per_segment = pixels_per_segment
+        self.geometry = None
+        self.tool_path_version = None
+
+    def getGeometry(self, machine):
+        if self.geometry is None or self.tool_path_version != machine.tool_path_version:
+            self.geometry = ToolPathGeometry(machine.tool_path)
+            self.tool_path_version = machine.tool_path_version
+        return self.geometry
+
+    def drawToolPath(self, machine):
+        geometry = self.getGeometry(machine)
+        if geometry.point_count == 0:
+            return
+
+        gl.glPushMatrix()
+        offset = np.multiply(machine.y_axis.axis_position, machine.y_axis.linear_movement)
+        gl.glTranslatef(offset[0], offset[1], offset[2])
+
+        screen_extent = geometry.getScreenExtent(gl.glGetDoublev(gl.GL_MODELVIEW_MATRIX),
+                                                 gl.glGetDoublev(gl.GL_PROJECTION_MATRIX),
+                                                 gl.glGetIntegerv(gl.GL_VIEWPORT))
+        stride = geometry.chooseStride(screen_extent, self.max_segments, self.pixels_per_segment)
+        points, normal_lines = geometry.getLevel(stride)
+
+        gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
+
+        gl.glColor4f(0.0, 0.0, 1.0, 1.0)
+        gl.glVertexPointer(3, gl.GL_FLOAT, 0, points)
+        gl.glDrawArrays(gl.GL_LINE_STRIP, 0, len(points))
+
+        gl.glColor4f(1.0, 0.0, 0.0, 1.0)
+        gl.glVertexPointer(3, gl.GL_FLOAT, 0, normal_lines)
+        gl.glDrawArrays(gl.GL_LINES, 0, len(normal_lines) * 2)
+
+        gl.glDisableClientState(gl.GL_VERTEX_ARRAY)
+
+        gl.glPopMatrix()
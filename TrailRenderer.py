@@ -0,0 +1,97 @@
+import numpy as np
+import OpenGL.GL as gl
+
+
+class TrailRenderer:
+    # executed tool tip positions, i.e. forward kinematics of the states the machine went through, drawn over the
+    # commanded tool path. the last capacity points live in a ring of a fixed size vertex buffer, every frame only the
+    # points appended since the last frame are uploaded with glBufferSubData
+
+    def __init__(self, capacity=200000, color=(1.0, 0.5, 0.0)):
+        self.capacity = capacity
+        self.color = color
+        self.vbo = None
+        # points not uploaded yet, in GL coordinates
+        self.pending = []
+        self.pending_count = 0
+        # next slot to write and number of valid points in the ring
+        self.head = 0
+        self.count = 0
+        self.visible = True
+        self.join_indices = np.array([capacity - 1, 0], dtype=np.uint32)
+
+    def append(self, tool_tips):
+        # (N, 3) tool tip positions in tool path coordinates [mm], can be called without a GL context
+        tool_tips = np.atleast_2d(tool_tips)
+        if len(tool_tips) == 0:
+            return
+        # tool path is in mm with z up, GL uses meters with y up
+        self.pending.append(np.ascontiguousarray(tool_tips[-self.capacity:, [0, 2, 1]] / 1000, dtype=np.float32))
+        self.pending_count += len(self.pending[-1])
+        # points that would be overwritten before they are drawn are never uploaded
+        while self.pending_count - len(self.pending[0]) >= self.capacity:
+            self.pending_count -= len(self.pending.pop(0))
+
+    def clear(self):
+        self.pending = []
+        self.pending_count = 0
+        self.head = 0
+        self.count = 0
+
+    def initializeGL(self):
+        self.vbo = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, self.capacity * 3 * 4, None, gl.GL_DYNAMIC_DRAW)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+    def upload(self):
+        if not self.pending:
+            return
+        points = np.concatenate(self.pending) if len(self.pending) > 1 else self.pending[0]
+        points = points[-self.capacity:]
+        self.pending = []
+        self.pending_count = 0
+
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        # at most two writes, up to the end of the buffer and the rest from its start
+        first = min(len(points), self.capacity - self.head)
+        gl.glBufferSubData(gl.GL_ARRAY_BUFFER, self.head * 12, first * 12, points[:first])
+        if first < len(points):
+            gl.glBufferSubData(gl.GL_ARRAY_BUFFER, 0, (len(points) - first) * 12, points[first:])
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        self.head = (self.head + len(points)) % self.capacity
+        self.count = min(self.count + len(points), self.capacity)
+
+    def drawTrail(self, machine):
+        if not self.visible or (self.count == 0 and not self.pending):
+            return
+        if self.vbo is None:
+            self.initializeGL()
+        self.upload()
+
+        gl.glPushMatrix()
+        # like the tool path the trail is relative to the table, which moves with the y-axis
+        offset = np.multiply(machine.y_axis.axis_position, machine.y_axis.linear_movement)
+        gl.glTranslatef(offset[0], offset[1], offset[2])
+        gl.glLineWidth(2.0)
+        gl.glColor4f(self.color[0], self.color[1], self.color[2], 1.0)
+        gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        gl.glVertexPointer(3, gl.GL_FLOAT, 0, None)
+        if self.count < self.capacity:
+            gl.glDrawArrays(gl.GL_LINE_STRIP, 0, self.count)
+        else:
+            # oldest points from head to the end, then from the start to head, joined by one segment
+            gl.glDrawArrays(gl.GL_LINE_STRIP, self.head, self.capacity - self.head)
+            if self.head > 0:
+                gl.glDrawArrays(gl.GL_LINE_STRIP, 0, self.head)
+                gl.glDrawElements(gl.GL_LINES, 2, gl.GL_UNSIGNED_INT, self.join_indices)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glDisableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glLineWidth(1.0)
+        gl.glPopMatrix()
+
+    def cleanup(self):
+        if self.vbo is not None:
+            gl.glDeleteBuffers(1, [self.vbo])
+            self.vbo = None
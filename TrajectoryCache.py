@@ -0,0 +1,174 @@
+import os
+import json
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from Feasibility import unwrapRotations
+
+
+def getTrajectoryKey(machine, tool_path, definition=None):
+    # content hash of the tool path and the machine definition, which can be taken from the machine beforehand
+    if definition is None:
+        definition = machine.getDefinition()
+    tool_path = np.ascontiguousarray(tool_path, dtype=np.float64)
+    digest = hashlib.sha1()
+    digest.update(str(tool_path.shape).encode('ascii'))
+    digest.update(tool_path.tobytes())
+    digest.update(json.dumps(definition, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class Trajectory:
+    # solved axis states of a tool path and the world transforms of every axis per sample.
+    # the transforms are computed in blocks on first use and kept in the cache like the states
+
+    def __init__(self, cache, key, machine, tool_path):
+        self.cache = cache
+        self.key = key
+        self.machine = machine
+        self.tool_path = tool_path
+        self.length = len(tool_path)
+
+    def __len__(self):
+        return self.length
+
+    def getStates(self):
+        # (N, 5) x/y/z [mm] and a/b [deg] with unwrapped rotations
+        return self.cache.getArray((self.key, 'states', 0), self.solveStates)
+
+    def isSolved(self):
+        return self.cache.hasArray((self.key, 'states', 0))
+
+    def setStates(self, states):
+        # states solved elsewhere, e.g. block by block on a loader thread
+        self.cache.getArray((self.key, 'states', 0), lambda: states)
+
+    def solveStates(self):
+        states = self.machine.calculateDesiredStates(self.tool_path)
+        return unwrapRotations(states, self.machine.getToolPositionWithoutRotation())[0]
+
+    def getWorldTransforms(self, index):
+        # (n_axes, 4, 4) transforms of one sample
+        block_size = self.cache.block_size
+        block = index // block_size
+        return self.cache.getArray((self.key, 'world', block), lambda: self.solveWorldTransforms(block))[index - block * block_size]
+
+    def solveWorldTransforms(self, block):
+        start = block * self.cache.block_size
+        return self.machine.calculateWorldTransforms(self.getStates()[start:start + self.cache.block_size])
+
+    def getState(self, position):
+        # state at a fractional index, linear between the samples
+        states = self.getStates()
+        index = min(int(position), self.length - 1)
+        fraction = position - index
+        if fraction <= 0.0 or index == self.length - 1:
+            return states[index]
+        return states[index] * (1 - fraction) + states[index + 1] * fraction
+
+    def applyTo(self, machine, position):
+        # poses the machine at a fractional index, whole indices come straight from the cache
+        index = min(int(position), self.length - 1)
+        if position - index <= 0.0 or index == self.length - 1:
+            machine.setState(self.getStates()[index])
+            machine.setWorldTransforms(self.getWorldTransforms(index))
+        else:
+            machine.setState(self.getState(position))
+            machine.buildMachinState()
+
+
+class TrajectoryCache:
+    # solved trajectories keyed by content, arrays are evicted least recently used first once they use more than
+    # max_bytes. with a spill_dir evicted arrays are written to disk and memory mapped when needed again
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, spill_dir=None, block_size=4096):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.block_size = block_size
+        self.lock = threading.RLock()
+        self.arrays = OrderedDict()
+        self.bytes = 0
+        # a trajectory lives as long as somebody uses it, its arrays as long as the memory bound allows
+        self.trajectories = weakref.WeakValueDictionary()
+
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+
+    def get(self, machine, tool_path, key=None):
+        if key is None:
+            key = getTrajectoryKey(machine, tool_path)
+        with self.lock:
+            trajectory = self.trajectories.get(key)
+            if trajectory is None:
+                trajectory = Trajectory(self, key, machine, tool_path)
+                self.trajectories[key] = trajectory
+            return trajectory
+
+    def getArray(self, array_key, solve):
+        with self.lock:
+            array = self.arrays.get(array_key)
+            if array is not None:
+                self.arrays.move_to_end(array_key)
+                self.hits += 1
+                return array
+
+            spill_path = self.getSpillPath(array_key)
+            if spill_path is not None and os.path.exists(spill_path):
+                self.spill_hits += 1
+                array = np.load(spill_path, mmap_mode='r')
+            else:
+                self.misses += 1
+                array = solve()
+            self.arrays[array_key] = array
+            self.bytes += array.nbytes
+            self.evict()
+            return array
+
+    def hasArray(self, array_key):
+        with self.lock:
+            spill_path = self.getSpillPath(array_key)
+            return array_key in self.arrays or (spill_path is not None and os.path.exists(spill_path))
+
+    def getSpillPath(self, array_key):
+        if self.spill_dir is None:
+            return None
+        return os.path.join(self.spill_dir, '{0}_{1}_{2}.npy'.format(*array_key))
+
+    def evict(self):
+        # the most recently used array always stays
+        while len(self.arrays) > 1 and self.bytes > self.max_bytes:
+            array_key, array = self.arrays.popitem(last=False)
+            self.bytes -= array.nbytes
+            spill_path = self.getSpillPath(array_key)
+            if spill_path is not None and not os.path.exists(spill_path):
+                os.makedirs(self.spill_dir, exist_ok=True)
+                # written under a temporary name first, so a crash never leaves a truncated file behind
+                np.save(spill_path + '.tmp.npy', array)
+                os.replace(spill_path + '.tmp.npy', spill_path)
+
+    def clear(self):
+        with self.lock:
+            self.arrays.clear()
+            self.bytes = 0
+
+    def getHitRate(self):
+        # share of lookups answered from memory or disk
+        lookups = self.hits + self.spill_hits + self.misses
+        return (self.hits + self.spill_hits) / lookups if lookups else 0.0
+
+    def getStats(self):
+        return {'hits': self.hits, 'spill_hits': self.spill_hits, 'misses': self.misses,
+                'hit_rate': self.getHitRate(), 'bytes': self.bytes, 'arrays': len(self.arrays)}
+
+    def getText(self):
+        # one line for the profiler overlay
+        return 'trajectory cache    {0:.1%} hits, {1} from disk, {2} misses, {3} arrays {4:.1f} MB'.format(
+            self.getHitRate(), self.spill_hits, self.misses, len(self.arrays), self.bytes / 1e6)
+
+
+cache = TrajectoryCache()
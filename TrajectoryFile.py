@@ -0,0 +1,331 @@
+import os
+import sys
+import json
+import shutil
+import struct
+import argparse
+import tempfile
+
+import numpy as np
+
+from Feasibility import stepTimes, unwrapRotations
+from Machine import buildMachine
+
+# solved trajectories in one file, so batch runs, the viewer and regression diffs share results instead of solving
+# a program again. layout:
+#   b'TRAJ', uint16 version, uint16 0, uint32 header length, json header
+#   every column as one contiguous (N, width) little endian array, at 64 byte aligned offsets from the header
+# the header holds the machine definition, the feed rate of the timestamps and per column the dtype, the encoding
+# and the offsets. columns are memory mapped, opening a file reads nothing but the header.
+# delta encoded columns store every row as the difference to the first row of its block, the float64 block keys
+# follow the column. a row is decoded from one key and one difference, so seeking stays O(1) and float32 files
+# keep sub micrometer precision far away from the origin
+
+MAGIC = b'TRAJ'
+VERSION = 1
+ALIGNMENT = 64
+EXTENSION = '.traj'
+
+# name and width of the columns, times are seconds at the feed rate and always stored as raw float64
+COLUMNS = (('tool_path', 6), ('states', 5), ('times', 1), ('tool_tips', 3))
+
+
+class DeltaColumn:
+    # read only (N, width) view of a delta encoded column, rows are decoded when indexed
+
+    def __init__(self, data, keys, block_size):
+        self.data = data
+        self.keys = keys
+        self.block_size = block_size
+        self.shape = data.shape
+        self.dtype = np.dtype(np.float64)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        columns = ()
+        if isinstance(index, tuple):
+            index, columns = index[0], index[1:]
+        if isinstance(index, (int, np.integer)):
+            row = index + len(self) if index < 0 else index
+            rows = self.keys[row // self.block_size] + self.data[row]
+        elif isinstance(index, slice) and index.step in (None, 1):
+            start, stop, _ = index.indices(len(self))
+            stop = max(stop, start)
+            block_of_rows = np.arange(start, stop) // self.block_size
+            rows = self.keys[block_of_rows] + self.data[start:stop]
+        else:
+            if isinstance(index, slice):
+                index = np.arange(*index.indices(len(self)))
+            index = np.asarray(index)
+            index = np.where(index < 0, index + len(self), index)
+            rows = self.keys[index // self.block_size] + self.data[index]
+        return rows[(Ellipsis,) + columns] if columns else rows
+
+    def __array__(self, dtype=None, copy=None):
+        rows = self[:]
+        return rows if dtype is None else rows.astype(dtype)
+
+
+class TrajectoryWriter:
+    # appends solved chunks to one temporary file per column, close() writes the header and the columns to path.
+    # states are unwrapped across chunks like the viewer plays them
+
+    def __init__(self, path, machine, feed_rate=5000.0, dtype='<f8', delta=False, block_size=4096, overview_rows=65536):
+        self.path = path
+        self.machine = machine
+        self.definition = machine.getDefinition()
+        self.tool_pos_without_rot = machine.getToolPositionWithoutRotation()
+        self.feed_rate = feed_rate
+        self.dtype = np.dtype(dtype).newbyteorder('<')
+        self.delta = delta
+        self.block_size = block_size
+        self.overview_rows = overview_rows
+
+        self.temp_dir = tempfile.mkdtemp(prefix='.traj_', dir=os.path.dirname(os.path.abspath(path)))
+        self.files = {name: open(os.path.join(self.temp_dir, name), 'wb') for name, _ in COLUMNS}
+        self.key_files = {name: open(os.path.join(self.temp_dir, name + '.keys'), 'wb') for name, _ in COLUMNS}
+        # float64 key of the block the last row was in, per column
+        self.keys = {}
+        self.rows = 0
+        self.previous_state = None
+        self.previous_tool_path = None
+        self.previous_time = 0.0
+        # every overview_stride-th tool path row for drawing, the stride doubles when there are too many
+        self.overview = []
+        self.overview_count = 0
+        self.overview_stride = 1
+
+    def write(self, tool_path, states, tool_tips=None):
+        # (n, 6) tool path rows, their (n, 5) solved states and (n, 3) tool tips, computed if omitted
+        tool_path = np.asarray(tool_path, dtype=np.float64)
+        if len(tool_path) == 0:
+            return
+        states = unwrapRotations(states, self.tool_pos_without_rot, self.previous_state)[0]
+        if tool_tips is None:
+            tool_tips = self.machine.calculateToolTipPathPositions(states)
+
+        # like PlaybackScheduler.extendTrajectory, pure rotations take one 60 Hz frame per step
+        steps = tool_path if self.previous_tool_path is None else np.concatenate([self.previous_tool_path, tool_path])
+        step_times = stepTimes(steps, self.feed_rate)
+        if len(step_times) and np.sum(step_times) <= 0.0:
+            step_times = stepTimes(steps, sample_time=1 / 60)
+        if self.previous_tool_path is None:
+            step_times = np.concatenate([[0.0], step_times])
+        times = self.previous_time + np.cumsum(step_times)
+
+        self.writeColumn('tool_path', tool_path)
+        self.writeColumn('states', states)
+        self.writeColumn('times', times[:, None])
+        self.writeColumn('tool_tips', np.asarray(tool_tips, dtype=np.float64))
+        self.addOverview(tool_path)
+
+        self.rows += len(tool_path)
+        self.previous_state = states[-1]
+        self.previous_tool_path = tool_path[-1:]
+        self.previous_time = times[-1]
+
+    def writeColumn(self, name, values):
+        if name == 'times':
+            self.files[name].write(np.ascontiguousarray(values, dtype='<f8').tobytes())
+            return
+        if self.delta:
+            rows = np.arange(self.rows, self.rows + len(values))
+            first_block = self.rows // self.block_size
+            block_starts = np.arange(first_block, (rows[-1] // self.block_size) + 1) * self.block_size
+            keys = values[np.maximum(block_starts - self.rows, 0)]
+            if block_starts[0] < self.rows:
+                # the first block started in an earlier chunk
+                keys[0] = self.keys[name]
+                self.key_files[name].write(np.ascontiguousarray(keys[1:], dtype='<f8').tobytes())
+            else:
+                self.key_files[name].write(np.ascontiguousarray(keys, dtype='<f8').tobytes())
+            self.keys[name] = keys[-1]
+            values = values - keys[rows // self.block_size - first_block]
+        self.files[name].write(np.ascontiguousarray(values, dtype=self.dtype).tobytes())
+
+    def addOverview(self, tool_path):
+        rows = np.arange(self.rows, self.rows + len(tool_path))
+        self.overview.append(tool_path[rows % self.overview_stride == 0])
+        self.overview_count += len(self.overview[-1])
+        while self.overview_count > self.overview_rows:
+            # the kept rows are multiples of the stride, every other one are multiples of twice the stride
+            self.overview = [np.concatenate(self.overview)[::2]]
+            self.overview_count = len(self.overview[0])
+            self.overview_stride *= 2
+
+    def close(self):
+        for f in list(self.files.values()) + list(self.key_files.values()):
+            f.close()
+        overview = np.concatenate(self.overview) if self.overview else np.zeros((0, 6))
+        if self.rows > 0 and (self.rows - 1) % self.overview_stride != 0:
+            # the drawn path ends where the program ends
+            overview = np.concatenate([overview, self.previous_tool_path])
+        overview = np.ascontiguousarray(overview, dtype='<f4')
+
+        # the header size depends on the offsets in it, both are settled after a few rounds
+        parts = []
+        for name, width in COLUMNS:
+            dtype = '<f8' if name == 'times' else self.dtype.str
+            encoding = 'delta' if self.delta and name != 'times' else 'raw'
+            parts.append((name, {'width': width, 'dtype': dtype, 'encoding': encoding}, os.path.join(self.temp_dir, name)))
+            if encoding == 'delta':
+                parts.append((name, None, os.path.join(self.temp_dir, name + '.keys')))
+        header = {'version': VERSION, 'rows': self.rows, 'machine': self.definition, 'feed_rate': self.feed_rate,
+                  'block_size': self.block_size, 'columns': {}, 'overview': {'rows': len(overview), 'stride': self.overview_stride}}
+        header_bytes = b''
+        while True:
+            offset = align(12 + len(header_bytes))
+            for name, column, part_path in parts:
+                if column is not None:
+                    column['offset'] = offset
+                    header['columns'][name] = column
+                else:
+                    header['columns'][name]['key_offset'] = offset
+                offset = align(offset + os.path.getsize(part_path))
+            header['overview']['offset'] = offset
+            encoded = json.dumps(header).encode('utf-8')
+            if len(encoded) <= len(header_bytes):
+                break
+            header_bytes = encoded + b' ' * 64
+        header_bytes = encoded.ljust(len(header_bytes))
+
+        # written under a temporary name first, so a crash never leaves a truncated file behind
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<HHI', VERSION, 0, len(header_bytes)) + header_bytes)
+            for name, column, part_path in parts:
+                f.write(b'\0' * (align(f.tell()) - f.tell()))
+                with open(part_path, 'rb') as part:
+                    shutil.copyfileobj(part, f, 16 * 1024 * 1024)
+            f.write(b'\0' * (align(f.tell()) - f.tell()))
+            f.write(overview.tobytes())
+        os.replace(temp_path, self.path)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+def align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class TrajectoryFile:
+    # memory mapped columns of a trajectory file, nothing is read before it is indexed
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, version, _, header_length = struct.unpack('<4sHHI', f.read(12))
+            if magic != MAGIC:
+                raise ValueError('{0} is not a trajectory file'.format(path))
+            if version > VERSION:
+                raise ValueError('{0} has trajectory format version {1}, only up to {2} is supported'.format(path, version, VERSION))
+            self.header = json.loads(f.read(header_length).decode('utf-8'))
+        self.rows = self.header['rows']
+        self.definition = self.header['machine']
+        self.feed_rate = self.header['feed_rate']
+        self.block_size = self.header['block_size']
+        self.columns = {}
+
+    def __len__(self):
+        return self.rows
+
+    def map(self, dtype, offset, shape):
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+    def getColumn(self, name):
+        # (N, width) memory map or DeltaColumn, times as (N,) seconds
+        column = self.columns.get(name)
+        if column is None:
+            info = self.header['columns'][name]
+            column = self.map(info['dtype'], info['offset'], (self.rows, info['width']))
+            if info['encoding'] == 'delta':
+                block_count = (self.rows + self.block_size - 1) // self.block_size
+                keys = self.map('<f8', info['key_offset'], (block_count, info['width']))
+                column = DeltaColumn(column, keys, self.block_size)
+            elif info['width'] == 1:
+                column = column[:, 0]
+            self.columns[name] = column
+        return column
+
+    def getToolPath(self):
+        return self.getColumn('tool_path')
+
+    def getStates(self):
+        # (N, 5) x/y/z [mm] and a/b [deg] with unwrapped rotations
+        return self.getColumn('states')
+
+    def getTimes(self):
+        # (N,) seconds from the start at feed_rate
+        return self.getColumn('times')
+
+    def getToolTips(self):
+        return self.getColumn('tool_tips')
+
+    def getOverview(self):
+        # every overview stride-th tool path row as float32, small enough to draw
+        overview = self.header['overview']
+        return self.map('<f4', overview['offset'], (overview['rows'], 6))
+
+    def buildMachine(self, model_dir=None):
+        return buildMachine(self.definition, model_dir)
+
+    def getInfo(self):
+        columns = ', '.join('{0} {1} {2}'.format(name, info['dtype'], info['encoding'])
+                            for name, info in self.header['columns'].items())
+        return '{0}: {1} rows, {2:.1f} s at {3} mm/min, {4:.1f} MB, columns {5}'.format(
+            self.path, self.rows, self.getTimes()[-1] if self.rows else 0.0, self.feed_rate,
+            os.path.getsize(self.path) / 1e6, columns)
+
+
+def saveTrajectory(path, machine, tool_path, states, tool_tips=None, feed_rate=5000.0, dtype='<f8', delta=False,
+                   block_size=4096, chunk_size=1000000):
+    writer = TrajectoryWriter(path, machine, feed_rate, dtype, delta, block_size)
+    for start in range(0, len(tool_path), chunk_size):
+        end = start + chunk_size
+        writer.write(tool_path[start:end], states[start:end], None if tool_tips is None else tool_tips[start:end])
+    writer.close()
+
+
+def diffTrajectories(first, second, chunk_size=1000000):
+    # largest absolute difference per column of two TrajectoryFiles with the same number of rows
+    if len(first) != len(second):
+        raise ValueError('{0} and {1} rows differ'.format(len(first), len(second)))
+    differences = {}
+    for name, _ in COLUMNS:
+        a = first.getColumn(name)
+        b = second.getColumn(name)
+        difference = 0.0
+        for start in range(0, len(first), chunk_size):
+            chunk = np.abs(np.asarray(a[start:start + chunk_size], dtype=np.float64) - b[start:start + chunk_size])
+            difference = max(difference, float(chunk.max()))
+        differences[name] = difference
+    return differences
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='shows a trajectory file or compares two')
+    parser.add_argument('trajectory', help='.traj file, e.g. from Simulate.py --format traj')
+    parser.add_argument('other', nargs='?', default=None, help='second .traj file to compare with')
+    parser.add_argument('--tolerance', type=float, default=1e-6, help='largest difference that is not reported')
+    args = parser.parse_args(argv)
+
+    first = TrajectoryFile(args.trajectory)
+    print(first.getInfo())
+    if args.other is None:
+        return 0
+    second = TrajectoryFile(args.other)
+    print(second.getInfo())
+    if first.definition != second.definition:
+        print('the machine definitions differ')
+    failed = False
+    for name, difference in diffTrajectories(first, second).items():
+        failed |= difference > args.tolerance
+        print('{0:<10} max difference {1:.9g}{2}'.format(name, difference, '  FAILED' if difference > args.tolerance else ''))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+import threading
+
+import numpy as np
+
+import TrajectoryCache as TrajectoryCacheModule
+from BackgroundLoader import BackgroundLoader
+from Machine import buildDefaultMachine
+from ToolPathCreator import circle
+from TrajectoryCache import TrajectoryCache, getTrajectoryKey
+
+
+def runToEnd(loader):
+    loader.thread.join(60)
+    return loader.poll()
+
+
+def test_cancel_ends_with_done():
+    loader = BackgroundLoader(buildDefaultMachine(), circle(100, [1.5, 2, 1]), cache=TrajectoryCache())
+    loader.cancel()
+    events = runToEnd(loader.start())
+    assert events[-1] == ('done', None, True)
+    assert loader.done
+
+
+def test_machine_is_not_read_by_the_worker():
+    machine = buildDefaultMachine()
+    tool_path = circle(100, [1.5, 2, 1])
+    loader = BackgroundLoader(machine, tool_path, block_size=30, cache=TrajectoryCache())
+
+    def getDefinition():
+        raise AssertionError('machine definition read on the worker thread')
+
+    machine.getDefinition = getDefinition
+    events = runToEnd(loader.start())
+    assert [event[0] for event in events if event[0] in ('block', 'done', 'error')] == ['block'] * 4 + ['done']
+    trajectory, cancelled = events[-1][1:]
+    assert not cancelled
+    assert np.array_equal(trajectory.tool_path, tool_path)
+    assert trajectory.getStates().shape == (100, 5)
+
+
+def test_tool_path_is_hashed_by_the_worker(monkeypatch):
+    machine = buildDefaultMachine()
+    tool_path = circle(100, [1.5, 2, 1])
+    threads = []
+
+    def recordThread(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return getTrajectoryKey(*args, **kwargs)
+
+    monkeypatch.setattr(TrajectoryCacheModule, 'getTrajectoryKey', recordThread)
+    loader = BackgroundLoader(machine, tool_path, cache=TrajectoryCache())
+    assert threads == []
+    events = runToEnd(loader.start())
+    assert threads == [loader.thread]
+    assert events[-1][1].key == getTrajectoryKey(machine, tool_path)
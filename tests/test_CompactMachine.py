@@ -0,0 +1,18 @@
+from CompactMachine import CompactMachine
+
+
+def test_copy_is_independent():
+    machine = CompactMachine()
+    compact = machine.copy()
+    compact.x_axis.defineMovement(type='linear', axis='z', negative=True)
+    compact.x_axis.setRelativePosition(1, 2, 3)
+    compact.names[0] = 'renamed'
+    compact.model_paths[0] = 'other.obj'
+    compact.children[0].append(0)
+
+    assert machine.x_axis.movement_type == 'linear'
+    assert machine.movements[machine.x_axis.index][1] == 'x'
+    assert machine.names[0] != 'renamed'
+    assert machine.model_paths[0] != 'other.obj'
+    assert 0 not in machine.children[0]
+    assert list(machine.x_axis.relative_translation) != [1, 2, 3]
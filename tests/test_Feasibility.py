@@ -0,0 +1,30 @@
+import numpy as np
+
+from Feasibility import checkFeasibility, stepTimes
+from Machine import buildDefaultMachine
+
+
+def statesAlongX(positions):
+    states = np.zeros((len(positions), 5))
+    states[:, 0] = positions
+    return states
+
+
+def test_repeated_point_is_merged():
+    machine = buildDefaultMachine()
+    machine.x_axis.setLimits(velocity=20.0, acceleration=1.0, jerk=1.0)
+    states = statesAlongX([0, 1, 2, 3, 3, 4, 5])
+    # 600 mm/min is 10 mm/s, the repeated point takes no time
+    report = checkFeasibility(machine, states, stepTimes(states[:, :3], feed_rate=600.0), unwrap=False)
+    assert report.isFeasible()
+    assert np.isclose(report.maxima[('x_axis', 'velocity')], 10.0)
+    assert report.maxima[('x_axis', 'acceleration')] == 0.0
+    assert not np.isnan(list(report.maxima.values())).any()
+
+
+def test_violation_next_to_repeated_point():
+    machine = buildDefaultMachine()
+    machine.x_axis.setLimits(acceleration=50.0)
+    report = checkFeasibility(machine, statesAlongX([0, 1, 2, 2, 4, 6]), [0.1, 0.1, 0.0, 0.1, 0.1], unwrap=False)
+    assert np.array_equal(report.violations[('x_axis', 'acceleration')], [[2, 3]])
+    assert np.isclose(report.peaks[('x_axis', 'acceleration')][0], 50.0)
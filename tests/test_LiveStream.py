@@ -0,0 +1,17 @@
+import socket
+
+import pytest
+
+from LiveStream import LiveReceiver
+
+
+def test_start_raises_when_the_address_is_in_use():
+    with socket.socket() as server:
+        server.bind(('127.0.0.1', 0))
+        server.listen()
+        receiver = LiveReceiver('tcp:127.0.0.1:{0}'.format(server.getsockname()[1]))
+        with pytest.raises(OSError):
+            receiver.start()
+        receiver.thread.join(5)
+        assert not receiver.thread.is_alive()
+        receiver.stop()
@@ -0,0 +1,92 @@
+import os
+import glob
+
+import numpy as np
+import pytest
+
+from ObjParser import CACHE_DIR_NAME, loadOBJ, parseOBJMesh
+
+VERTICES = """v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+vt 0 0
+vt 1 0
+vt 1 1
+vn 0 0 1
+vn 0 0 -1
+"""
+
+
+def writeOBJ(tmp_path, faces):
+    path = tmp_path / 'mesh.obj'
+    path.write_text(VERTICES + faces)
+    return str(path)
+
+
+def test_mixed_face_layouts(tmp_path):
+    path = writeOBJ(tmp_path, 'f 1 2 3\nf 1/1 3/3 4/2\nf 2//1 3//1 4//1\nf 1/1/2 2/2/2 4/3/2\n')
+    mesh = parseOBJMesh(path)
+    # not every corner has a normal, so none are used
+    assert mesh.normals is None
+    triangles = np.asarray(mesh.vertices)[mesh.indices].reshape(-1, 3, 3)
+    expected = np.array([[0, 1, 2], [0, 2, 3], [1, 2, 3], [0, 1, 3]])
+    assert np.array_equal(triangles, np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], dtype=np.float32)[expected])
+
+
+def test_mixed_layouts_with_normals(tmp_path):
+    path = writeOBJ(tmp_path, 'f 1//1 2//1 3//1\nf 1/1/2 3/3/2 4/2/2\n')
+    mesh = parseOBJMesh(path)
+    corners = np.asarray(mesh.normals)[mesh.indices].reshape(-1, 3, 3)
+    assert np.array_equal(corners[0], [[0, 0, 1]] * 3)
+    assert np.array_equal(corners[1], [[0, 0, -1]] * 3)
+    assert np.array_equal(np.asarray(mesh.vertices)[mesh.indices][3:], [[0, 0, 0], [1, 1, 0], [0, 1, 0]])
+
+
+def test_negative_indices_and_ngons(tmp_path):
+    mesh = parseOBJMesh(writeOBJ(tmp_path, 'f -4 -3 -2 -1\n'))
+    assert mesh.getTriangleCount() == 2
+    assert mesh.normals is None
+
+
+def test_malformed_faces(tmp_path):
+    with pytest.raises(ValueError):
+        parseOBJMesh(writeOBJ(tmp_path, 'f 1/1/1/1 2 3\n'))
+
+
+def triangleCorners(tmp_path, text):
+    path = tmp_path / 'mesh.obj'
+    path.write_text(text)
+    mesh = parseOBJMesh(str(path))
+    return np.asarray(mesh.vertices)[mesh.indices].tolist()
+
+
+def test_vertex_w_component(tmp_path):
+    corners = triangleCorners(tmp_path, 'v 0 0 0 1\nv 1 0 0 1\nv 0 1 0 1\nf 1 2 3\n')
+    assert corners == [[0, 0, 0], [1, 0, 0], [0, 1, 0]]
+
+
+def test_vertex_colors(tmp_path):
+    corners = triangleCorners(tmp_path, 'v 0 0 0 1 0 0\nv 1 0 0 0 1 0\nv 0 1 0\nf 1 2 3\n')
+    assert corners == [[0, 0, 0], [1, 0, 0], [0, 1, 0]]
+
+
+def test_inline_comments_and_indentation(tmp_path):
+    corners = triangleCorners(tmp_path, '# header\nv 0 0 0 # origin\nv 1 0 0\n  v 0 1 0\n\tf 1 2 3 # comment\n')
+    assert corners == [[0, 0, 0], [1, 0, 0], [0, 1, 0]]
+
+
+def test_short_vertex_line(tmp_path):
+    with pytest.raises(ValueError, match='line 2'):
+        triangleCorners(tmp_path, 'v 0 0 0\nv 1 0\nv 0 1 0\nf 1 2 3\n')
+
+
+def test_stale_normals_cache_is_removed(tmp_path):
+    path = writeOBJ(tmp_path, 'f 1//1 2//1 3//1\n')
+    assert loadOBJ(path).normals is not None
+    os.utime(path, ns=(0, 0))
+    with open(path, 'w') as f:
+        f.write(VERTICES + 'f 1 2 3\n')
+    assert loadOBJ(path).normals is None
+    assert loadOBJ(path).normals is None
+    assert not glob.glob(os.path.join(os.path.dirname(path), CACHE_DIR_NAME, '*.normals.npy'))
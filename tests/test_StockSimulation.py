@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from StockSimulation import StockSimulator, VoxelStock
+
+
+def bruteForceStock(simulator, tips, axes):
+    # every voxel within the tool radius of a sphere center on one of the interpolated poses is cleared, with the
+    # sphere centers snapped to their voxels like VoxelStock.removeSpheres does
+    stock = simulator.stock
+    tips, axes = simulator.interpolatePoses(tips, axes)
+    centers = (tips[:, None, :] + axes[:, None, :] * simulator.sphere_offsets[None, :, None]).reshape(-1, 3)
+    voxels = np.stack(np.meshgrid(*[np.arange(n) for n in stock.shape], indexing='ij'), axis=-1)
+    material = np.ones(stock.shape, dtype=bool)
+    radius = simulator.tool_radius / stock.resolution
+    for center in np.unique(stock.toVoxels(centers), axis=0):
+        material &= np.sum(np.square(voxels - center), axis=-1) > radius * radius
+    return material
+
+
+@pytest.mark.parametrize('tool_radius', [0.5, 0.6, 1.0, 3.0])
+def test_cut_matches_brute_force(tool_radius):
+    stock = VoxelStock([0, 0, 0], [12, 12, 8], resolution=0.5)
+    simulator = StockSimulator(stock, tool_radius=tool_radius, cutting_length=2 * tool_radius + 1)
+    # diagonal moves in all three axes, in two batches
+    tips = np.array([[1.0, 1.3, 6.2], [7.7, 9.1, 3.4], [10.6, 2.2, 2.1], [2.3, 10.9, 4.8]])
+    axes = np.array([[0.0, 0.0, 1.0], [0.2, 0.0, 1.0], [0.0, -0.3, 1.0], [0.0, 0.0, 1.0]])
+    axes /= np.sqrt(np.sum(np.square(axes), axis=1))[:, None]
+    simulator.cut(tips[:2], axes[:2])
+    simulator.cut(tips[2:], axes[2:])
+
+    material = np.unpackbits(stock.bits, axis=2)[:, :, :stock.shape[2]].astype(bool)
+    assert np.array_equal(material, bruteForceStock(simulator, tips, axes))
@@ -0,0 +1,30 @@
+import numpy as np
+
+from ToolPathCreator import circle, resample
+
+
+def test_resample_without_length():
+    # a pure reorientation at one point
+    tool_path = np.zeros((5, 6))
+    tool_path[:, 3] = np.linspace(0, 1, 5)
+    tool_path[:, 5] = 1
+    for resampled in (resample(tool_path, 0.1), resample(np.zeros((5, 6)) + [0, 0, 0, 0, 0, 1], 0.1)):
+        assert resampled.shape == (5, 6)
+    assert np.array_equal(resample(tool_path, 0.1), tool_path)
+
+
+def test_resample_without_tolerance():
+    tool_path = circle(100, [0, 0, 0])
+    assert np.array_equal(resample(tool_path, 0.0), tool_path)
+
+
+def test_resample_circle_within_tolerance():
+    resampled = resample(circle(10000, [0, 0, 0]), 0.01)
+    assert len(resampled) < 10000
+    # chord midpoints of the 1000 mm radius circle in the xy plane
+    midpoints = (resampled[1:, :2] + resampled[:-1, :2]) / 2
+    assert np.max(1000 - np.sqrt(np.sum(np.square(midpoints), axis=1))) < 0.02
+
+
+def test_circle_is_c_contiguous():
+    assert circle(10, [0, 0, 0]).flags.c_contiguous
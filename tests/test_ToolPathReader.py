@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from ToolPathReader import ReadStats, readGCode, readXYZ
+
+
+def readPoints(tmp_path, text, stats=None):
+    path = tmp_path / 'path.nc'
+    path.write_text(text)
+    return np.concatenate(list(readGCode(str(path), stats=stats)))[:, :3]
+
+
+def test_block_delete(tmp_path):
+    points = readPoints(tmp_path, 'G90 G1 X10\n/N80 G1 X60\n')
+    assert np.array_equal(points, [[10, 0, 0], [60, 0, 0]])
+
+
+def test_variable_lines_are_skipped(tmp_path):
+    stats = ReadStats()
+    with pytest.warns(UserWarning, match='#1=5'):
+        points = readPoints(tmp_path, '%\nG1 X1\n#1=5\nG1 X#1\nG1 Y2\n%\n', stats)
+    assert np.array_equal(points, [[1, 0, 0], [1, 2, 0]])
+    assert stats.skipped_lines == 2
+
+
+def test_exponent(tmp_path):
+    points = readPoints(tmp_path, 'G1 X1 Y1.5E1 Z-2e-1 E5\n')
+    assert np.allclose(points, [[1, 15, -0.2]])
+
+
+def test_incremental_moves(tmp_path):
+    points = readPoints(tmp_path, 'G1 X10 Y10\nG91 G1 X1\nX1 Y-2\nG90 X5\n')
+    assert np.array_equal(points, [[10, 10, 0], [11, 10, 0], [12, 8, 0], [5, 8, 0]])
+
+
+def test_reference_point_does_not_move(tmp_path):
+    points = readPoints(tmp_path, 'G90 G1 X1 Y2 Z3\nG28 G91 Z0\nG1 Z1\nG53 G90 Z100\nX4\n')
+    assert np.array_equal(points, [[1, 2, 3], [1, 2, 4], [4, 2, 4]])
+
+
+def readXYZRows(tmp_path, text):
+    path = tmp_path / 'path.xyz'
+    path.write_text(text)
+    return np.concatenate(list(readXYZ(str(path))))
+
+
+def test_xyz_header_and_comments(tmp_path):
+    rows = readXYZRows(tmp_path, '# exported\nx,y,z,nx,ny,nz\n1,2,3,0,0,1\n\n  # note\n4,5,6,0,1,0\n')
+    assert np.array_equal(rows, [[1, 2, 3, 0, 0, 1], [4, 5, 6, 0, 1, 0]])
+
+
+def test_xyz_missing_value(tmp_path):
+    # 12 values would still make two rows of 6
+    with pytest.raises(ValueError, match='line 3 has 5 values instead of 6'):
+        readXYZRows(tmp_path, 'x y z nx ny nz\n1 2 3 0 0 1\n4 5 6 0 1\n7 8 9 0 0 1 1\n')
+
+
+def test_xyz_text_value(tmp_path):
+    with pytest.raises(ValueError, match='no number'):
+        readXYZRows(tmp_path, '1 2 3 0 0 1\n4 5 six 0 1 0\n')